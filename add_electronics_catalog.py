@@ -363,8 +363,9 @@ async def add_electronics_catalog():
                 ],
                 "created_at": datetime.now(timezone.utc),
                 "updated_at": datetime.now(timezone.utc),
-                "ai_generated": True,
-                "ai_description": f"This {product_data['name']} represents the latest in {category_data['name'].lower()} technology, combining cutting-edge features with premium build quality. Perfect for users who demand the best in performance and reliability."
+                # Filled in afterwards in bulk by enrich_descriptions.py
+                "ai_generated_description": None,
+                "ai_description_status": "pending"
             }
             
             # Check if product already exists
@@ -380,6 +381,7 @@ async def add_electronics_catalog():
     
     print(f"\n🎉 Successfully added {total_products} electronics products to the catalog!")
     print(f"📊 Database now contains {products_collection.count_documents({})} total products")
+    print("🤖 Generate AI descriptions with: python enrich_descriptions.py --database marketplace_db")
     
     # Display category summary
     print("\n📋 Category Summary:")
@@ -502,6 +502,7 @@ def main():
         print(f"📂 Categories: {len(category_ids)}")
         print(f"🏥 Products: {products_count}")
         print("🔑 Admin login: admin@7x.com / password123")
+        print("🤖 Generate AI descriptions with: python enrich_descriptions.py")
         print("\n✅ Your 7x medical marketplace is ready!")
         
     except Exception as e:
@@ -0,0 +1,219 @@
+"""
+Buffered search analytics: search events are queued in memory on the request
+path and written to MongoDB in batches by a background task, which also keeps
+hourly and daily rollups up to date
+"""
+
+import asyncio
+import hashlib
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from search_index import normalize_text
+
+# Distinct users per rollup bucket are estimated with a HyperLogLog sketch of
+# 2**HLL_PRECISION registers (about 6.5% standard error), stored as a sub-document
+# and merged with $max, so rollup documents stay small however many users search.
+HLL_PRECISION = 8
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+ROLLUP_RETENTION = {"hour": timedelta(days=90), "day": timedelta(days=730)}
+
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    """Start of the hour or day a timestamp falls in (UTC)"""
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    timestamp = timestamp.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == "day":
+        timestamp = timestamp.replace(hour=0)
+    return timestamp
+
+
+def hll_register(value: str) -> tuple:
+    """Register index and rank a value contributes to the HyperLogLog sketch"""
+    hashed = int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+    index = hashed >> (64 - HLL_PRECISION)
+    remaining = hashed & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - remaining.bit_length() + 1
+    return index, rank
+
+
+def hll_estimate(registers: Optional[Dict[str, int]]) -> int:
+    """Cardinality estimate from stored registers (missing registers count as zero)"""
+    if not registers:
+        return 0
+    alpha = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+    total = sum(2.0 ** -registers.get(str(i), 0) for i in range(HLL_REGISTERS))
+    estimate = alpha * HLL_REGISTERS * HLL_REGISTERS / total
+    zeros = HLL_REGISTERS - len(registers)
+    if estimate <= 2.5 * HLL_REGISTERS and zeros:
+        # Small-range correction (linear counting)
+        estimate = HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+    return int(round(estimate))
+
+
+def rollup_updates(events: Iterable[Dict[str, Any]]) -> List[UpdateOne]:
+    """Upserts adding a batch of search events to the per-query and total rollups.
+
+    Each (granularity, bucket, query) gets one document; ``query`` is None for
+    the bucket totals across all queries. Distinct users are tracked on the
+    totals only and count signed-in searches.
+    """
+    rollups: Dict[tuple, Dict[str, Any]] = defaultdict(
+        lambda: {"count": 0, "results_sum": 0, "zero_results": 0, "registers": {}}
+    )
+    for event in events:
+        query = normalize_text(event.get("query"))
+        if not query:
+            continue
+        results = int(event.get("results_count") or 0)
+        user_id = event.get("user_id")
+        register, rank = hll_register(str(user_id)) if user_id else (None, 0)
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = bucket_start(event["timestamp"], granularity)
+            for rollup_query in (query, None):
+                rollup = rollups[(granularity, bucket, rollup_query)]
+                rollup["count"] += 1
+                rollup["results_sum"] += results
+                rollup["zero_results"] += results == 0
+                if user_id and rollup_query is None:
+                    rollup["registers"][register] = max(rollup["registers"].get(register, 0), rank)
+
+    updates = []
+    for (granularity, bucket, query), rollup in rollups.items():
+        update = {
+            "$inc": {
+                "count": rollup["count"],
+                "results_sum": rollup["results_sum"],
+                "zero_results": rollup["zero_results"],
+            },
+            "$setOnInsert": {"expires_at": bucket + ROLLUP_RETENTION[granularity]},
+        }
+        if rollup["registers"]:
+            update["$max"] = {f"users_hll.{register}": rank for register, rank in rollup["registers"].items()}
+        updates.append(UpdateOne({"granularity": granularity, "bucket": bucket, "query": query}, update, upsert=True))
+    return updates
+
+
+def summarize_rollup(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a rollup document"""
+    count = rollup.get("count", 0)
+    return {
+        "searches": count,
+        "distinct_users": hll_estimate(rollup.get("users_hll")),
+        "avg_results": round(rollup.get("results_sum", 0) / count, 2) if count else 0.0,
+        "zero_result_rate": round(rollup.get("zero_results", 0) / count, 4) if count else 0.0,
+    }
+
+
+class SearchAnalyticsWriter:
+    """Batches search events and flushes them with insert_many.
+
+    Events are flushed when ``batch_size`` have accumulated or
+    ``flush_interval`` seconds after the first queued event, whichever comes
+    first. The queue is bounded: when the database falls behind, new events
+    are dropped (and counted) instead of slowing down searches.
+    """
+
+    def __init__(self, collection, rollup_collection=None, max_queue_size: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 2.0):
+        self.collection = collection
+        self.rollup_collection = rollup_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task = None
+        self._batch: List[Dict[str, Any]] = []  # events taken off the queue but not yet flushed
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.rollup_failures = 0
+
+    def record(self, event: Dict[str, Any]) -> bool:
+        """Queue an event without blocking; returns False if it had to be dropped"""
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and flush everything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        batch, self._batch = self._batch, []
+        await self._flush(batch)
+        while not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            while len(self._batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    self._batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch, self._batch = self._batch, []
+            # Shielded so a shutdown arriving mid-write does not abandon the batch
+            await asyncio.shield(self._flush(batch))
+
+    async def _flush(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self.collection.insert_many, batch, ordered=False)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            print(f"Search analytics flush failed ({len(batch)} events): {e}")
+        if self.rollup_collection is not None:
+            try:
+                updates = rollup_updates(batch)
+                if updates:
+                    await asyncio.to_thread(self.rollup_collection.bulk_write, updates, ordered=False)
+            except Exception as e:
+                self.rollup_failures += 1
+                print(f"Search analytics rollup failed ({len(batch)} events): {e}")
+        self.flushes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "rollup_failures": self.rollup_failures,
+        }
@@ -0,0 +1,174 @@
+"""
+In-process caches shared by the API's expensive read paths
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+            return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SWRCache:
+    """Async LRU cache with stale-while-revalidate semantics.
+
+    An entry is fresh for ``ttl`` seconds and then stale for a further
+    ``stale_ttl`` seconds. Stale values are returned immediately while a
+    single background task reloads them; older entries are misses. Concurrent
+    loads of the same key (misses or refreshes) share one task. A loader
+    returning None (or raising) leaves the cache unchanged.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, stale_ttl: float = 3600.0,
+                 latency_window: int = 1000):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._latencies: deque = deque(maxlen=latency_window)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value for ``key``, calling ``loader`` to fill or refresh it"""
+        item = self._data.get(key)
+        if item is not None:
+            value, loaded_at = item
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                self._load(key, loader)
+                return value
+            del self._data[key]
+        self.misses += 1
+        return await asyncio.shield(self._load(key, loader))
+
+    def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._refresh(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        started_at = time.perf_counter()
+        try:
+            value = await loader()
+        except Exception as e:
+            # Background refreshes have no caller to raise to; a failed miss returns None
+            self.refresh_failures += 1
+            print(f"Cache refresh failed for {key!r}: {e}")
+            return None
+        finally:
+            self._latencies.append(time.perf_counter() - started_at)
+        self.refreshes += 1
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        latencies = sorted(self._latencies)
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "refresh_latency_ms": {
+                "avg": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+                "p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else 0.0,
+                "max": round(1000 * latencies[-1], 2) if latencies else 0.0,
+            },
+        }
@@ -0,0 +1,381 @@
+"""
+Background AI description generation: product writes enqueue a persisted job
+and return immediately; a small pool of workers calls the LLM, retries
+failures with backoff and fills in the product's description
+"""
+
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from metrics import AI_FALLBACKS, AI_REQUESTS
+from search_index import normalize_text
+
+# Product ``ai_description_status`` values
+DESCRIPTION_PENDING = "pending"
+DESCRIPTION_READY = "ready"
+DESCRIPTION_FAILED = "failed"
+
+
+def description_cache_key(name: str, category: str, brand: str, model: str) -> str:
+    """Content address of a generated description: same product facts and model, same text"""
+    facts = [normalize_text(name), normalize_text(category), normalize_text(brand), model]
+    return hashlib.sha256(json.dumps(facts).encode()).hexdigest()
+
+
+class DescriptionCache:
+    """Generated descriptions shared across products (and sellers) with identical facts.
+
+    Entries live in MongoDB keyed by :func:`description_cache_key`, so every
+    API process shares them; hit counts are kept per process for metrics and
+    per entry in the collection.
+    """
+
+    def __init__(self, collection, model: str):
+        self.collection = collection
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str, category: str, brand: str) -> Optional[str]:
+        key = description_cache_key(name, category, brand, self.model)
+        entry = self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.now(timezone.utc)}},
+            projection={"description": 1},
+        )
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["description"]
+
+    def set(self, name: str, category: str, brand: str, description: str):
+        key = description_cache_key(name, category, brand, self.model)
+        self.collection.update_one(
+            {"_id": key},
+            {"$setOnInsert": {
+                "name": name, "category": category, "brand": brand, "model": self.model,
+                "description": description, "hits": 0, "created_at": datetime.now(timezone.utc),
+            }},
+            upsert=True,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.collection.estimated_document_count(),
+        }
+
+
+class DescriptionJobQueue:
+    """Bounded-concurrency worker pool over the ``ai_jobs`` collection.
+
+    Jobs are claimed with an atomic status transition and a lease, so several
+    API processes can share the collection and jobs interrupted by a restart
+    are picked up again once their lease expires. A job whose product has
+    been edited again since it was queued is superseded: its result is not
+    written over the newer job's. With a ``cache``, products whose facts were
+    described before are filled in at enqueue time without a job. With
+    ``generate_stream``, a client can claim a product's job and watch its
+    description being written (``stream``). Every ``sweep_interval`` seconds
+    jobs that have sat queued that long, or whose lease expired, are queued
+    in memory again, so a lost queue entry delays a job instead of stranding it.
+    """
+
+    def __init__(self, jobs_collection, products_collection,
+                 generate: Callable[[str, str, str], Awaitable[str]],
+                 fallback: Callable[[str, str, str], str],
+                 concurrency: int = 4, max_attempts: int = 3,
+                 retry_backoff: float = 2.0, lease_seconds: float = 300.0,
+                 cache: Optional[DescriptionCache] = None,
+                 generate_stream: Optional[Callable[[str, str, str], AsyncIterator[str]]] = None,
+                 poll_interval: float = 1.0, sweep_interval: float = 60.0):
+        self.jobs_collection = jobs_collection
+        self.products_collection = products_collection
+        self.generate = generate
+        self.fallback = fallback
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.cache = cache
+        self.generate_stream = generate_stream
+        self.poll_interval = poll_interval
+        self.sweep_interval = sweep_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._workers = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._retry_tasks = set()
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.streamed = 0
+
+    def enqueue(self, product_id: str, name: str, category: str, brand: str) -> Dict[str, Any]:
+        """Persist a job, mark the product pending and hand the job to the workers.
+
+        Returns the description fields set on the product. On a cache hit the
+        description is set right away (status ready) and no job is created.
+        """
+        AI_REQUESTS.inc(feature="description")
+        cached = self.cache.get(name, category, brand) if self.cache else None
+        if cached is not None:
+            # Clearing the job id also stops any older in-flight job from overwriting this
+            product_update = {"ai_generated_description": cached, "ai_description_status": DESCRIPTION_READY,
+                              "ai_description_job_id": None}
+            self.products_collection.update_one({"id": product_id}, {"$set": product_update})
+            return product_update
+
+        now = datetime.now(timezone.utc)
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": "product_description",
+            "product_id": product_id,
+            "input": {"name": name, "category": category, "brand": brand},
+            "status": "queued",
+            "attempts": 0,
+            "error": None,
+            "lease_expires_at": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.jobs_collection.insert_one(job)
+        product_update = {"ai_description_status": DESCRIPTION_PENDING, "ai_description_job_id": job["id"]}
+        self.products_collection.update_one({"id": product_id}, {"$set": product_update})
+        self._queue.put_nowait(job["id"])
+        return product_update
+
+    async def start(self):
+        if self._workers:
+            return
+        await self.resume()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._sweeper = asyncio.create_task(self._sweep())
+
+    async def stop(self):
+        """Stop the workers; unfinished jobs stay in ai_jobs and resume on the next start"""
+        tasks = self._workers + list(self._retry_tasks) + ([self._sweeper] if self._sweeper else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._sweeper = None
+        self._retry_tasks.clear()
+
+    async def resume(self, queued_before: Optional[datetime] = None) -> int:
+        """Re-queue jobs left queued, or running with an expired lease, by an earlier process.
+        With ``queued_before``, only queued jobs not touched since then: newer ones are
+        still in the queue or waiting out a retry backoff."""
+        now = datetime.now(timezone.utc)
+        queued = {"status": "queued"}
+        if queued_before is not None:
+            queued["updated_at"] = {"$lt": queued_before}
+        jobs = await asyncio.to_thread(lambda: list(self.jobs_collection.find(
+            {"$or": [
+                queued,
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]},
+            {"_id": 0, "id": 1}
+        )))
+        for job in jobs:
+            self._queue.put_nowait(job["id"])
+        return len(jobs)
+
+    async def _sweep(self):
+        # A job whose queue entry was lost (a stream cancelled mid-requeue, a worker
+        # dropping an entry it could not claim yet) would otherwise wait for a restart.
+        # A job queued twice is harmless: only one claim succeeds.
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                swept = await self.resume(datetime.now(timezone.utc) - timedelta(seconds=self.sweep_interval))
+                if swept:
+                    print(f"Re-queued {swept} stale description jobs")
+            except Exception as e:
+                print(f"Description job sweep error: {e}")
+
+    def _claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        return self.jobs_collection.find_one_and_update(
+            {"id": job_id, "$or": [
+                {"status": "queued"},
+                {"status": "running", "lease_expires_at": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def _finish(self, job: Dict[str, Any], status: str, description: Optional[str], error: Optional[str] = None):
+        now = datetime.now(timezone.utc)
+        self.jobs_collection.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "succeeded" if status == DESCRIPTION_READY else "failed",
+                      "error": error, "lease_expires_at": None, "updated_at": now}}
+        )
+        product_update = {"ai_description_status": status}
+        if description is not None:
+            product_update["ai_generated_description"] = description
+        # Only the product's latest job may write its description
+        self.products_collection.update_one(
+            {"id": job["product_id"], "ai_description_job_id": job["id"]},
+            {"$set": product_update}
+        )
+
+    def _requeue(self, job: Dict[str, Any], error: str):
+        self.jobs_collection.update_one(
+            {"id": job["id"]},
+            {"$set": {"status": "queued", "error": error, "lease_expires_at": None,
+                      "updated_at": datetime.now(timezone.utc)}}
+        )
+
+    async def _requeue_now(self, job: Dict[str, Any], error: str):
+        await asyncio.to_thread(self._requeue, job, error)
+        self._queue.put_nowait(job["id"])
+
+    async def _retry_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._process(job_id)
+            except Exception as e:
+                print(f"Description job {job_id} error: {e}")
+
+    async def _process(self, job_id: str):
+        job = await asyncio.to_thread(self._claim, job_id)
+        if job is None:
+            return  # already done, or claimed by another worker
+        job_input = job["input"]
+        facts = (job_input["name"], job_input["category"], job_input["brand"])
+        try:
+            # Another job may have described identical facts since this one was queued
+            description = await asyncio.to_thread(self.cache.get, *facts) if self.cache else None
+            if description is None:
+                description = await self.generate(*facts)
+                if self.cache:
+                    await asyncio.to_thread(self.cache.set, *facts, description)
+        except Exception as e:
+            if job["attempts"] < self.max_attempts:
+                self.retried += 1
+                await asyncio.to_thread(self._requeue, job, str(e))
+                task = asyncio.create_task(self._retry_later(job_id, self.retry_backoff * 2 ** (job["attempts"] - 1)))
+                self._retry_tasks.add(task)
+                task.add_done_callback(self._retry_tasks.discard)
+                return
+            self.failed += 1
+            AI_FALLBACKS.inc(feature="description", reason="llm_error")
+            # Keep an existing description; otherwise fall back to the template text
+            product = await asyncio.to_thread(
+                self.products_collection.find_one, {"id": job["product_id"]}, {"_id": 0, "ai_generated_description": 1}
+            )
+            fallback = None if product and product.get("ai_generated_description") else self.fallback(
+                job_input["name"], job_input["category"], job_input["brand"]
+            )
+            await asyncio.to_thread(self._finish, job, DESCRIPTION_FAILED, fallback, str(e))
+            return
+        self.completed += 1
+        await asyncio.to_thread(self._finish, job, DESCRIPTION_READY, description)
+
+    async def stream(self, product_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Events for a client watching the product's description: ``status`` right away,
+        then ``token`` chunks while it is generated, then ``done`` with the final status
+        and text.
+
+        The caller generates the text itself when it can claim the product's job
+        before a worker does; otherwise (the job is already running elsewhere) it
+        follows the product until the job finishes. If the stream fails or the
+        client goes away, the job goes back to the workers.
+        """
+        product = await asyncio.to_thread(self._product_description, product_id)
+        if product is None:
+            return
+        yield {"event": "status", "status": product.get("ai_description_status")}
+        if product.get("ai_description_status") != DESCRIPTION_PENDING:
+            yield self._done_event(product)
+            return
+
+        job_id = product.get("ai_description_job_id")
+        job = await asyncio.to_thread(self._claim, job_id) if job_id and self.generate_stream else None
+        if job is not None:
+            job_input = job["input"]
+            facts = (job_input["name"], job_input["category"], job_input["brand"])
+            chunks = []
+            finished = False
+            try:
+                async for chunk in self.generate_stream(*facts):
+                    chunks.append(chunk)
+                    yield {"event": "token", "text": chunk}
+                description = "".join(chunks).strip()
+                if not description:
+                    raise ValueError("LLM returned an empty description")
+                finished = True
+            except Exception as e:
+                print(f"Streaming description for product {product_id} failed: {e}")
+            finally:
+                if not finished:
+                    # Error, or the client disconnected: let the workers retry the job. On a
+                    # disconnect this generator is being cancelled, so the requeue runs as its
+                    # own task that the cancellation cannot interrupt halfway
+                    task = asyncio.create_task(self._requeue_now(job, "stream interrupted"))
+                    self._retry_tasks.add(task)
+                    task.add_done_callback(self._retry_tasks.discard)
+                    await asyncio.shield(task)
+            if finished:
+                self.streamed += 1
+                self.completed += 1
+                if self.cache:
+                    await asyncio.to_thread(self.cache.set, *facts, description)
+                await asyncio.to_thread(self._finish, job, DESCRIPTION_READY, description)
+                yield {"event": "done", "status": DESCRIPTION_READY, "description": description}
+                return
+            yield {"event": "status", "status": DESCRIPTION_PENDING, "detail": "Generating in the background"}
+
+        # Follow the job run by a worker (here or in another process), for at most one lease
+        give_up_at = asyncio.get_running_loop().time() + self.lease_seconds
+        while (product is not None and product.get("ai_description_status") == DESCRIPTION_PENDING
+               and asyncio.get_running_loop().time() < give_up_at):
+            await asyncio.sleep(self.poll_interval)
+            product = await asyncio.to_thread(self._product_description, product_id)
+        if product is not None:
+            yield self._done_event(product)
+
+    def _product_description(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return self.products_collection.find_one(
+            {"id": product_id},
+            {"_id": 0, "ai_generated_description": 1, "ai_description_status": 1, "ai_description_job_id": 1}
+        )
+
+    @staticmethod
+    def _done_event(product: Dict[str, Any]) -> Dict[str, Any]:
+        return {"event": "done", "status": product.get("ai_description_status"),
+                "description": product.get("ai_generated_description")}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "workers": len(self._workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "streamed": self.streamed,
+        }
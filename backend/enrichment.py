@@ -0,0 +1,281 @@
+"""
+Bulk AI description enrichment for catalog imports: products are described
+several per prompt, with a bounded number of concurrent LLM calls and a
+request rate limit, and results are written in batches with bulk_write.
+Progress is checkpointed to a JSON-lines file so an interrupted run resumes
+where it stopped.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from description_jobs import DESCRIPTION_READY, description_cache_key
+
+ENRICHMENT_SYSTEM_MESSAGE = (
+    "You are an expert product copywriter. Create engaging, detailed product descriptions that "
+    "highlight benefits and features. Keep each description under 200 words and include key selling points."
+)
+
+
+class RateLimiter:
+    """Token bucket: at most ``rate`` acquisitions per second, with bursts up to ``burst``"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def build_batch_prompt(products: List[Dict[str, Any]]) -> str:
+    """One prompt describing several products, answered as a JSON object keyed by product id"""
+    facts = [
+        {"id": product["id"], "name": product.get("name", ""), "category": product.get("category", ""),
+         "brand": product.get("brand", "")}
+        for product in products
+    ]
+    return (
+        "Write a compelling product description for each product below. Focus on benefits, features, "
+        "and what makes it special.\n"
+        "Answer with only a JSON object mapping each product id to its description.\n\n"
+        f"Products:\n{json.dumps(facts, ensure_ascii=False)}"
+    )
+
+
+def parse_batch_response(text: str, product_ids: Iterable[str]) -> Dict[str, str]:
+    """Descriptions found in a batch answer, tolerating code fences and surrounding prose"""
+    wanted = set(product_ids)
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        answer = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    if not isinstance(answer, dict):
+        return {}
+    return {
+        product_id: description.strip()
+        for product_id, description in answer.items()
+        if product_id in wanted and isinstance(description, str) and description.strip()
+    }
+
+
+def read_checkpoint(path: Optional[str]) -> Set[str]:
+    """Ids of products finished (written or given up on) by earlier runs"""
+    finished = set()
+    if not path or not os.path.exists(path):
+        return finished
+    with open(path, encoding="utf-8") as checkpoint:
+        for line in checkpoint:
+            try:
+                finished.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                continue  # torn last line of an interrupted run
+    return finished
+
+
+class BulkEnricher:
+    """Generates and stores descriptions for many products.
+
+    ``complete(prompt, system)`` is any async chat completion function. At
+    most ``concurrency`` calls are in flight and at most ``rate`` start per
+    second. Products an answer leaves out are retried on their own, up to
+    ``max_attempts`` in total.
+    """
+
+    def __init__(self, products_collection, complete: Callable[..., Awaitable[str]],
+                 checkpoint_path: Optional[str] = None, batch_size: int = 5, concurrency: int = 8,
+                 rate: float = 10.0, max_attempts: int = 3, retry_backoff: float = 1.0,
+                 write_batch_size: int = 100, cache_collection=None, cache_model: Optional[str] = None):
+        self.products_collection = products_collection
+        self.complete = complete
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.write_batch_size = write_batch_size
+        self.cache_collection = cache_collection
+        self.cache_model = cache_model
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._limiter = RateLimiter(rate)
+        self._results: List[tuple] = []
+        self._write_lock = asyncio.Lock()
+        self._latencies: List[float] = []
+        self.calls = 0
+        self.call_failures = 0
+        self.retries = 0
+        self.written = 0
+        self.failed = 0
+        self.skipped = 0
+
+    async def _call(self, batch: List[Dict[str, Any]]) -> Dict[str, str]:
+        async with self._semaphore:
+            await self._limiter.acquire()
+            started_at = time.perf_counter()
+            self.calls += 1
+            try:
+                text = await self.complete(build_batch_prompt(batch), ENRICHMENT_SYSTEM_MESSAGE)
+            except Exception:
+                self.call_failures += 1
+                raise
+            finally:
+                self._latencies.append(time.perf_counter() - started_at)
+        return parse_batch_response(text, [product["id"] for product in batch])
+
+    async def _run_batch(self, batch: List[Dict[str, Any]], attempt: int = 1):
+        call_failed = False
+        try:
+            descriptions = await self._call(batch)
+        except Exception as e:
+            call_failed = True
+            if getattr(e, "retryable", True) is False:
+                attempt = self.max_attempts
+            descriptions = {}
+        for product in batch:
+            if product["id"] in descriptions:
+                self._results.append((product, descriptions[product["id"]]))
+        missing = [product for product in batch if product["id"] not in descriptions]
+        if len(self._results) >= self.write_batch_size:
+            await self._write()
+        if not missing:
+            return
+        if attempt >= self.max_attempts:
+            self.failed += len(missing)
+            self._checkpoint([{"id": product["id"], "status": "failed"} for product in missing])
+            return
+
+        self.retries += 1
+        await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+        # A failed call is retried as is; products an answer left out are retried one per
+        # call, isolating the ones the model trips on
+        retry_batches = [missing] if call_failed else [[product] for product in missing]
+        await asyncio.gather(*(self._run_batch(retry, attempt + 1) for retry in retry_batches))
+
+    def _checkpoint(self, entries: List[Dict[str, Any]]):
+        if not self.checkpoint_path or not entries:
+            return
+        with open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            for entry in entries:
+                checkpoint.write(json.dumps(entry) + "\n")
+
+    async def _write(self):
+        async with self._write_lock:
+            results, self._results = self._results, []
+            if not results:
+                return
+            now = datetime.now(timezone.utc)
+            updates = [
+                UpdateOne({"id": product["id"]}, {"$set": {
+                    "ai_generated_description": description,
+                    "ai_description_status": DESCRIPTION_READY,
+                    "ai_description_job_id": None,
+                }})
+                for product, description in results
+            ]
+            failed_indexes = set()
+            try:
+                await asyncio.to_thread(self.products_collection.bulk_write, updates, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported errors was written
+                failed_indexes = {error["index"] for error in e.details.get("writeErrors", [])}
+            except Exception as e:
+                print(f"Description write of {len(results)} products failed: {e}")
+                failed_indexes = set(range(len(results)))
+            failed = [product for index, (product, _) in enumerate(results) if index in failed_indexes]
+            results = [result for index, result in enumerate(results) if index not in failed_indexes]
+            self.failed += len(failed)
+            self._checkpoint([{"id": product["id"], "status": "failed"} for product in failed])
+            if not results:
+                return
+            if self.cache_collection is not None and self.cache_model:
+                cache_updates = [
+                    UpdateOne(
+                        {"_id": description_cache_key(product.get("name"), product.get("category"),
+                                                      product.get("brand"), self.cache_model)},
+                        {"$setOnInsert": {
+                            "name": product.get("name"), "category": product.get("category"),
+                            "brand": product.get("brand"), "model": self.cache_model,
+                            "description": description, "hits": 0, "created_at": now,
+                        }},
+                        upsert=True,
+                    )
+                    for product, description in results
+                ]
+                try:
+                    await asyncio.to_thread(self.cache_collection.bulk_write, cache_updates, ordered=False)
+                except Exception as e:  # the products are written; a cold cache only costs later calls
+                    print(f"Description cache write failed: {e}")
+            self.written += len(results)
+            self._checkpoint([{"id": product["id"], "status": "done"} for product, _ in results])
+
+    async def run(self, query: Optional[Dict[str, Any]] = None, limit: int = 0) -> Dict[str, Any]:
+        """Describe every product matching ``query`` (default: active products without an AI description)"""
+        if query is None:
+            query = {"is_active": True, "ai_generated_description": None}
+        finished = read_checkpoint(self.checkpoint_path)
+        cursor = self.products_collection.find(query, {"_id": 0, "id": 1, "name": 1, "category": 1, "brand": 1}).sort("id", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+        products = await asyncio.to_thread(list, cursor)
+        todo = [product for product in products if product["id"] not in finished]
+        self.skipped = len(products) - len(todo)
+
+        started_at = time.perf_counter()
+        pending = set()
+        for start in range(0, len(todo), self.batch_size):
+            # Keep a bounded window of batches scheduled; the semaphore bounds the calls in flight
+            if len(pending) >= self.concurrency * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    task.result()  # re-raise anything a batch did not handle
+            pending.add(asyncio.create_task(self._run_batch(todo[start:start + self.batch_size])))
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            for task in done:
+                task.result()
+        await self._write()
+        return self.report(len(todo), time.perf_counter() - started_at)
+
+    def report(self, total: int, elapsed: float) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction: float) -> float:
+            return round(1000 * latencies[int(fraction * (len(latencies) - 1))], 1) if latencies else 0.0
+
+        return {
+            "products": total,
+            "skipped_from_checkpoint": self.skipped,
+            "written": self.written,
+            "failed": self.failed,
+            "llm_calls": self.calls,
+            "llm_call_failures": self.call_failures,
+            "retries": self.retries,
+            "seconds": round(elapsed, 2),
+            "products_per_second": round(self.written / elapsed, 2) if elapsed else 0.0,
+            "calls_per_second": round(self.calls / elapsed, 2) if elapsed else 0.0,
+            "call_latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": percentile(1.0)},
+        }
@@ -0,0 +1,99 @@
+"""
+Minimal async client for OpenAI-compatible chat completion APIs (OpenAI itself,
+self-hosted gateways, or fake_llm_server.py for load tests)
+"""
+
+import json
+import os
+from typing import AsyncIterator, Dict, List, Optional
+
+try:
+    import httpx
+except ImportError:  # optional: only needed when talking to an OpenAI-compatible endpoint directly
+    httpx = None
+
+
+class LLMError(Exception):
+    """Failed chat completion; ``retryable`` is False for errors a retry will not fix"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class OpenAICompatibleClient:
+    """One pooled HTTP client per base URL, reused across calls"""
+
+    def __init__(self, base_url: Optional[str] = None, api_key: Optional[str] = None, model: str = "gpt-4o",
+                 timeout: float = 60.0, max_connections: int = 100):
+        if httpx is None:
+            raise RuntimeError("httpx is required for OpenAICompatibleClient (pip install httpx)")
+        self.base_url = (base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        self.model = model
+        self.model_key = f"{self.base_url}|{model}"
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @staticmethod
+    def _messages(prompt: str, system: Optional[str]) -> List[Dict[str, str]]:
+        messages = [{"role": "system", "content": system}] if system else []
+        messages.append({"role": "user", "content": prompt})
+        return messages
+
+    @staticmethod
+    def _status_error(status_code: int, body: str) -> LLMError:
+        retryable = status_code == 429 or status_code >= 500
+        return LLMError(f"HTTP {status_code}: {body[:200]}", status_code, retryable)
+
+    async def complete(self, prompt: str, system: Optional[str] = None, temperature: float = 0.7) -> str:
+        """Text of the first choice for a single-turn chat"""
+        try:
+            response = await self._client.post(
+                "/chat/completions",
+                json={"model": self.model, "messages": self._messages(prompt, system), "temperature": temperature},
+            )
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+        if response.status_code >= 400:
+            raise self._status_error(response.status_code, response.text)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed completion response: {e}") from e
+
+    async def stream(self, prompt: str, system: Optional[str] = None, temperature: float = 0.7) -> AsyncIterator[str]:
+        """Text chunks of the first choice as the server generates them (``stream: true``)"""
+        try:
+            async with self._client.stream(
+                "POST",
+                "/chat/completions",
+                json={"model": self.model, "messages": self._messages(prompt, system),
+                      "temperature": temperature, "stream": True},
+            ) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode(errors="replace")
+                    raise self._status_error(response.status_code, body)
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError, AttributeError) as e:
+                        raise LLMError(f"Malformed stream chunk: {e}") from e
+                    if chunk:
+                        yield chunk
+        except httpx.HTTPError as e:
+            raise LLMError(f"{type(e).__name__}: {e}") from e
+
+    async def aclose(self):
+        await self._client.aclose()
@@ -0,0 +1,281 @@
+"""
+Single entry point for every LLM call the API makes: per-feature deadlines and
+concurrency caps, a shared circuit breaker that fails fast while the provider
+is unhealthy, and per-feature call statistics
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+
+from llm_client import LLMError, OpenAICompatibleClient
+from metrics import LLM_CALLS, LLM_LATENCY, LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_TOKENS, estimate_tokens
+
+try:
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+except ImportError:  # optional: the OpenAI-compatible backend does not need it
+    LlmChat = UserMessage = None
+
+
+class LLMUnavailableError(LLMError):
+    """Raised without calling the provider: the circuit is open or the feature is saturated"""
+
+
+class LLMTimeoutError(LLMError):
+    """The provider did not answer within the feature's deadline"""
+
+
+@dataclass
+class FeaturePolicy:
+    timeout: float          # seconds for the whole call, including waiting for a slot
+    max_concurrency: int    # calls in flight for this feature
+
+
+def feature_policy(feature: str, timeout: float, max_concurrency: int) -> FeaturePolicy:
+    """Policy with LLM_<FEATURE>_TIMEOUT / LLM_<FEATURE>_CONCURRENCY environment overrides"""
+    prefix = f"LLM_{feature.upper()}"
+    return FeaturePolicy(
+        timeout=float(os.environ.get(f"{prefix}_TIMEOUT", timeout)),
+        max_concurrency=int(os.environ.get(f"{prefix}_CONCURRENCY", max_concurrency)),
+    )
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds; then lets one trial call through (half-open) and
+    closes again if it succeeds"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._trial_in_flight = False
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected (without claiming the half-open trial)"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at < self.reset_timeout
+        return self.state == "half_open" and self._trial_in_flight
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def abandon(self):
+        """A call ended without an outcome (cancelled); free the half-open trial"""
+        self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, "trips": self.trips}
+
+
+class EmergentBackend:
+    """Calls through emergentintegrations. LlmChat keeps per-session history, so a
+    fresh (cheap) chat object is made per call; the HTTP pooling is the library's."""
+
+    def __init__(self, api_key: Optional[str], provider: str = "openai", model: str = "gpt-4o"):
+        if LlmChat is None:
+            raise RuntimeError("emergentintegrations is required for the emergent LLM backend")
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+        self.model_key = f"{provider}/{model}"
+
+    async def complete(self, prompt: str, system: Optional[str] = None) -> str:
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=f"gateway_{uuid.uuid4()}",
+            system_message=system or "You are a helpful assistant."
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(UserMessage(text=prompt))
+
+    async def stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """emergentintegrations has no streaming API: the whole answer arrives as one chunk"""
+        yield await self.complete(prompt, system)
+
+    async def aclose(self):
+        pass
+
+
+class LLMGateway:
+    """Routes feature calls to one shared backend under per-feature policies"""
+
+    def __init__(self, backend, policies: Dict[str, FeaturePolicy], breaker: Optional[CircuitBreaker] = None,
+                 default_policy: Optional[FeaturePolicy] = None, latency_window: int = 1000):
+        self.backend = backend
+        self.policies = dict(policies)
+        self.breaker = breaker or CircuitBreaker()
+        self.default_policy = default_policy or FeaturePolicy(timeout=30.0, max_concurrency=8)
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._latency_window = latency_window
+
+    @property
+    def model_key(self) -> str:
+        """Identifies the backend and model, e.g. for caching generated text"""
+        return self.backend.model_key
+
+    def _feature(self, feature: str):
+        if feature not in self._semaphores:
+            policy = self.policies.setdefault(feature, self.default_policy)
+            self._semaphores[feature] = asyncio.Semaphore(policy.max_concurrency)
+            self._stats[feature] = {
+                "calls": 0, "succeeded": 0, "failed": 0, "timeouts": 0,
+                "rejected_open": 0, "rejected_saturated": 0, "in_flight": 0,
+                "latencies": deque(maxlen=self._latency_window),
+            }
+        return self.policies[feature], self._semaphores[feature], self._stats[feature]
+
+    def is_available(self) -> bool:
+        """False while the circuit is open, so callers can skip preparing a prompt"""
+        return not self.breaker.is_open()
+
+    @asynccontextmanager
+    async def _call(self, feature: str, prompt: str, system: Optional[str]):
+        """Admission (circuit, concurrency slot) and outcome accounting around one provider
+        call; yields the call's deadline on the ``time.monotonic()`` clock"""
+        policy, semaphore, stats = self._feature(feature)
+        stats["calls"] += 1
+        deadline = time.monotonic() + policy.timeout
+        if self.breaker.is_open():
+            stats["rejected_open"] += 1
+            LLM_CALLS.inc(feature=feature, outcome="rejected_open")
+            raise LLMUnavailableError(f"{feature}: LLM circuit open")
+
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=policy.timeout)
+        except asyncio.TimeoutError:
+            stats["rejected_saturated"] += 1
+            LLM_CALLS.inc(feature=feature, outcome="rejected_saturated")
+            raise LLMUnavailableError(f"{feature}: no free LLM slot within {policy.timeout}s")
+        try:
+            if not self.breaker.allow():
+                stats["rejected_open"] += 1
+                LLM_CALLS.inc(feature=feature, outcome="rejected_open")
+                raise LLMUnavailableError(f"{feature}: LLM circuit open")
+            stats["in_flight"] += 1
+            prompt_chars = len(prompt) + len(system or "")
+            LLM_PROMPT_CHARS.observe(prompt_chars, feature=feature)
+            LLM_TOKENS.inc(prompt_chars // 4, feature=feature, direction="prompt")
+            started_at = time.monotonic()
+            try:
+                yield deadline
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                LLM_CALLS.inc(feature=feature, outcome="timeout")
+                self.breaker.record_failure()
+                raise LLMTimeoutError(f"{feature}: no LLM answer within {policy.timeout}s")
+            except (asyncio.CancelledError, GeneratorExit):
+                # Cancelled, or a stream whose consumer went away
+                LLM_CALLS.inc(feature=feature, outcome="cancelled")
+                self.breaker.abandon()
+                raise
+            except Exception:
+                stats["failed"] += 1
+                LLM_CALLS.inc(feature=feature, outcome="error")
+                self.breaker.record_failure()
+                raise
+            finally:
+                elapsed = time.monotonic() - started_at
+                stats["in_flight"] -= 1
+                stats["latencies"].append(elapsed)
+                LLM_LATENCY.observe(elapsed, feature=feature)
+            self.breaker.record_success()
+            stats["succeeded"] += 1
+            LLM_CALLS.inc(feature=feature, outcome="success")
+        finally:
+            semaphore.release()
+
+    @staticmethod
+    def _record_response(feature: str, text: str):
+        LLM_RESPONSE_CHARS.observe(len(text or ""), feature=feature)
+        LLM_TOKENS.inc(estimate_tokens(text), feature=feature, direction="response")
+
+    async def complete(self, feature: str, prompt: str, system: Optional[str] = None) -> str:
+        """Completion text, or LLMError (LLMUnavailableError / LLMTimeoutError) for the caller's fallback"""
+        async with self._call(feature, prompt, system) as deadline:
+            text = await asyncio.wait_for(
+                self.backend.complete(prompt, system), timeout=max(deadline - time.monotonic(), 0.001)
+            )
+        self._record_response(feature, text)
+        return text
+
+    async def stream(self, feature: str, prompt: str, system: Optional[str] = None) -> AsyncIterator[str]:
+        """Completion text in chunks as the provider produces them, under the same policy
+        as ``complete``: the feature's deadline covers the whole stream"""
+        chunks = []
+        async with self._call(feature, prompt, system) as deadline:
+            iterator = self.backend.stream(prompt, system).__aiter__()
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(
+                            iterator.__anext__(), timeout=max(deadline - time.monotonic(), 0.001)
+                        )
+                    except StopAsyncIteration:
+                        break
+                    chunks.append(chunk)
+                    yield chunk
+            finally:
+                await iterator.aclose()
+        self._record_response(feature, "".join(chunks))
+
+    def stats(self) -> Dict[str, Any]:
+        features = {}
+        for feature, stats in self._stats.items():
+            latencies = sorted(stats["latencies"])
+            features[feature] = {key: value for key, value in stats.items() if key != "latencies"}
+            features[feature]["timeout_seconds"] = self.policies[feature].timeout
+            features[feature]["max_concurrency"] = self.policies[feature].max_concurrency
+            features[feature]["latency_ms"] = {
+                "p50": round(1000 * latencies[len(latencies) // 2], 1) if latencies else 0.0,
+                "p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else 0.0,
+            }
+        return {"breaker": self.breaker.stats(), "features": features}
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+def gateway_from_env(emergent_api_key: Optional[str], policies: Dict[str, FeaturePolicy]) -> LLMGateway:
+    """Gateway configured from LLM_BACKEND ("emergent" or "openai"), LLM_BASE_URL, LLM_MODEL
+    and the LLM_BREAKER_* settings. LLM_BACKEND=openai with LLM_BASE_URL pointing at
+    fake_llm_server.py exercises every AI path against injected latency and errors."""
+    model = os.environ.get("LLM_MODEL", "gpt-4o")
+    if os.environ.get("LLM_BACKEND", "emergent").lower() == "openai":
+        backend = OpenAICompatibleClient(os.environ.get("LLM_BASE_URL"), api_key=os.environ.get("LLM_API_KEY"), model=model)
+    else:
+        backend = EmergentBackend(emergent_api_key, provider="openai", model=model)
+    breaker = CircuitBreaker(
+        failure_threshold=int(os.environ.get("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.environ.get("LLM_BREAKER_RESET_SECONDS", "30")),
+    )
+    return LLMGateway(backend, policies, breaker)
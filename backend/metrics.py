@@ -0,0 +1,249 @@
+"""
+In-process counters and histograms, rendered in the Prometheus text format (or
+as JSON) by the /api/metrics endpoint. Metrics are per process; with several
+workers, scrape each one or sum them downstream.
+"""
+
+import bisect
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+
+def escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labelnames: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in values]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in values]
+
+
+class Histogram:
+    """Bucketed observations per label combination, with sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: Dict[LabelValues, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            series["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def quantile(self, series: Dict[str, Any], q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)"""
+        if not series["count"]:
+            return None
+        rank, seen = q * series["count"], 0
+        for bound, count in zip(self.buckets, series["counts"]):
+            seen += count
+            if seen >= rank:
+                return bound if bound != math.inf else self.buckets[-2]
+        return self.buckets[-2]
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series_items = sorted((key, dict(series, counts=list(series["counts"]))) for key, series in self._series.items())
+        for key, series in series_items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {format_value(round(series['sum'], 6))}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            series_items = sorted((key, dict(series, counts=list(series["counts"]))) for key, series in self._series.items())
+        return [
+            {
+                "labels": dict(zip(self.labelnames, key)),
+                "count": series["count"],
+                "sum": round(series["sum"], 6),
+                "avg": round(series["sum"] / series["count"], 6) if series["count"] else None,
+                "p50": self.quantile(series, 0.5),
+                "p95": self.quantile(series, 0.95),
+            }
+            for key, series in series_items
+        ]
+
+
+class CallbackMetric:
+    """Counter or gauge whose samples are read at scrape time from existing stats"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]], type: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+        self.type = type
+
+    def _samples(self) -> List[Tuple[LabelValues, float]]:
+        return [(tuple(str(labels.get(name, "")) for name in self.labelnames), value) for labels, value in self.collect()]
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in self._samples()]
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": dict(zip(self.labelnames, key)), "value": value} for key, value in self._samples()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, labelnames: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Dict[str, Any], float]]], type: str = "gauge") -> CallbackMetric:
+        return self._register(CallbackMetric(name, documentation, labelnames, collect, type))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.render()
+            except Exception as e:  # a broken stats callback must not take the whole scrape down
+                print(f"Metric {metric.name} failed to render: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = {}
+        for metric in self._metrics.values():
+            try:
+                snapshot[metric.name] = metric.snapshot()
+            except Exception as e:
+                print(f"Metric {metric.name} failed to snapshot: {e}")
+        return snapshot
+
+
+registry = MetricsRegistry()
+
+# AI / LLM instrumentation shared by the gateway and the AI features. Token counts
+# are estimated from text length (~4 characters per token).
+LLM_CALLS = registry.counter(
+    "llm_calls_total", "LLM calls by feature and outcome (success, error, timeout, cancelled, rejected_open, rejected_saturated)",
+    ["feature", "outcome"])
+LLM_LATENCY = registry.histogram(
+    "llm_call_seconds", "Wall time of LLM calls that reached the provider", ["feature"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32))
+LLM_PROMPT_CHARS = registry.histogram(
+    "llm_prompt_chars", "Prompt size (system + user) in characters", ["feature"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
+LLM_RESPONSE_CHARS = registry.histogram(
+    "llm_response_chars", "Response size in characters", ["feature"],
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_estimated_total", "Estimated tokens sent (prompt) and received (response)", ["feature", "direction"])
+AI_REQUESTS = registry.counter(
+    "ai_requests_total", "Requests that wanted an AI answer, by feature", ["feature"])
+AI_FALLBACKS = registry.counter(
+    "ai_fallbacks_total", "AI requests answered by a non-AI fallback, by feature and reason", ["feature", "reason"])
+AI_PARSE_FAILURES = registry.counter(
+    "ai_json_parse_failures_total", "LLM answers that were not the JSON the feature asked for", ["feature"])
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    return len(text or "") // 4
+
+
+def ai_feature_summary(features: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Per-feature request, fallback and LLM spend totals for dashboards and the JSON view"""
+    summary = {}
+    for feature in features:
+        requests = AI_REQUESTS.value(feature=feature)
+        fallbacks = sum(sample["value"] for sample in AI_FALLBACKS.snapshot() if sample["labels"]["feature"] == feature)
+        calls = {sample["labels"]["outcome"]: sample["value"] for sample in LLM_CALLS.snapshot()
+                 if sample["labels"]["feature"] == feature}
+        latency = next((series for series in LLM_LATENCY.snapshot() if series["labels"]["feature"] == feature), None)
+        summary[feature] = {
+            "requests": requests,
+            "fallbacks": fallbacks,
+            "fallback_rate": round(fallbacks / requests, 4) if requests else 0.0,
+            "llm_calls": calls,
+            "parse_failures": AI_PARSE_FAILURES.value(feature=feature),
+            "prompt_tokens": LLM_TOKENS.value(feature=feature, direction="prompt"),
+            "response_tokens": LLM_TOKENS.value(feature=feature, direction="response"),
+            "latency_seconds": {"p50": latency["p50"], "p95": latency["p95"]} if latency else None,
+        }
+    return summary
@@ -165,7 +165,9 @@ class Product(BaseModel):
     reviews_count: int = 0
     tags: List[str] = []
     ai_generated_description: Optional[str] = None
+    ai_description_status: Optional[str] = None  # pending | ready | failed
     seller_id: Optional[str] = None
+    popularity_score: float = 0.0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_active: bool = True
@@ -186,14 +188,23 @@ class Review(BaseModel):
     user_id: str
     rating: int
     comment: str
+    # Copied from the reviewer's profile (see reviews.py)
+    user_name: Optional[str] = None
+    user_avatar: Optional[str] = None
+    reviewer_synced_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     is_approved: bool = True
 
+class ReviewModeration(BaseModel):
+    review_ids: List[str] = Field(..., min_length=1, max_length=1000)
+    is_approved: bool
+
 class ReviewResponse(BaseModel):
     id: str
     product_id: str
     user_name: str
+    user_avatar: Optional[str] = None
     rating: int
     comment: str
     created_at: datetime
@@ -394,6 +405,8 @@ class NotificationType(str, Enum):
     PRODUCT_REVIEW = "product_review"
     SELLER_APPLICATION = "seller_application"
     PROMOTION = "promotion"
+    PRICE_DROP = "price_drop"
+    BACK_IN_STOCK = "back_in_stock"
 
 class NotificationChannel(str, Enum):
     EMAIL = "email"
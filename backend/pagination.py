@@ -0,0 +1,69 @@
+"""
+Paginated reads with a configurable strategy for computing result totals
+"""
+
+import json
+import os
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import TTLCache
+
+
+class CountMode(str, Enum):
+    EXACT = "exact"        # count_documents on every request
+    CACHED = "cached"      # count_documents, memoized per normalized query for COUNT_CACHE_TTL seconds
+    HAS_MORE = "has_more"  # no count: fetch limit + 1 documents and report whether more exist
+
+
+count_cache = TTLCache(
+    maxsize=int(os.environ.get("COUNT_CACHE_SIZE", "5000")),
+    ttl=float(os.environ.get("COUNT_CACHE_TTL", "30"))
+)
+
+
+def count_cache_key(collection, query: Dict[str, Any]) -> Tuple[str, str]:
+    return collection.full_name, json.dumps(query, sort_keys=True, default=str)
+
+
+def count_documents(collection, query: Dict[str, Any], mode: CountMode) -> int:
+    if mode == CountMode.CACHED:
+        key = count_cache_key(collection, query)
+        total = count_cache.get(key)
+        if total is None:
+            total = collection.count_documents(query)
+            count_cache.set(key, total)
+        return total
+    return collection.count_documents(query)
+
+
+def paginate(collection, query: Dict[str, Any], sort: List[Tuple[str, int]], skip: int, limit: int,
+             mode: CountMode = CountMode.EXACT, projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Fetch one page of ``query`` results plus paging info.
+
+    Returns the documents under ``items`` along with ``total``, ``page``,
+    ``pages`` and ``has_more``. In ``has_more`` mode ``total`` and ``pages``
+    are None unless this page is the last one.
+    """
+    fetch_limit = limit + 1 if mode == CountMode.HAS_MORE else limit
+    items = list(collection.find(query, projection).sort(sort).skip(skip).limit(fetch_limit))
+
+    if mode == CountMode.HAS_MORE:
+        has_more = len(items) > limit
+        items = items[:limit]
+        total = None if has_more else skip + len(items)
+    elif len(items) < limit and (items or skip == 0):
+        # A short page is the last page, so the total is known without counting
+        total = skip + len(items)
+        has_more = False
+    else:
+        total = count_documents(collection, query, mode)
+        has_more = skip + len(items) < total
+
+    return {
+        "items": items,
+        "total": total,
+        "page": skip // limit + 1 if limit else 1,
+        "pages": (total + limit - 1) // limit if total is not None and limit else None,
+        "has_more": has_more,
+    }
@@ -0,0 +1,180 @@
+"""
+Time-decayed product popularity: orders, cart adds, wishlist adds and views
+are blended into one score per product, recomputed periodically and stored on
+the product as ``popularity_score``
+"""
+
+import asyncio
+import math
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo import UpdateOne
+
+# How much one event of each kind is worth relative to a unit ordered
+POPULARITY_SIGNAL_WEIGHTS = {"orders": 5.0, "cart_adds": 2.0, "wishlist_adds": 1.5, "views": 0.1}
+ACTIVITY_RETENTION = timedelta(days=120)
+
+
+def day_key(timestamp: datetime) -> str:
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.strftime("%Y-%m-%d")
+
+
+def decay_factor(day: str, now: datetime, half_life_days: float) -> float:
+    """Weight of events from ``day`` (middle of the UTC day): halves every ``half_life_days``"""
+    day_start = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    age_days = max((now - day_start).total_seconds() / 86400 - 0.5, 0.0)
+    return math.pow(0.5, age_days / half_life_days)
+
+
+class ActivityCounter:
+    """In-memory view and cart-add counts, flushed as daily ``$inc`` upserts.
+
+    Counting happens on the request path without touching the database; a
+    background task writes one document per (product, day) every
+    ``flush_interval`` seconds.
+    """
+
+    def __init__(self, collection, flush_interval: float = 30.0):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._counts: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._task = None
+        self.flushes = 0
+        self.failed = 0
+
+    def record(self, product_id: str, signal: str, amount: int = 1):
+        key = (product_id, day_key(datetime.now(timezone.utc)))
+        with self._lock:
+            self._counts[key][signal] += amount
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await asyncio.shield(self.flush())
+
+    async def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, defaultdict(Counter)
+        if not counts:
+            return
+        updates = []
+        for (product_id, day), signals in counts.items():
+            expires_at = datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc) + ACTIVITY_RETENTION
+            updates.append(UpdateOne(
+                {"product_id": product_id, "day": day},
+                {"$inc": dict(signals), "$setOnInsert": {"expires_at": expires_at}},
+                upsert=True,
+            ))
+        try:
+            await asyncio.to_thread(self.collection.bulk_write, updates, ordered=False)
+            self.flushes += 1
+        except Exception as e:
+            self.failed += len(updates)
+            print(f"Product activity flush failed ({len(updates)} products): {e}")
+
+
+def daily_order_units(orders_collection, since: datetime) -> Iterable[Dict[str, Any]]:
+    """Units ordered per (product, day) since ``since``"""
+    return orders_collection.aggregate([
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {
+                "product_id": "$items.product_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            },
+            "count": {"$sum": {"$ifNull": ["$items.quantity", 1]}},
+        }},
+    ])
+
+
+def daily_wishlist_adds(wishlist_collection, since: datetime) -> Iterable[Dict[str, Any]]:
+    """Wishlist adds per (product, day) since ``since``, from the items' ``added_at``"""
+    return wishlist_collection.aggregate([
+        {"$match": {"items.added_at": {"$gte": since}}},
+        {"$unwind": "$items"},
+        {"$match": {"items.added_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {
+                "product_id": "$items.product_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$items.added_at"}},
+            },
+            "count": {"$sum": 1},
+        }},
+    ])
+
+
+def compute_popularity(orders_collection, wishlist_collection, activity_collection, products_collection,
+                       half_life_days: float = 7.0, window_days: int = 60,
+                       batch_size: int = 1000, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Recompute and store ``popularity_score`` for every product with recent activity.
+
+    Each event contributes its signal weight times 0.5 ** (age / half-life);
+    events older than ``window_days`` are ignored. Products whose activity
+    has aged out are reset to 0.
+    """
+    started = time.perf_counter()
+    now = now or datetime.now(timezone.utc)
+    since = now - timedelta(days=window_days)
+    scores: Dict[str, float] = defaultdict(float)
+    decay_cache: Dict[str, float] = {}
+
+    def add(product_id: Optional[str], day: Optional[str], signal: str, count: float):
+        if not product_id or not day or not count:
+            return
+        if day not in decay_cache:
+            decay_cache[day] = decay_factor(day, now, half_life_days)
+        scores[product_id] += POPULARITY_SIGNAL_WEIGHTS[signal] * count * decay_cache[day]
+
+    for row in daily_order_units(orders_collection, since):
+        add(row["_id"].get("product_id"), row["_id"].get("day"), "orders", row["count"])
+    for row in daily_wishlist_adds(wishlist_collection, since):
+        add(row["_id"].get("product_id"), row["_id"].get("day"), "wishlist_adds", row["count"])
+    for row in activity_collection.find({"day": {"$gte": day_key(since)}}, {"_id": 0}):
+        for signal in ("views", "cart_adds"):
+            add(row.get("product_id"), row.get("day"), signal, row.get(signal, 0))
+
+    build_id = str(uuid.uuid4())
+    batch = []
+    for product_id, score in scores.items():
+        batch.append(UpdateOne(
+            {"id": product_id},
+            {"$set": {"popularity_score": round(score, 4), "popularity_build": build_id}},
+        ))
+        if len(batch) >= batch_size:
+            products_collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        products_collection.bulk_write(batch, ordered=False)
+    reset = products_collection.update_many(
+        {"popularity_score": {"$gt": 0}, "popularity_build": {"$ne": build_id}},
+        {"$set": {"popularity_score": 0.0, "popularity_build": build_id}},
+    )
+
+    return {
+        "scored_products": len(scores),
+        "reset_products": reset.modified_count,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
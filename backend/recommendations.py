@@ -0,0 +1,263 @@
+"""
+Item-item co-purchase recommendations mined from order baskets.
+
+The model is built offline (build_recommendations.py or the admin rebuild
+endpoint) and stored as the top-N neighbours of every product, so serving a
+recommendation is a couple of indexed reads and no model computation.
+"""
+
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pymongo import ReplaceOne, UpdateOne
+
+# bundle_stats document holding the total number of order baskets
+BASKET_TOTAL_KEY = "__all_orders__"
+# Larger baskets (bulk/B2B orders) are capped so pair updates stay bounded
+BUNDLE_MAX_BASKET = 50
+
+
+def basket_product_ids(items: Optional[Iterable[Dict[str, Any]]]) -> List[str]:
+    basket = {item.get("product_id") for item in items or []}
+    basket.discard(None)
+    return sorted(basket)
+
+
+def order_baskets(orders_collection) -> Iterable[List[str]]:
+    """Distinct product ids of every order"""
+    for order in orders_collection.find({}, {"_id": 0, "items.product_id": 1}):
+        basket = basket_product_ids(order.get("items"))
+        if basket:
+            yield basket
+
+
+def cooccurrence_matrix(baskets: Iterable[Sequence[str]]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Sparse (COO) item-item co-occurrence counts.
+
+    Returns the product ids, the number of baskets containing each product,
+    and parallel row/column/count arrays with one entry per ordered pair of
+    distinct products bought together at least once.
+    """
+    product_index: Dict[str, int] = {}
+    pair_rows, pair_cols = [], []
+    frequencies: List[int] = []
+    for basket in baskets:
+        indices = []
+        for product_id in basket:
+            index = product_index.setdefault(product_id, len(product_index))
+            if index == len(frequencies):
+                frequencies.append(0)
+            frequencies[index] += 1
+            indices.append(index)
+        if len(indices) < 2:
+            continue
+        indices = np.asarray(indices, dtype=np.int64)
+        rows, cols = np.meshgrid(indices, indices, indexing="ij")
+        mask = rows != cols
+        pair_rows.append(rows[mask])
+        pair_cols.append(cols[mask])
+
+    product_ids = list(product_index)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    if not pair_rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return product_ids, frequencies, empty, empty, np.zeros(0, dtype=np.float64)
+
+    size = len(product_ids)
+    keys = np.concatenate(pair_rows) * size + np.concatenate(pair_cols)
+    keys, counts = np.unique(keys, return_counts=True)
+    return product_ids, frequencies, keys // size, keys % size, counts.astype(np.float64)
+
+
+def top_neighbors(product_ids: List[str], frequencies: np.ndarray, rows: np.ndarray, cols: np.ndarray,
+                  counts: np.ndarray, top_n: int = 20, min_count: int = 1) -> Dict[str, List[Dict[str, Any]]]:
+    """Top-N neighbours per product, scored by cosine similarity of purchase vectors"""
+    keep = counts >= min_count
+    rows, cols, counts = rows[keep], cols[keep], counts[keep]
+    scores = counts / np.sqrt(frequencies[rows] * frequencies[cols])
+
+    order = np.lexsort((-scores, rows))
+    rows, cols, counts, scores = rows[order], cols[order], counts[order], scores[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.zeros(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(rows)]
+
+    neighbors = {}
+    for start, end in zip(starts, ends):
+        end = min(end, start + top_n)
+        neighbors[product_ids[rows[start]]] = [
+            {"product_id": product_ids[cols[i]], "score": round(float(scores[i]), 6), "count": int(counts[i])}
+            for i in range(start, end)
+        ]
+    return neighbors
+
+
+def build_copurchase_model(orders_collection, neighbors_collection, top_n: int = 20,
+                           min_count: int = 1, batch_size: int = 1000) -> Dict[str, Any]:
+    """Rebuild the product_neighbors table from all order baskets"""
+    started = time.perf_counter()
+    build_id = str(uuid.uuid4())
+    product_ids, frequencies, rows, cols, counts = cooccurrence_matrix(order_baskets(orders_collection))
+    neighbors = top_neighbors(product_ids, frequencies, rows, cols, counts, top_n, min_count)
+
+    built_at = datetime.now(timezone.utc)
+    batch = []
+    for product_id, product_neighbors in neighbors.items():
+        batch.append(ReplaceOne(
+            {"product_id": product_id},
+            {"product_id": product_id, "neighbors": product_neighbors, "build_id": build_id, "updated_at": built_at},
+            upsert=True,
+        ))
+        if len(batch) >= batch_size:
+            neighbors_collection.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        neighbors_collection.bulk_write(batch, ordered=False)
+    # Products that no longer co-occur with anything keep no stale neighbours
+    neighbors_collection.delete_many({"build_id": {"$ne": build_id}})
+
+    return {
+        "products": len(product_ids),
+        "products_with_neighbors": len(neighbors),
+        "pairs": int(len(counts)),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def blend_neighbors(sources: List[Tuple[Optional[Dict[str, Any]], float]], exclude: Iterable[str],
+                    limit: int = 6) -> List[str]:
+    """Merge precomputed neighbour lists, each weighted by how much its source matters.
+
+    ``sources`` pairs a product_neighbors document (or None) with a weight,
+    e.g. the product being viewed at 1.0 and the user's recent purchases at
+    lower weights. Products in ``exclude`` are never returned.
+    """
+    excluded = set(exclude)
+    scores = defaultdict(float)
+    for document, weight in sources:
+        if not document:
+            continue
+        for neighbor in document.get("neighbors", []):
+            if neighbor["product_id"] not in excluded:
+                scores[neighbor["product_id"]] += weight * neighbor["score"]
+    return [product_id for product_id, _ in sorted(scores.items(), key=lambda item: -item[1])[:limit]]
+
+
+# Frequently bought together: one edge per ordered product pair in bundle_pairs,
+# with per-product basket counts (and the total) in bundle_stats.
+
+def bundle_metrics(pair_count: float, product_count: float, other_count: float, total: float) -> Dict[str, float]:
+    """Association metrics of the rule "bought product -> also bought other" """
+    pair_count, product_count, other_count, total = map(float, (pair_count, product_count, other_count, total))
+    return {
+        "support": round(pair_count / total, 6) if total else 0.0,
+        "confidence": round(pair_count / product_count, 6) if product_count else 0.0,
+        "lift": round(pair_count * total / (product_count * other_count), 4) if product_count and other_count else 0.0,
+    }
+
+
+def record_basket(items: Iterable[Dict[str, Any]], stats_collection, pairs_collection):
+    """Fold one new order into the bundle tables.
+
+    Pair and basket counts are exact. Metrics are refreshed only on the edges
+    inside this basket, so other edges of these products drift slightly
+    until the next full rebuild (build_bundle_model).
+    """
+    basket = basket_product_ids(items)[:BUNDLE_MAX_BASKET]
+    if not basket:
+        return
+    stats_collection.bulk_write(
+        [UpdateOne({"_id": BASKET_TOTAL_KEY}, {"$inc": {"orders": 1}}, upsert=True)]
+        + [UpdateOne({"_id": product_id}, {"$inc": {"orders": 1}}, upsert=True) for product_id in basket],
+        ordered=False,
+    )
+    if len(basket) < 2:
+        return
+
+    pairs_collection.bulk_write([
+        UpdateOne({"product_id": product_id, "other_id": other_id}, {"$inc": {"pair_count": 1}}, upsert=True)
+        for product_id in basket for other_id in basket if product_id != other_id
+    ], ordered=False)
+
+    counts = {doc["_id"]: doc.get("orders", 0) for doc in stats_collection.find({"_id": {"$in": basket + [BASKET_TOTAL_KEY]}})}
+    total = counts.get(BASKET_TOTAL_KEY, 0)
+    edges = pairs_collection.find(
+        {"product_id": {"$in": basket}, "other_id": {"$in": basket}},
+        {"_id": 1, "product_id": 1, "other_id": 1, "pair_count": 1},
+    )
+    pairs_collection.bulk_write([
+        UpdateOne({"_id": edge["_id"]}, {"$set": bundle_metrics(
+            edge["pair_count"], counts.get(edge["product_id"], 0), counts.get(edge["other_id"], 0), total
+        )})
+        for edge in edges
+    ], ordered=False)
+
+
+def build_bundle_model(orders_collection, stats_collection, pairs_collection, batch_size: int = 1000) -> Dict[str, Any]:
+    """Recount every basket from scratch, replacing both bundle tables"""
+    started = time.perf_counter()
+    build_id = str(uuid.uuid4())
+    total = 0
+
+    def counted_baskets():
+        nonlocal total
+        for basket in order_baskets(orders_collection):
+            total += 1
+            yield basket[:BUNDLE_MAX_BASKET]
+
+    product_ids, frequencies, rows, cols, counts = cooccurrence_matrix(counted_baskets())
+
+    def write(collection, batch):
+        if batch:
+            collection.bulk_write(batch, ordered=False)
+        return []
+
+    batch = [ReplaceOne({"_id": BASKET_TOTAL_KEY}, {"orders": total, "build_id": build_id}, upsert=True)]
+    for product_id, frequency in zip(product_ids, frequencies):
+        batch.append(ReplaceOne({"_id": product_id}, {"orders": int(frequency), "build_id": build_id}, upsert=True))
+        if len(batch) >= batch_size:
+            batch = write(stats_collection, batch)
+    write(stats_collection, batch)
+
+    batch = []
+    for row, col, count in zip(rows, cols, counts):
+        edge = {"product_id": product_ids[row], "other_id": product_ids[col], "pair_count": int(count), "build_id": build_id}
+        edge.update(bundle_metrics(count, frequencies[row], frequencies[col], total))
+        batch.append(ReplaceOne({"product_id": edge["product_id"], "other_id": edge["other_id"]}, edge, upsert=True))
+        if len(batch) >= batch_size:
+            batch = write(pairs_collection, batch)
+    write(pairs_collection, batch)
+
+    stats_collection.delete_many({"build_id": {"$ne": build_id}})
+    pairs_collection.delete_many({"build_id": {"$ne": build_id}})
+    return {
+        "baskets": total,
+        "products": len(product_ids),
+        "pairs": int(len(counts)),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def rank_bundles(edges: Iterable[Dict[str, Any]], exclude: Iterable[str], limit: int = 4) -> List[Dict[str, Any]]:
+    """Rank bundle candidates for a basket from its products' qualifying edges.
+
+    A candidate's score is the sum of the confidences of the rules that lead
+    to it, so products that go with several basket items rank first.
+    """
+    excluded = set(exclude)
+    candidates: Dict[str, Dict[str, Any]] = {}
+    for edge in edges:
+        other_id = edge["other_id"]
+        if other_id in excluded:
+            continue
+        candidate = candidates.setdefault(other_id, {"product_id": other_id, "score": 0.0, "lift": 0.0, "bought_with": []})
+        candidate["score"] += edge.get("confidence", 0.0)
+        candidate["lift"] = max(candidate["lift"], edge.get("lift", 0.0))
+        candidate["bought_with"].append(edge["product_id"])
+    ranked = sorted(candidates.values(), key=lambda candidate: (-candidate["score"], -candidate["lift"]))
+    for candidate in ranked:
+        candidate["score"] = round(candidate["score"], 4)
+    return ranked[:limit]
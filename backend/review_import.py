@@ -0,0 +1,246 @@
+"""
+Bulk review import from NDJSON (one review per line), e.g. when migrating from
+another platform. Lines are validated a batch at a time (one product lookup and
+one reviewer lookup per batch) and written with unordered ``insert_many``;
+the summaries of the products in a batch then get one ``$inc`` each for the
+reviews actually inserted, and the ratings of their sellers are moved by the
+same amounts.
+
+Each line is a JSON object::
+
+    {"product_id": "...", "rating": 5, "comment": "...",
+     "user_id": "..." | "user_email": "..." | "source_user_id": "...",
+     "user_name": "...", "created_at": "2023-04-01T12:00:00Z", "is_approved": true}
+
+Reviewers are matched to existing users by ``user_id`` or ``user_email``;
+reviewers without an account here keep ``source_user_id`` (prefixed with the
+import source) and the ``user_name`` given on the line. Re-importing a file is
+safe: the unique (product_id, user_id) index turns repeats into duplicates.
+"""
+
+import json
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from reviews import REVIEWER_PROJECTION, apply_summary_incs, reviewer_fields, seller_rating_on_review, summary_incs
+
+DUPLICATE_KEY_ERROR = 11000
+MAX_COMMENT_LENGTH = 5000
+MAX_ERROR_SAMPLES = 20
+
+
+class ReviewValidationError(ValueError):
+    pass
+
+
+def parse_rating(value: Any) -> int:
+    if isinstance(value, bool):
+        raise ReviewValidationError("rating must be an integer from 1 to 5")
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value.strip())
+    if not isinstance(value, int) or not 1 <= value <= 5:
+        raise ReviewValidationError("rating must be an integer from 1 to 5")
+    return value
+
+
+def parse_timestamp(value: Any) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    if not isinstance(value, str):
+        raise ReviewValidationError("created_at must be an ISO 8601 string")
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ReviewValidationError(f"created_at is not an ISO 8601 timestamp: {value!r}")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def validate_record(record: Any) -> Dict[str, Any]:
+    """Checked, normalized fields of one import line (reviewer not resolved yet)"""
+    if not isinstance(record, dict):
+        raise ReviewValidationError("line is not a JSON object")
+    product_id = record.get("product_id")
+    if not isinstance(product_id, str) or not product_id:
+        raise ReviewValidationError("product_id is required")
+    comment = record.get("comment")
+    if not isinstance(comment, str):
+        raise ReviewValidationError("comment must be a string")
+    if len(comment) > MAX_COMMENT_LENGTH:
+        raise ReviewValidationError(f"comment is longer than {MAX_COMMENT_LENGTH} characters")
+    reviewer = {key: record.get(key) for key in ("user_id", "user_email", "source_user_id") if record.get(key)}
+    if not reviewer:
+        raise ReviewValidationError("one of user_id, user_email or source_user_id is required")
+    if not all(isinstance(value, (str, int)) for value in reviewer.values()):
+        raise ReviewValidationError("reviewer ids must be strings")
+    is_approved = record.get("is_approved")
+    if is_approved is not None and not isinstance(is_approved, bool):
+        raise ReviewValidationError("is_approved must be true or false")
+    return {
+        "id": str(record.get("id") or uuid.uuid4()),
+        "product_id": product_id,
+        "rating": parse_rating(record.get("rating")),
+        "comment": comment.strip(),
+        "created_at": parse_timestamp(record.get("created_at")),
+        "is_approved": is_approved,
+        "user_name": record.get("user_name") if isinstance(record.get("user_name"), str) else None,
+        **{key: str(value).strip() for key, value in reviewer.items()},
+    }
+
+
+class ReviewImporter:
+    """Validates and inserts reviews in batches and adds them to the summaries of
+    their products and the ratings of their sellers. ``approve`` is the moderation state for lines
+    without ``is_approved`` (False sends them to the moderation queue).
+
+    Summaries and seller ratings are updated right after each batch is inserted, so
+    an aborted import has counted everything it inserted, except possibly its last
+    batch; a re-run sees those reviews as duplicates and cannot count them, so run
+    ``backfill_reviews.py summaries sellers`` after an import that died mid-batch."""
+
+    def __init__(self, reviews_collection, products_collection, users_collection, summaries_collection,
+                 sellers_collection, batch_size: int = 1000, approve: bool = True, source: str = "import",
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.reviews_collection = reviews_collection
+        self.products_collection = products_collection
+        self.users_collection = users_collection
+        self.summaries_collection = summaries_collection
+        self.sellers_collection = sellers_collection
+        self.batch_size = max(1, batch_size)
+        self.approve = approve
+        self.source = source
+        self.progress = progress
+        self.read = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.affected_products = set()
+        self._started_at = time.perf_counter()
+        self._write_seconds = 0.0
+
+    def _error(self, line_number: int, message: str):
+        if len(self.errors) < MAX_ERROR_SAMPLES:
+            self.errors.append({"line": line_number, "error": message})
+
+    def _resolve(self, batch: List[Tuple[int, Dict[str, Any]]]) -> List[Tuple[int, Dict[str, Any]]]:
+        """(line number, review document) for the lines whose product and reviewer check out"""
+        product_ids = list({record["product_id"] for _, record in batch})
+        known_products = {product["id"] for product in self.products_collection.find(
+            {"id": {"$in": product_ids}}, {"_id": 0, "id": 1}
+        )}
+        user_ids = list({record["user_id"] for _, record in batch if "user_id" in record})
+        emails = list({record["user_email"].lower() for _, record in batch if "user_email" in record})
+        users_by_id, users_by_email = {}, {}
+        if user_ids or emails:
+            for user in self.users_collection.find(
+                {"$or": [{"id": {"$in": user_ids}}, {"email": {"$in": emails}}]},
+                {**REVIEWER_PROJECTION, "email": 1}
+            ):
+                users_by_id[user["id"]] = user
+                users_by_email[(user.get("email") or "").lower()] = user
+
+        now = datetime.now(timezone.utc)
+        documents = []
+        for line_number, record in batch:
+            if record["product_id"] not in known_products:
+                self.invalid += 1
+                self._error(line_number, f"unknown product {record['product_id']}")
+                continue
+            user = users_by_id.get(record.get("user_id"))
+            if user is None and "user_email" in record:
+                user = users_by_email.get(record["user_email"].lower())
+            if user:
+                user_id, fields = user["id"], reviewer_fields(user)
+            elif "source_user_id" in record:
+                user_id = f"{self.source}:{record['source_user_id']}"
+                fields = {"user_name": record["user_name"] or "Anonymous", "user_avatar": None,
+                          "reviewer_synced_at": None}
+            else:
+                self.invalid += 1
+                self._error(line_number, "reviewer not found")
+                continue
+            documents.append((line_number, {
+                "id": record["id"],
+                "product_id": record["product_id"],
+                "user_id": user_id,
+                "rating": record["rating"],
+                "comment": record["comment"],
+                **fields,
+                "created_at": record["created_at"],
+                "updated_at": now,
+                "is_approved": self.approve if record["is_approved"] is None else record["is_approved"],
+                "import_source": self.source,
+            }))
+        return documents
+
+    def _write(self, batch: List[Tuple[int, Dict[str, Any]]]):
+        documents = self._resolve(batch)
+        if not documents:
+            return
+        started_at = time.perf_counter()
+        failed_indexes = set()
+        try:
+            # Unordered: one bad document does not stop the rest of the batch
+            self.reviews_collection.insert_many([document for _, document in documents], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed_indexes.add(error["index"])
+                if error.get("code") == DUPLICATE_KEY_ERROR:
+                    self.duplicates += 1
+                else:
+                    self.failed += 1
+                    self._error(documents[error["index"]][0], error.get("errmsg", "write error"))
+        self._write_seconds += time.perf_counter() - started_at
+        self.inserted += len(documents) - len(failed_indexes)
+        inserted = [document for index, (_, document) in enumerate(documents) if index not in failed_indexes]
+        self.affected_products.update(document["product_id"] for document in inserted)
+
+        # One $inc per product for the batch; sellers move by the same amounts
+        incs = summary_incs(inserted)
+        apply_summary_incs(self.reviews_collection, self.summaries_collection, incs)
+        seller_rating_on_review(self.products_collection, self.summaries_collection, self.sellers_collection, {
+            product_id: (inc.get("count", 0), inc.get("rating_sum", 0)) for product_id, inc in incs.items()
+        })
+
+    def run(self, lines: Iterable[str]) -> Dict[str, Any]:
+        self._started_at = time.perf_counter()
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        for line_number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", errors="replace")
+            if not line.strip():
+                continue
+            self.read += 1
+            try:
+                batch.append((line_number, validate_record(json.loads(line))))
+            except (ValueError, ReviewValidationError) as e:  # JSONDecodeError is a ValueError
+                self.invalid += 1
+                self._error(line_number, str(e))
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+                if self.progress:
+                    self.progress(self.report())
+        if batch:
+            self._write(batch)
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._started_at
+        return {
+            "read": self.read,
+            "inserted": self.inserted,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "failed": self.failed,
+            "products_updated": len(self.affected_products),
+            "seconds": round(elapsed, 2),
+            "write_seconds": round(self._write_seconds, 2),
+            "reviews_per_second": round(self.inserted / elapsed, 1) if elapsed else 0.0,
+            "errors": self.errors,
+        }
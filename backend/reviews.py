@@ -0,0 +1,459 @@
+"""
+Review helpers. The reviewer's name and avatar are copied onto each review when
+it is written, so review pages are served from one indexed query without a user
+lookup per review; profile changes are copied over afterwards.
+
+Each product also has a ``review_summaries`` document (star distribution,
+approved count and rating sum, pending count, latest approved review ids) kept
+current with ``$inc`` on every review write, so averages and histograms are one
+read instead of a scan of the product's reviews.
+
+Seller profiles carry the same approved count and rating sum over all of the
+seller's active products (``rating_count``, ``rating_sum``, ``average_rating``),
+moved by the change in each product summary, so the seller dashboard reads one
+document instead of every review of every product the seller has.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+REVIEWER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "avatar": 1, "updated_at": 1}
+
+
+def reviewer_fields(user: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Denormalized reviewer fields for a review; deleted users show as Anonymous.
+
+    ``reviewer_synced_at`` is the user's ``updated_at`` the copy was taken from,
+    so an older copy never overwrites a newer one.
+    """
+    if not user:
+        return {"user_name": "Anonymous", "user_avatar": None, "reviewer_synced_at": None}
+    return {
+        "user_name": user.get("name") or "Anonymous",
+        "user_avatar": user.get("avatar"),
+        "reviewer_synced_at": user.get("updated_at"),
+    }
+
+
+def sync_reviewer_profile(reviews_collection, users_collection, user_id: str) -> int:
+    """Copy the user's current name and avatar onto all of their reviews"""
+    user = users_collection.find_one({"id": user_id}, REVIEWER_PROJECTION)
+    if not user:
+        return 0
+    fields = reviewer_fields(user)
+    result = reviews_collection.update_many(
+        {"user_id": user_id, "reviewer_synced_at": {"$not": {"$gt": fields["reviewer_synced_at"]}}},
+        {"$set": fields}
+    )
+    return result.modified_count
+
+
+def backfill_reviewer_fields(reviews_collection, users_collection, batch_size: int = 500,
+                             refresh_all: bool = False) -> Dict[str, int]:
+    """Set reviewer fields on reviews written before they were stored (or on every
+    review with ``refresh_all``), one user lookup per batch of reviewers"""
+    query = {} if refresh_all else {"user_name": {"$exists": False}}
+    reviewer_ids = reviews_collection.aggregate(
+        [{"$match": query}, {"$group": {"_id": "$user_id"}}], allowDiskUse=True
+    )
+    stats = {"reviewers": 0, "reviews_updated": 0}
+
+    def flush(user_ids):
+        users = {user["id"]: user for user in users_collection.find({"id": {"$in": user_ids}}, REVIEWER_PROJECTION)}
+        result = reviews_collection.bulk_write(
+            [UpdateMany({"user_id": user_id, **query}, {"$set": reviewer_fields(users.get(user_id))})
+             for user_id in user_ids],
+            ordered=False
+        )
+        stats["reviewers"] += len(user_ids)
+        stats["reviews_updated"] += result.modified_count
+
+    batch = []
+    for doc in reviewer_ids:
+        batch.append(doc["_id"])
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return stats
+
+
+REVIEW_SUMMARY_LATEST = 5  # latest approved review ids kept on the summary
+STAR_VALUES = ("1", "2", "3", "4", "5")
+
+
+def empty_review_summary(product_id: str) -> Dict[str, Any]:
+    return {
+        "product_id": product_id,
+        "distribution": {star: 0 for star in STAR_VALUES},
+        "count": 0,
+        "rating_sum": 0,
+        "pending_count": 0,
+        "latest_review_ids": [],
+    }
+
+
+def latest_review_ids(reviews_collection, product_id: str, limit: int = REVIEW_SUMMARY_LATEST) -> List[str]:
+    return [review["id"] for review in reviews_collection.find(
+        {"product_id": product_id, "is_approved": True}, {"_id": 0, "id": 1}
+    ).sort("created_at", -1).limit(limit)]
+
+
+def rebuild_review_summary(reviews_collection, summaries_collection, product_id: str) -> Dict[str, Any]:
+    """Recount one product's summary from its reviews"""
+    summary = empty_review_summary(product_id)
+    for group in reviews_collection.aggregate([
+        {"$match": {"product_id": product_id}},
+        {"$group": {"_id": {"rating": "$rating", "is_approved": "$is_approved"}, "count": {"$sum": 1}}},
+    ]):
+        add_to_summary(summary, group["_id"]["rating"], group["_id"]["is_approved"], group["count"])
+    summary["latest_review_ids"] = latest_review_ids(reviews_collection, product_id)
+    summary["updated_at"] = datetime.now(timezone.utc)
+    summaries_collection.replace_one({"product_id": product_id}, summary, upsert=True)
+    return summary
+
+
+def add_to_summary(summary: Dict[str, Any], rating: int, is_approved: bool, count: int = 1):
+    if is_approved:
+        summary["distribution"][str(rating)] += count
+        summary["count"] += count
+        summary["rating_sum"] += rating * count
+    else:
+        summary["pending_count"] += count
+
+
+def _apply_summary_delta(reviews_collection, summaries_collection, product_id: str,
+                         inc: Dict[str, int], update: Optional[Dict[str, Any]] = None):
+    """$inc the product's summary; a product without one yet is recounted instead,
+    so reviews written before summaries existed are not lost"""
+    update = dict(update or {})
+    update["$inc"] = inc
+    update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+    result = summaries_collection.update_one({"product_id": product_id}, update)
+    if result.matched_count == 0:
+        rebuild_review_summary(reviews_collection, summaries_collection, product_id)
+
+
+def summary_on_create(reviews_collection, summaries_collection, review: Dict[str, Any]) -> Tuple[int, int]:
+    """Count a newly inserted review; returns the change of the approved (count, rating sum)"""
+    if not review.get("is_approved"):
+        _apply_summary_delta(reviews_collection, summaries_collection, review["product_id"], {"pending_count": 1})
+        return 0, 0
+    _apply_summary_delta(
+        reviews_collection, summaries_collection, review["product_id"],
+        {f"distribution.{review['rating']}": 1, "count": 1, "rating_sum": review["rating"]},
+        {"$push": {"latest_review_ids": {"$each": [review["id"]], "$position": 0,
+                                         "$slice": REVIEW_SUMMARY_LATEST}}}
+    )
+    return 1, review["rating"]
+
+
+def summary_on_rating_change(reviews_collection, summaries_collection, review: Dict[str, Any],
+                             old_rating: int) -> Tuple[int, int]:
+    """Move an approved review from its old star bucket to its new one"""
+    if not review.get("is_approved") or review["rating"] == old_rating:
+        return 0, 0
+    _apply_summary_delta(
+        reviews_collection, summaries_collection, review["product_id"],
+        {f"distribution.{old_rating}": -1, f"distribution.{review['rating']}": 1,
+         "rating_sum": review["rating"] - old_rating}
+    )
+    return 0, review["rating"] - old_rating
+
+
+def summary_on_approval(reviews_collection, summaries_collection, review: Dict[str, Any]) -> Tuple[int, int]:
+    """Count a review whose ``is_approved`` just flipped to its current value"""
+    sign = 1 if review["is_approved"] else -1
+    _apply_summary_delta(
+        reviews_collection, summaries_collection, review["product_id"],
+        {f"distribution.{review['rating']}": sign, "count": sign, "rating_sum": sign * review["rating"],
+         "pending_count": -sign}
+    )
+    # An older review can enter or leave the latest ones; re-read them from the index
+    summaries_collection.update_one(
+        {"product_id": review["product_id"]},
+        {"$set": {"latest_review_ids": latest_review_ids(reviews_collection, review["product_id"])}}
+    )
+    return sign, sign * review["rating"]
+
+
+def summary_incs(added: Iterable[Dict[str, Any]] = (), removed: Iterable[Dict[str, Any]] = (),
+                 incs: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Dict[str, int]]:
+    """Per-product summary ``$inc`` for many reviews: ``added`` reviews are counted in
+    their approval state, ``removed`` ones taken out of it (a moderated review is
+    removed as it was and added as it is). Accumulates into ``incs`` when given."""
+    incs = {} if incs is None else incs
+    for reviews, sign in ((added, 1), (removed, -1)):
+        for review in reviews:
+            inc = incs.setdefault(review["product_id"], {})
+            if review.get("is_approved"):
+                for key, value in ((f"distribution.{review['rating']}", sign), ("count", sign),
+                                   ("rating_sum", sign * review["rating"])):
+                    inc[key] = inc.get(key, 0) + value
+            else:
+                inc["pending_count"] = inc.get("pending_count", 0) + sign
+    return incs
+
+
+def apply_summary_incs(reviews_collection, summaries_collection, incs: Dict[str, Dict[str, int]]):
+    """One ``$inc`` per product summary; unlike a recount, this never overwrites
+    concurrent single-review writes"""
+    for product_id, inc in incs.items():
+        inc = {key: value for key, value in inc.items() if value}
+        if not inc:
+            continue
+        _apply_summary_delta(reviews_collection, summaries_collection, product_id, inc)
+        if any(key.startswith("distribution.") for key in inc):
+            summaries_collection.update_one(
+                {"product_id": product_id},
+                {"$set": {"latest_review_ids": latest_review_ids(reviews_collection, product_id)}}
+            )
+
+
+def review_summary_response(summary: Optional[Dict[str, Any]], product_id: str) -> Dict[str, Any]:
+    summary = summary or empty_review_summary(product_id)
+    count = summary.get("count", 0)
+    distribution = {star: summary.get("distribution", {}).get(star, 0) for star in STAR_VALUES}
+    return {
+        "product_id": product_id,
+        "average_rating": round(summary.get("rating_sum", 0) / count, 1) if count else 0.0,
+        "review_count": count,
+        "distribution": distribution,
+        "distribution_percent": {star: round(100 * n / count, 1) if count else 0.0
+                                 for star, n in distribution.items()},
+        "pending_count": summary.get("pending_count", 0),
+        "latest_review_ids": summary.get("latest_review_ids", []),
+    }
+
+
+def backfill_review_summaries(reviews_collection, summaries_collection, batch_size: int = 500,
+                              product_ids: Optional[List[str]] = None) -> Dict[str, int]:
+    """Recount every product's summary (or only those of ``product_ids``) from its
+    reviews in one grouped scan"""
+    stats = {"products": 0, "reviews": 0}
+    summaries: Dict[str, Dict[str, Any]] = {}
+
+    def flush():
+        now = datetime.now(timezone.utc)
+        operations = []
+        for product_id, summary in summaries.items():
+            summary["latest_review_ids"] = latest_review_ids(reviews_collection, product_id)
+            summary["updated_at"] = now
+            operations.append(ReplaceOne({"product_id": product_id}, summary, upsert=True))
+        summaries_collection.bulk_write(operations, ordered=False)
+        stats["products"] += len(summaries)
+        summaries.clear()
+
+    # Sorted by product so each product's groups arrive together and can be flushed in batches
+    match = [{"$match": {"product_id": {"$in": product_ids}}}] if product_ids is not None else []
+    groups = reviews_collection.aggregate(match + [
+        {"$group": {"_id": {"product_id": "$product_id", "rating": "$rating", "is_approved": "$is_approved"},
+                    "count": {"$sum": 1}}},
+        {"$sort": {"_id.product_id": 1}},
+    ], allowDiskUse=True)
+    for group in groups:
+        product_id = group["_id"]["product_id"]
+        if product_id not in summaries and len(summaries) >= batch_size:
+            flush()
+        summary = summaries.setdefault(product_id, empty_review_summary(product_id))
+        add_to_summary(summary, group["_id"]["rating"], group["_id"]["is_approved"], group["count"])
+        stats["reviews"] += group["count"]
+    if summaries:
+        flush()
+    return stats
+
+
+def set_reviews_approval(reviews_collection, review_ids: Iterable[str], is_approved: bool) -> List[Dict[str, Any]]:
+    """Approve or hide each review not already in that state, one atomic update per
+    review so exactly the reviews that changed are known; returns them"""
+    now = datetime.now(timezone.utc)
+    changed = []
+    for review_id in dict.fromkeys(review_ids):
+        review = reviews_collection.find_one_and_update(
+            {"id": review_id, "is_approved": {"$ne": is_approved}},
+            {"$set": {"is_approved": is_approved, "updated_at": now}},
+            projection={"_id": 0, "id": 1, "product_id": 1, "rating": 1, "is_approved": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if review:
+            changed.append(review)
+    return changed
+
+
+def approved_deltas(reviews: Iterable[Dict[str, Any]], sign: int = 1) -> Dict[str, Tuple[int, int]]:
+    """Per-product change of the approved (count, rating sum) when these reviews became
+    approved (``sign`` 1) or stopped being approved (``sign`` -1)"""
+    deltas: Dict[str, Tuple[int, int]] = {}
+    for review in reviews:
+        count, rating_sum = deltas.get(review["product_id"], (0, 0))
+        deltas[review["product_id"]] = (count + sign, rating_sum + sign * review["rating"])
+    return deltas
+
+
+def _seller_rating_update(count: int, rating_sum: int) -> List[Dict[str, Any]]:
+    """Pipeline update adding to the seller's totals and recomputing the average in the same write"""
+    return [
+        {"$set": {"rating_count": {"$add": ["$rating_count", count]},
+                  "rating_sum": {"$add": ["$rating_sum", rating_sum]}}},
+        {"$set": {"average_rating": {"$cond": [
+            {"$gt": ["$rating_count", 0]},
+            {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 1]},
+            0.0
+        ]}}},
+    ]
+
+
+def inc_seller_ratings(products_collection, summaries_collection, sellers_collection,
+                       seller_deltas: Dict[str, Tuple[int, int]]):
+    """Add (count, rating sum) deltas to seller profiles; profiles without totals yet
+    are recounted from their product summaries instead"""
+    seller_deltas = {seller_id: delta for seller_id, delta in seller_deltas.items() if seller_id and any(delta)}
+    if not seller_deltas:
+        return
+    result = sellers_collection.bulk_write([
+        UpdateOne({"user_id": seller_id, "rating_count": {"$exists": True}}, _seller_rating_update(*delta))
+        for seller_id, delta in seller_deltas.items()
+    ], ordered=False)
+    if result.matched_count < len(seller_deltas):
+        counted = {profile["user_id"] for profile in sellers_collection.find(
+            {"user_id": {"$in": list(seller_deltas)}, "rating_count": {"$exists": True}}, {"_id": 0, "user_id": 1}
+        )}
+        # Sellers without a profile are simply not found by the recount
+        missing = [seller_id for seller_id in seller_deltas if seller_id not in counted]
+        backfill_seller_ratings(products_collection, summaries_collection, sellers_collection, seller_ids=missing)
+
+
+def seller_rating_on_review(products_collection, summaries_collection, sellers_collection,
+                            product_deltas: Dict[str, Tuple[int, int]]):
+    """Move the ratings of the sellers of the given products by the change in their
+    summaries (as returned by the ``summary_on_*`` handlers or ``approved_deltas``).
+    Reviews of deactivated products do not count towards the seller."""
+    product_deltas = {product_id: delta for product_id, delta in product_deltas.items() if any(delta)}
+    if not product_deltas:
+        return
+    seller_deltas: Dict[str, Tuple[int, int]] = {}
+    for product in products_collection.find(
+        {"id": {"$in": list(product_deltas)}, "is_active": True}, {"_id": 0, "id": 1, "seller_id": 1}
+    ):
+        count, rating_sum = product_deltas[product["id"]]
+        seller_count, seller_sum = seller_deltas.get(product.get("seller_id"), (0, 0))
+        seller_deltas[product.get("seller_id")] = (seller_count + count, seller_sum + rating_sum)
+    inc_seller_ratings(products_collection, summaries_collection, sellers_collection, seller_deltas)
+
+
+def product_rating_totals(summaries_collection, product_id: str) -> Tuple[int, int]:
+    """Approved (count, rating sum) of one product, for moving it between sellers"""
+    summary = summaries_collection.find_one({"product_id": product_id}, {"_id": 0, "count": 1, "rating_sum": 1})
+    return (summary.get("count", 0), summary.get("rating_sum", 0)) if summary else (0, 0)
+
+
+def seller_rating_response(profile: Optional[Dict[str, Any]]) -> Tuple[float, int]:
+    """Average rating and approved review count of a seller profile"""
+    if not profile or not profile.get("rating_count"):
+        return 0.0, 0
+    return round(profile["rating_sum"] / profile["rating_count"], 1), profile["rating_count"]
+
+
+def backfill_seller_ratings(products_collection, summaries_collection, sellers_collection,
+                            batch_size: int = 1000, seller_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Recount every seller's rating totals (or only those of ``seller_ids``) from the
+    summaries of their active products, one summary lookup per batch of products"""
+    query: Dict[str, Any] = {"is_active": True}
+    profile_query: Dict[str, Any] = {}
+    if seller_ids is not None:
+        seller_ids = list(seller_ids)
+        query["seller_id"] = profile_query["user_id"] = {"$in": seller_ids}
+    totals: Dict[str, List[int]] = {}
+    stats = {"sellers": 0, "products": 0}
+
+    def add(seller_by_product: Dict[str, str]):
+        for summary in summaries_collection.find(
+            {"product_id": {"$in": list(seller_by_product)}}, {"_id": 0, "product_id": 1, "count": 1, "rating_sum": 1}
+        ):
+            seller_totals = totals.setdefault(seller_by_product[summary["product_id"]], [0, 0])
+            seller_totals[0] += summary.get("count", 0)
+            seller_totals[1] += summary.get("rating_sum", 0)
+        stats["products"] += len(seller_by_product)
+
+    batch: Dict[str, str] = {}
+    for product in products_collection.find(query, {"_id": 0, "id": 1, "seller_id": 1}):
+        if not product.get("seller_id"):
+            continue
+        batch[product["id"]] = product["seller_id"]
+        if len(batch) >= batch_size:
+            add(batch)
+            batch = {}
+    if batch:
+        add(batch)
+
+    # Every profile is written, so sellers without reviewed products get explicit zeros
+    operations = []
+    for profile in sellers_collection.find(profile_query, {"_id": 0, "user_id": 1}):
+        count, rating_sum = totals.get(profile["user_id"], (0, 0))
+        operations.append(UpdateOne({"user_id": profile["user_id"]}, {"$set": {
+            "rating_count": count,
+            "rating_sum": rating_sum,
+            "average_rating": round(rating_sum / count, 1) if count else 0.0,
+        }}))
+        if len(operations) >= batch_size:
+            sellers_collection.bulk_write(operations, ordered=False)
+            stats["sellers"] += len(operations)
+            operations = []
+    if operations:
+        sellers_collection.bulk_write(operations, ordered=False)
+        stats["sellers"] += len(operations)
+    return stats
+
+
+def remove_duplicate_reviews(reviews_collection, summaries_collection, products_collection,
+                             sellers_collection) -> int:
+    """Delete all but the oldest review of each user for a product (left by the old
+    check-then-insert create), taking the deleted ones out of the product summaries
+    and seller ratings they were counted in. Returns the number of reviews deleted."""
+    removed: List[Dict[str, Any]] = []
+    duplicates = reviews_collection.aggregate([
+        {"$group": {"_id": {"product_id": "$product_id", "user_id": "$user_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    for group in duplicates:
+        extra = list(reviews_collection.find(
+            group["_id"], {"_id": 1, "product_id": 1, "rating": 1, "is_approved": 1}
+        ).sort([("created_at", 1), ("_id", 1)]))[1:]
+        reviews_collection.delete_many({"_id": {"$in": [review["_id"] for review in extra]}})
+        removed.extend(extra)
+    if removed:
+        apply_summary_incs(reviews_collection, summaries_collection, summary_incs(removed=removed))
+        seller_rating_on_review(products_collection, summaries_collection, sellers_collection,
+                                approved_deltas([review for review in removed if review.get("is_approved")], -1))
+    return len(removed)
+
+
+def ensure_review_indexes(reviews_collection, summaries_collection, products_collection, sellers_collection,
+                          attempts: int = 3):
+    """Create the unique (product_id, user_id) review index, removing duplicate reviews
+    first. Raises when the index cannot be created: review creation and imports rely
+    on it to refuse a second review by the same user."""
+    keys = [("product_id", 1), ("user_id", 1)]
+    for _ in range(attempts):
+        removed = remove_duplicate_reviews(reviews_collection, summaries_collection, products_collection,
+                                           sellers_collection)
+        if removed:
+            print(f"Removed {removed} duplicate reviews")
+        try:
+            reviews_collection.create_index(keys, unique=True)
+            break
+        except DuplicateKeyError:
+            continue  # a review was duplicated again while deduplicating; once more
+        except OperationFailure as e:
+            # A plain index on the same keys has the same name; replace it with the unique one
+            if "product_id_1_user_id_1" not in reviews_collection.index_information():
+                raise
+            print(f"Replacing non-unique review (product_id, user_id) index: {e}")
+            reviews_collection.drop_index("product_id_1_user_id_1")
+    if not any(index.get("key") == keys and index.get("unique")
+               for index in reviews_collection.index_information().values()):
+        raise RuntimeError("reviews need a unique (product_id, user_id) index; remove the duplicate reviews and restart")
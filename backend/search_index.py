@@ -0,0 +1,414 @@
+"""
+In-memory search indexes for typeahead suggestions and typo-tolerant matching
+over the product catalog
+"""
+
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Highest code point, used as the upper bound of a prefix range in the sorted key array
+_PREFIX_SENTINEL = "\U0010ffff"
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase and collapse whitespace so lookups are case/spacing insensitive"""
+    if not text:
+        return ""
+    return " ".join(str(text).casefold().split())
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split normalized text into word tokens"""
+    return re.findall(r"\w+", normalize_text(text))
+
+
+def word_trigrams(word: str) -> Set[str]:
+    """Character trigrams of a word padded so short words and word edges still match"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """Edit distance between ``a`` and ``b``, or None as soon as it must exceed ``max_distance``"""
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            )
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= max_distance else None
+
+
+# Relative importance of each product field when scoring lexical matches
+LEXICAL_FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 1.5, "tags": 1.5, "description": 0.5}
+
+
+def lexical_score(query_tokens: List[str], product: Dict[str, Any]) -> float:
+    """Field-weighted count of query words found (or prefixed) in a product"""
+    score = 0.0
+    for field, weight in LEXICAL_FIELD_WEIGHTS.items():
+        value = product.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(item) for item in value)
+        field_tokens = set(tokenize(value))
+        if not field_tokens:
+            continue
+        for token in query_tokens:
+            if token in field_tokens:
+                score += weight
+            elif any(field_token.startswith(token) for field_token in field_tokens):
+                score += weight / 2
+    return score
+
+
+def lexical_rank(query: str, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Products that lexically match ``query``, best first (ties keep input order)"""
+    query_tokens = tokenize(query)
+    scored = [(lexical_score(query_tokens, product), product) for product in products]
+    return [product for score, product in sorted(
+        (item for item in scored if item[0] > 0), key=lambda item: -item[0]
+    )]
+
+
+class PrefixIndex:
+    """Sorted-array prefix index returning popularity-weighted completions.
+
+    Every indexed term is stored once per word-boundary suffix (up to
+    ``max_suffix_words``), so "galaxy" completes "Samsung Galaxy S24" as well
+    as terms that start with it. Lookups are two bisects plus a scan of the
+    prefix's range. Short prefixes (up to ``hot_prefix_length`` characters),
+    whose ranges are the widest, keep their top completions in a list that
+    writes update in place; it is recomputed from the whole range only when a
+    write may have let an entry outside the list overtake it. Longer prefixes
+    scan at most ``max_scan`` keys, so for one matching more entries than that
+    the completions are the heaviest of the first ``max_scan`` in key order.
+    """
+
+    def __init__(self, hot_prefix_length: int = 3, hot_cache_size: int = 20,
+                 max_suffix_words: int = 3, max_scan: int = 5000):
+        self.hot_prefix_length = hot_prefix_length
+        self.hot_cache_size = hot_cache_size
+        self.max_suffix_words = max_suffix_words
+        self.max_scan = max_scan
+        self._keys: List[Tuple[str, Tuple[str, str]]] = []
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._hot_cache: Dict[str, List[Tuple[str, str]]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _suffixes(self, normalized: str) -> List[str]:
+        words = normalized.split(" ")
+        return [" ".join(words[i:]) for i in range(min(len(words), self.max_suffix_words))]
+
+    def _reweigh(self, identity: Tuple[str, str], suffixes: List[str], removed: bool = False):
+        """Keep the cached top lists of the short prefixes of ``suffixes`` exact after the
+        entry's weight changed (or it was removed). Every entry left out of a full list
+        weighs no more than the list's lightest entry; a list is dropped, and recomputed
+        on the next lookup, when a change could break that."""
+        prefixes = {suffix[:length] for suffix in suffixes for length in range(1, self.hot_prefix_length + 1)}
+        for prefix in prefixes:
+            cached = self._hot_cache.get(prefix)
+            if cached is None:
+                continue
+            full = len(cached) >= self.hot_cache_size
+            listed = identity in cached
+            if listed:
+                cached.remove(identity)
+            if removed:
+                if listed and full:
+                    del self._hot_cache[prefix]  # the next heaviest entry is not known
+                continue
+            weight = self._entries[identity]["weight"]
+            lightest = self._entries[cached[-1]]["weight"] if cached else None
+            if full and listed and (lightest is None or weight < lightest):
+                del self._hot_cache[prefix]  # an entry outside the list may now outweigh it
+                continue
+            if full and not listed and lightest is not None and weight <= lightest:
+                continue
+            position = next((i for i, other in enumerate(cached) if self._entries[other]["weight"] < weight),
+                            len(cached))
+            cached.insert(position, identity)
+            del cached[self.hot_cache_size:]
+
+    def add(self, text: str, kind: str, ref: Optional[str] = None, weight: float = 1.0,
+            payload: Optional[Dict[str, Any]] = None):
+        """Add a term, or bump its weight and reference count if already present.
+
+        ``ref`` distinguishes entries that share the same text (e.g. two products
+        with the same name); shared terms such as brands leave it unset.
+        """
+        normalized = normalize_text(text)
+        if not normalized:
+            return
+        identity = (kind, ref or normalized)
+        with self._lock:
+            entry = self._entries.get(identity)
+            if entry:
+                entry["refs"] += 1
+                entry["weight"] += weight
+                if payload is not None:
+                    entry["payload"] = payload
+                self._reweigh(identity, entry["suffixes"])
+                return
+
+            suffixes = self._suffixes(normalized)
+            self._entries[identity] = {
+                "text": text.strip(),
+                "type": kind,
+                "weight": weight,
+                "refs": 1,
+                "payload": payload,
+                "suffixes": suffixes,
+            }
+            for suffix in suffixes:
+                bisect.insort(self._keys, (suffix, identity))
+            self._reweigh(identity, suffixes)
+
+    def remove(self, text: str, kind: str, ref: Optional[str] = None, weight: float = 1.0):
+        """Drop one reference to a term, removing it once nothing refers to it"""
+        normalized = normalize_text(text)
+        if not normalized:
+            return
+        identity = (kind, ref or normalized)
+        with self._lock:
+            entry = self._entries.get(identity)
+            if not entry:
+                return
+            entry["refs"] -= 1
+            entry["weight"] -= weight
+            if entry["refs"] > 0:
+                self._reweigh(identity, entry["suffixes"])
+                return
+
+            del self._entries[identity]
+            self._reweigh(identity, entry["suffixes"], removed=True)
+            for suffix in entry["suffixes"]:
+                position = bisect.bisect_left(self._keys, (suffix, identity))
+                if position < len(self._keys) and self._keys[position] == (suffix, identity):
+                    del self._keys[position]
+
+    def bulk_load(self, terms: List[Dict[str, Any]]):
+        """Replace the index contents in one pass (startup rebuild).
+
+        Each term is a dict with the same fields accepted by :meth:`add`.
+        """
+        with self._lock:
+            self._keys = []
+            self._entries = {}
+            self._hot_cache = {}
+            for term in terms:
+                normalized = normalize_text(term.get("text"))
+                if not normalized:
+                    continue
+                identity = (term["kind"], term.get("ref") or normalized)
+                weight = term.get("weight", 1.0)
+                entry = self._entries.get(identity)
+                if entry:
+                    entry["refs"] += 1
+                    entry["weight"] += weight
+                    continue
+                suffixes = self._suffixes(normalized)
+                self._entries[identity] = {
+                    "text": term["text"].strip(),
+                    "type": term["kind"],
+                    "weight": weight,
+                    "refs": 1,
+                    "payload": term.get("payload"),
+                    "suffixes": suffixes,
+                }
+                self._keys.extend((suffix, identity) for suffix in suffixes)
+            self._keys.sort()
+
+    def _top_identities(self, prefix: str, count: int) -> List[Tuple[str, str]]:
+        start = bisect.bisect_left(self._keys, (prefix,))
+        end = bisect.bisect_left(self._keys, (prefix + _PREFIX_SENTINEL,), lo=start)
+        if len(prefix) > self.hot_prefix_length:
+            end = min(end, start + self.max_scan)
+        identities = {identity for _, identity in self._keys[start:end]}
+        return heapq.nlargest(count, identities, key=lambda identity: self._entries[identity]["weight"])
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Return up to ``limit`` completions for ``prefix``, heaviest first"""
+        normalized = normalize_text(prefix)
+        if not normalized:
+            return []
+        with self._lock:
+            if len(normalized) <= self.hot_prefix_length and limit <= self.hot_cache_size:
+                identities = self._hot_cache.get(normalized)
+                if identities is None:
+                    identities = self._top_identities(normalized, self.hot_cache_size)
+                    self._hot_cache[normalized] = identities
+                identities = identities[:limit]
+            else:
+                identities = self._top_identities(normalized, limit)
+
+            suggestions = []
+            for identity in identities:
+                entry = self._entries[identity]
+                suggestion = {"text": entry["text"], "type": entry["type"]}
+                if entry["payload"]:
+                    suggestion.update(entry["payload"])
+                suggestions.append(suggestion)
+            return suggestions
+
+
+class TrigramIndex:
+    """Typo-tolerant word matcher over a trigram index of the catalog vocabulary.
+
+    Trigrams index distinct words rather than documents, so the fuzzy stage
+    only ever touches the vocabulary (tens of thousands of words) and never
+    the product collection. A query word is matched by ranking vocabulary
+    words on shared trigrams, rarest trigrams first, then verifying the best
+    candidates with a bounded edit distance. The whole lookup runs against a
+    wall-clock budget and returns whatever it verified when the budget ends.
+    """
+
+    def __init__(self, min_similarity: float = 0.35, max_candidates: int = 30,
+                 max_posting_size: int = 20000):
+        self.min_similarity = min_similarity
+        self.max_candidates = max_candidates
+        self.max_posting_size = max_posting_size
+        self._gram_words: Dict[str, Set[str]] = defaultdict(set)
+        self._word_docs: Dict[str, Set[str]] = defaultdict(set)
+        self._doc_words: Dict[str, frozenset] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_words)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._word_docs)
+
+    def add(self, doc_id: str, texts: Iterable[Optional[str]]):
+        """Index (or re-index) a document by the words of ``texts``"""
+        words = frozenset(word for text in texts for word in tokenize(text))
+        with self._lock:
+            self.remove(doc_id)
+            self._doc_words[doc_id] = words
+            for word in words:
+                if word not in self._word_docs:
+                    for gram in word_trigrams(word):
+                        self._gram_words[gram].add(word)
+                self._word_docs[word].add(doc_id)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            words = self._doc_words.pop(doc_id, None)
+            if not words:
+                return
+            for word in words:
+                docs = self._word_docs.get(word)
+                if docs is None:
+                    continue
+                docs.discard(doc_id)
+                if docs:
+                    continue
+                del self._word_docs[word]
+                for gram in word_trigrams(word):
+                    gram_words = self._gram_words.get(gram)
+                    if gram_words is not None:
+                        gram_words.discard(word)
+                        if not gram_words:
+                            del self._gram_words[gram]
+
+    @staticmethod
+    def max_edits(word: str) -> int:
+        """Edit distance tolerated for a query word of this length"""
+        if len(word) <= 4:
+            return 1
+        return 2
+
+    def _match_word(self, token: str, deadline: float) -> List[Tuple[str, int]]:
+        """Vocabulary words within edit distance of ``token``, closest first"""
+        if token in self._word_docs:
+            return [(token, 0)]
+        token_grams = word_trigrams(token)
+        postings = sorted(
+            (self._gram_words[gram] for gram in token_grams if gram in self._gram_words),
+            key=len,
+        )
+        shared = Counter()
+        for words in postings:
+            if len(words) > self.max_posting_size or time.perf_counter() > deadline:
+                break
+            shared.update(words)
+
+        max_distance = self.max_edits(token)
+        scored = []
+        for word, count in shared.items():
+            similarity = 2.0 * count / (len(token_grams) + len(word) + 1)
+            if similarity >= self.min_similarity:
+                scored.append((similarity, word))
+
+        matches = []
+        for _, word in heapq.nlargest(self.max_candidates, scored):
+            if time.perf_counter() > deadline:
+                break
+            distance = bounded_levenshtein(token, word, max_distance)
+            if distance is not None:
+                matches.append((word, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def search(self, query: str, limit: int = 20, budget_ms: float = 10.0) -> Dict[str, Any]:
+        """Find documents whose words approximately match every word of ``query``.
+
+        Returns the matching document ids (documents matching more query
+        words first), the best correction found for each query word, and
+        whether the latency budget cut the lookup short.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        tokens = [token for token in tokenize(query) if len(token) >= 3]
+        result = {"ids": [], "corrections": {}, "timed_out": False}
+        if not tokens:
+            return result
+
+        with self._lock:
+            token_docs = []
+            for token in tokens:
+                matches = self._match_word(token, deadline)
+                if not matches:
+                    continue
+                if matches[0][1] > 0:
+                    result["corrections"][token] = matches[0][0]
+                docs = set()
+                for word, _ in matches:
+                    docs |= self._word_docs.get(word, set())
+                token_docs.append(docs)
+
+            if token_docs:
+                token_docs.sort(key=len)
+                ranked = list(set.intersection(*token_docs))[:limit]
+                if len(ranked) < limit:
+                    seen = set(ranked)
+                    for docs in token_docs:
+                        for doc_id in docs:
+                            if doc_id not in seen:
+                                ranked.append(doc_id)
+                                seen.add(doc_id)
+                                if len(ranked) >= limit:
+                                    break
+                        if len(ranked) >= limit:
+                            break
+                result["ids"] = ranked
+
+        result["timed_out"] = time.perf_counter() > deadline
+        return result
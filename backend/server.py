@@ -1,20 +1,41 @@
 from fastapi import FastAPI, HTTPException, Request, Depends, Query, status, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone, timedelta
 import os
 import uuid
+import hmac
 import json
 import asyncio
 import shutil
+import time
 from dotenv import load_dotenv
 
 # Import our custom modules
 from models import *
 from verification_service import verification_service
+from search_index import PrefixIndex, TrigramIndex, lexical_rank, normalize_text
+from cache import SWRCache, TTLCache
+from analytics import SearchAnalyticsWriter, bucket_start, summarize_rollup
+from popularity import ActivityCounter, compute_popularity
+from description_jobs import DESCRIPTION_PENDING, DescriptionCache, DescriptionJobQueue
+from llm_gateway import feature_policy, gateway_from_env
+from metrics import AI_FALLBACKS, AI_PARSE_FAILURES, AI_REQUESTS, ai_feature_summary, registry as metrics_registry
+from pagination import CountMode, paginate
+from vector_index import VectorIndex
+from recommendations import blend_neighbors, build_bundle_model, build_copurchase_model, rank_bundles, record_basket
+from reviews import (REVIEWER_PROJECTION, apply_summary_incs, approved_deltas, backfill_seller_ratings,
+                     ensure_review_indexes, inc_seller_ratings, product_rating_totals, review_summary_response,
+                     reviewer_fields, seller_rating_on_review, seller_rating_response, set_reviews_approval,
+                     summary_on_approval, summary_incs, summary_on_create, summary_on_rating_change,
+                     sync_reviewer_profile)
+from review_import import ReviewImporter
+from wishlist import (add_wishlist_item, claim_wishlist_alert, ensure_wishlist_indexes, fan_out_wishlist_alert,
+                      hydrate_wishlist, remove_wishlist_item)
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
 # Define SellerStats model locally since it's not in models.py
@@ -31,7 +52,6 @@ from auth import AuthManager, get_current_user, get_current_user_required, get_a
 
 # Import AI and Stripe integrations
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
-from emergentintegrations.llm.chat import LlmChat, UserMessage
 
 # Load environment variables
 load_dotenv()
@@ -58,6 +78,7 @@ products_collection = db["products"]
 orders_collection = db["orders"]
 cart_collection = db["cart"]
 reviews_collection = db["reviews"]
+review_summaries_collection = db["review_summaries"]
 wishlist_collection = db["wishlist"]
 coupons_collection = db["coupons"]
 coupon_usage_collection = db["coupon_usage"]
@@ -68,7 +89,33 @@ notifications_collection = db["notifications"]
 notification_templates_collection = db["notification_templates"]
 push_subscriptions_collection = db["push_subscriptions"]
 payment_transactions_collection = db["payment_transactions"]
+product_neighbors_collection = db["product_neighbors"]
+bundle_pairs_collection = db["bundle_pairs"]
+bundle_stats_collection = db["bundle_stats"]
 search_collection = db["search_queries"]
+search_rollups_collection = db["search_rollups"]
+product_activity_collection = db["product_activity"]
+ai_jobs_collection = db["ai_jobs"]
+ai_description_cache_collection = db["ai_description_cache"]
+SEARCH_EVENTS_RETENTION_DAYS = int(os.environ.get("SEARCH_EVENTS_RETENTION_DAYS", "30"))
+
+# Search events are buffered in memory and written in batches off the request path
+search_analytics = SearchAnalyticsWriter(
+    search_collection,
+    rollup_collection=search_rollups_collection,
+    max_queue_size=int(os.environ.get("SEARCH_ANALYTICS_QUEUE_SIZE", "10000")),
+    batch_size=int(os.environ.get("SEARCH_ANALYTICS_BATCH_SIZE", "500")),
+    flush_interval=float(os.environ.get("SEARCH_ANALYTICS_FLUSH_SECONDS", "2"))
+)
+
+# Product views and cart adds, counted in memory and flushed as daily counters for popularity scoring
+product_activity = ActivityCounter(
+    product_activity_collection,
+    flush_interval=float(os.environ.get("PRODUCT_ACTIVITY_FLUSH_SECONDS", "30"))
+)
+POPULARITY_REFRESH_SECONDS = float(os.environ.get("POPULARITY_REFRESH_SECONDS", "3600"))
+POPULARITY_HALF_LIFE_DAYS = float(os.environ.get("POPULARITY_HALF_LIFE_DAYS", "7"))
+POPULARITY_WINDOW_DAYS = int(os.environ.get("POPULARITY_WINDOW_DAYS", "60"))
 
 # Stripe integration
 STRIPE_API_KEY = os.environ.get("STRIPE_API_KEY")
@@ -88,51 +135,212 @@ else:
 EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
 auth_manager = AuthManager()
 
+# Every LLM call goes through the gateway: per-feature deadlines and concurrency caps, and
+# a shared circuit breaker that sends callers straight to their fallbacks during outages
+llm_gateway = gateway_from_env(EMERGENT_LLM_KEY, {
+    "description": feature_policy("description", timeout=30, max_concurrency=4),
+    "search": feature_policy("search", timeout=8, max_concurrency=8),
+    "recommendations": feature_policy("recommendations", timeout=5, max_concurrency=8),
+})
+
 # Helper Functions
+DESCRIPTION_SYSTEM_MESSAGE = "You are an expert product copywriter. Create engaging, detailed product descriptions that highlight benefits and features. Keep descriptions under 200 words and include key selling points."
+
+def product_description_prompt(product_name: str, category: str, brand: str) -> str:
+    return f"Create a compelling product description for: {product_name} by {brand} in the {category} category. Focus on benefits, features, and what makes it special."
+
 async def generate_product_description(product_name: str, category: str, brand: str) -> str:
-    """Generate AI-powered product description"""
-    try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"product_desc_{str(uuid.uuid4())}",
-            system_message="You are an expert product copywriter. Create engaging, detailed product descriptions that highlight benefits and features. Keep descriptions under 200 words and include key selling points."
-        ).with_model("openai", "gpt-4o")
-        
-        user_message = UserMessage(
-            text=f"Create a compelling product description for: {product_name} by {brand} in the {category} category. Focus on benefits, features, and what makes it special."
-        )
-        
-        description = await chat.send_message(user_message)
-        return description.strip()
-    except Exception as e:
-        return f"High-quality {product_name} from {brand}. Perfect for {category} enthusiasts."
+    """Generate AI-powered product description (raises on LLM errors so the job can be retried)"""
+    description = (await llm_gateway.complete(
+        "description",
+        product_description_prompt(product_name, category, brand),
+        system=DESCRIPTION_SYSTEM_MESSAGE
+    )).strip()
+    if not description:
+        raise ValueError("LLM returned an empty description")
+    return description
+
+def stream_product_description(product_name: str, category: str, brand: str):
+    """Same description as generate_product_description, in chunks as the LLM writes it"""
+    return llm_gateway.stream(
+        "description",
+        product_description_prompt(product_name, category, brand),
+        system=DESCRIPTION_SYSTEM_MESSAGE
+    )
+
+def fallback_product_description(product_name: str, category: str, brand: str) -> str:
+    return f"High-quality {product_name} from {brand}. Perfect for {category} enthusiasts."
+
+# Generated descriptions are shared by products with the same name, category and brand
+description_cache = DescriptionCache(
+    ai_description_cache_collection,
+    model=llm_gateway.model_key
+)
 
-async def smart_search(query: str, products: List[dict]) -> List[dict]:
-    """AI-powered smart search"""
-    try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"search_{str(uuid.uuid4())}",
-            system_message="You are a smart search assistant. Given a search query and list of products, return the product IDs that best match the query in order of relevance. Return only a JSON array of product IDs."
-        ).with_model("openai", "gpt-4o")
+# Descriptions are generated by background workers; product writes only enqueue a job
+description_jobs = DescriptionJobQueue(
+    ai_jobs_collection,
+    products_collection,
+    generate_product_description,
+    fallback_product_description,
+    concurrency=int(os.environ.get("AI_DESCRIPTION_CONCURRENCY", "4")),
+    max_attempts=int(os.environ.get("AI_DESCRIPTION_MAX_ATTEMPTS", "3")),
+    sweep_interval=float(os.environ.get("AI_DESCRIPTION_SWEEP_SECONDS", "60")),
+    cache=description_cache,
+    generate_stream=stream_product_description
+)
+
+# Smart search prompt shaping: only the top-K lexical candidates are sent, each compressed
+# to one short feature line, within an approximate token budget (~4 characters per token).
+SMART_SEARCH_PRERANK = os.environ.get("SMART_SEARCH_PRERANK", "true").lower() == "true"
+SMART_SEARCH_TOP_K = int(os.environ.get("SMART_SEARCH_TOP_K", "15"))
+SMART_SEARCH_TOKEN_BUDGET = int(os.environ.get("SMART_SEARCH_TOKEN_BUDGET", "1200"))
+SMART_SEARCH_DESCRIPTION_CHARS = int(os.environ.get("SMART_SEARCH_DESCRIPTION_CHARS", "80"))
+
+# Prompt size and latency per prompt mode ("prerank" or "legacy"), so the two can be compared
+smart_search_stats: Dict[str, Dict[str, float]] = {}
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def record_smart_search_stats(mode: str, prompt_tokens: int, legacy_prompt_tokens: int, candidates: int, llm_seconds: float):
+    stats = smart_search_stats.setdefault(mode, {
+        "calls": 0, "prompt_tokens": 0, "legacy_prompt_tokens": 0, "candidates": 0,
+        "llm_seconds": 0.0, "end_to_end_seconds": 0.0, "end_to_end_calls": 0
+    })
+    stats["calls"] += 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["legacy_prompt_tokens"] += legacy_prompt_tokens
+    stats["candidates"] += candidates
+    stats["llm_seconds"] += llm_seconds
+
+def legacy_products_prompt(products: List[dict]) -> str:
+    products_info = [{"id": p["id"], "name": p["name"], "description": p.get("description", ""), "category": p.get("category", ""), "brand": p.get("brand", ""), "tags": p.get("tags", [])} for p in products]
+    return json.dumps(products_info)
+
+def compact_product_features(product: dict) -> str:
+    """One-line summary of a product for ranking prompts"""
+    description = " ".join((product.get("description") or "").split())[:SMART_SEARCH_DESCRIPTION_CHARS]
+    tags = ",".join((product.get("tags") or [])[:5])
+    return "|".join([product["id"], product["name"], product.get("brand", ""), product.get("category", ""), tags, description])
+
+def preranked_products_prompt(query: str, products: List[dict]) -> tuple[str, int]:
+    """Top-K lexical candidates as compact feature lines, cut off at the token budget"""
+    matched = lexical_rank(query, products)
+    matched_ids = {p["id"] for p in matched}
+    candidates = (matched + [p for p in products if p["id"] not in matched_ids])[:SMART_SEARCH_TOP_K]
+    
+    lines = []
+    tokens = 0
+    for product in candidates:
+        line = compact_product_features(product)
+        tokens += estimate_tokens(line)
+        if lines and tokens > SMART_SEARCH_TOKEN_BUDGET:
+            break
+        lines.append(line)
+    return "id|name|brand|category|tags|description\n" + "\n".join(lines), len(lines)
+
+async def rank_products_with_llm(query: str, products: List[dict]) -> Optional[List[str]]:
+    """Ask the LLM for the ids of the products matching the query, most relevant first.
+    Returns None when the LLM call or its answer fails."""
+    try:
+        legacy_prompt = legacy_products_prompt(products)
+        if SMART_SEARCH_PRERANK:
+            mode = "prerank"
+            products_prompt, candidates = preranked_products_prompt(query, products)
+        else:
+            mode = "legacy"
+            products_prompt, candidates = legacy_prompt, len(products)
         
-        products_info = [{"id": p["id"], "name": p["name"], "description": p.get("description", ""), "category": p.get("category", ""), "brand": p.get("brand", ""), "tags": p.get("tags", [])} for p in products]
+        prompt = f"Search query: '{query}'\n\nProducts: {products_prompt}\n\nReturn only a JSON array of product IDs that match the query, ordered by relevance."
         
-        user_message = UserMessage(
-            text=f"Search query: '{query}'\n\nProducts: {json.dumps(products_info)}\n\nReturn only a JSON array of product IDs that match the query, ordered by relevance."
+        started_at = time.perf_counter()
+        response = await llm_gateway.complete(
+            "search",
+            prompt,
+            system="You are a smart search assistant. Given a search query and list of products, return the product IDs that best match the query in order of relevance. Return only a JSON array of product IDs."
         )
-        
-        response = await chat.send_message(user_message)
-        try:
-            relevant_ids = json.loads(response.strip())
-            return [p for p in products if p["id"] in relevant_ids]
-        except:
-            return products[:10]  # Fallback to first 10
-    except Exception as e:
-        return products[:10]
+        record_smart_search_stats(mode, estimate_tokens(prompt), estimate_tokens(legacy_prompt),
+                                  candidates, time.perf_counter() - started_at)
+    except Exception as e:
+        return None
+    try:
+        relevant_ids = json.loads(response.strip())
+    except ValueError:
+        relevant_ids = None
+    if not isinstance(relevant_ids, list):
+        AI_PARSE_FAILURES.inc(feature="search")
+        return None
+    return [str(product_id) for product_id in relevant_ids]
+
+def order_by_ids(products: List[dict], ranked_ids: List[str]) -> List[dict]:
+    """Keep the products named in ranked_ids, in that order"""
+    by_id = {p["id"]: p for p in products}
+    return [by_id[product_id] for product_id in ranked_ids if product_id in by_id]
+
+# LLM rankings are cached per (normalized query, filters, catalog version); a request
+# waits at most SMART_SEARCH_BUDGET_MS for the LLM before falling back to lexical order,
+# while the LLM call keeps running in the background to fill the cache for the next caller.
+SMART_SEARCH_BUDGET_MS = float(os.environ.get("SMART_SEARCH_BUDGET_MS", "800"))
+smart_search_cache = TTLCache(
+    maxsize=int(os.environ.get("SMART_SEARCH_CACHE_SIZE", "1000")),
+    ttl=float(os.environ.get("SMART_SEARCH_CACHE_TTL", "600"))
+)
+smart_search_inflight: Dict[tuple, asyncio.Task] = {}
+catalog_version = 0  # bumped on every product write seen by this process
+
+def bump_catalog_version():
+    global catalog_version
+    catalog_version += 1
+
+async def refresh_smart_search(cache_key: tuple, query: str, products: List[dict]) -> Optional[List[str]]:
+    relevant_ids = await rank_products_with_llm(query, products)
+    if relevant_ids is not None:
+        smart_search_cache.set(cache_key, relevant_ids)
+    return relevant_ids
+
+async def smart_search(query: str, products: List[dict], filters_key: str = "") -> List[dict]:
+    """AI-powered smart search, served from the ranking cache and bounded by the latency budget"""
+    started_at = time.perf_counter()
+    try:
+        return await _smart_search(query, products, filters_key)
+    finally:
+        stats = smart_search_stats.get("prerank" if SMART_SEARCH_PRERANK else "legacy")
+        if stats:
+            stats["end_to_end_seconds"] += time.perf_counter() - started_at
+            stats["end_to_end_calls"] += 1
+
+async def _smart_search(query: str, products: List[dict], filters_key: str) -> List[dict]:
+    AI_REQUESTS.inc(feature="search")
+    cache_key = (normalize_text(query), filters_key, catalog_version)
+    ranked_ids = smart_search_cache.get(cache_key)
+    if ranked_ids is not None:
+        return order_by_ids(products, ranked_ids)
+    
+    task = smart_search_inflight.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(refresh_smart_search(cache_key, query, products))
+        smart_search_inflight[cache_key] = task
+        task.add_done_callback(lambda _: smart_search_inflight.pop(cache_key, None))
+    
+    try:
+        relevant_ids = await asyncio.wait_for(asyncio.shield(task), timeout=SMART_SEARCH_BUDGET_MS / 1000)
+        fallback_reason = "llm_error"
+    except asyncio.TimeoutError:
+        relevant_ids = None
+        fallback_reason = "budget_exceeded"
+    
+    if relevant_ids is None:
+        AI_FALLBACKS.inc(feature="search", reason=fallback_reason)
+        return lexical_rank(query, products) or products[:10]
+    return order_by_ids(products, relevant_ids)
 
 async def get_recommendations(user_id: Optional[str] = None, product_id: Optional[str] = None) -> List[str]:
     """Generate product recommendations"""
+    AI_REQUESTS.inc(feature="recommendations")
+    if not llm_gateway.is_available():
+        AI_FALLBACKS.inc(feature="recommendations", reason="circuit_open")
+        return popular_product_ids(exclude=[product_id])
     try:
         context = ""
         if user_id:
@@ -151,36 +359,89 @@ async def get_recommendations(user_id: Optional[str] = None, product_id: Optiona
             if product:
                 context += f" Current product: {product['name']} in {product['category']} category"
         
-        all_products = list(products_collection.find({"is_active": True}).limit(20))
+        all_products = list(products_collection.find({"is_active": True}).sort("popularity_score", -1).limit(20))
         products_info = [{"id": p["id"], "name": p["name"], "category": p.get("category", ""), "brand": p.get("brand", ""), "price": p.get("price", 0)} for p in all_products]
         
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"recommendations_{str(uuid.uuid4())}",
-            system_message="You are a product recommendation engine. Based on user context and available products, recommend 4-6 relevant products. Return only a JSON array of product IDs."
-        ).with_model("openai", "gpt-4o")
-        
-        user_message = UserMessage(
-            text=f"Context: {context}\n\nAvailable products: {json.dumps(products_info)}\n\nRecommend 4-6 products that would interest this user. Return only a JSON array of product IDs."
+        response = await llm_gateway.complete(
+            "recommendations",
+            f"Context: {context}\n\nAvailable products: {json.dumps(products_info)}\n\nRecommend 4-6 products that would interest this user. Return only a JSON array of product IDs.",
+            system="You are a product recommendation engine. Based on user context and available products, recommend 4-6 relevant products. Return only a JSON array of product IDs."
         )
-        
-        response = await chat.send_message(user_message)
         try:
             return json.loads(response.strip())
-        except:
+        except ValueError:
+            AI_PARSE_FAILURES.inc(feature="recommendations")
+            AI_FALLBACKS.inc(feature="recommendations", reason="parse_error")
             return [p["id"] for p in all_products[:6]]
     except Exception as e:
-        return []
+        AI_FALLBACKS.inc(feature="recommendations", reason="llm_error")
+        return popular_product_ids(exclude=[product_id])
+
+def popular_product_ids(limit: int = 6, exclude: Optional[List[str]] = None) -> List[str]:
+    """Most popular active products, the cold-start fallback for recommendations"""
+    query = {"is_active": True}
+    if exclude:
+        query["id"] = {"$nin": [product_id for product_id in exclude if product_id]}
+    products = products_collection.find(query, {"_id": 0, "id": 1}).sort("popularity_score", -1).limit(limit)
+    return [product["id"] for product in products]
+
+# Co-purchase recommendations: neighbours are precomputed offline (build_copurchase_model)
+# and blended at read time with the neighbours of the user's recent purchases.
+RECOMMENDATION_TOP_N = int(os.environ.get("RECOMMENDATION_TOP_N", "20"))
+RECENT_PURCHASE_WEIGHT = 0.5  # relative to the product being viewed, decaying per older order
+# Frequently-bought-together thresholds for cart suggestions
+BUNDLE_MIN_SUPPORT = float(os.environ.get("BUNDLE_MIN_SUPPORT", "0.001"))
+BUNDLE_MIN_LIFT = float(os.environ.get("BUNDLE_MIN_LIFT", "1.2"))
+BUNDLE_MIN_PAIR_COUNT = int(os.environ.get("BUNDLE_MIN_PAIR_COUNT", "2"))
+
+# Recommendation ids per (user_id, product_id): fresh for RECOMMENDATION_CACHE_TTL seconds,
+# then served stale for up to RECOMMENDATION_CACHE_STALE_TTL more while one refresh runs.
+recommendation_cache = SWRCache(
+    maxsize=int(os.environ.get("RECOMMENDATION_CACHE_SIZE", "20000")),
+    ttl=float(os.environ.get("RECOMMENDATION_CACHE_TTL", "300")),
+    stale_ttl=float(os.environ.get("RECOMMENDATION_CACHE_STALE_TTL", "3600"))
+)
+
+def precomputed_recommendations(product_id: str, user_id: Optional[str] = None, limit: int = 6) -> List[str]:
+    """Recommended product ids from the precomputed co-purchase table"""
+    purchases = []
+    if user_id:
+        recent_orders = orders_collection.find(
+            {"user_id": user_id}, {"_id": 0, "items.product_id": 1}
+        ).sort("created_at", -1).limit(5)
+        for position, order in enumerate(recent_orders):
+            for item in order.get("items", []):
+                purchases.append((item["product_id"], RECENT_PURCHASE_WEIGHT * 0.8 ** position))
+    
+    source_ids = [product_id] + [purchased_id for purchased_id, _ in purchases]
+    neighbor_docs = {
+        doc["product_id"]: doc
+        for doc in product_neighbors_collection.find({"product_id": {"$in": source_ids}}, {"_id": 0})
+    }
+    sources = [(neighbor_docs.get(product_id), 1.0)]
+    sources += [(neighbor_docs.get(purchased_id), weight) for purchased_id, weight in purchases]
+    return blend_neighbors(sources, exclude=source_ids, limit=limit)
+
+async def load_recommendations(product_id: str, user_id: Optional[str]) -> Optional[List[str]]:
+    """Recommended product ids, or None when there is nothing worth caching"""
+    recommended_ids = precomputed_recommendations(product_id, user_id)
+    if not recommended_ids:
+        # No co-purchase data for this product yet
+        recommended_ids = await get_recommendations(user_id=user_id, product_id=product_id)
+    return recommended_ids[:6] or None
 
 def calculate_average_rating(product_id: str) -> tuple[float, int]:
-    """Calculate average rating and review count for a product"""
-    reviews = list(reviews_collection.find({"product_id": product_id, "is_approved": True}))
-    if not reviews:
+    """Average rating and review count for a product, from its review summary"""
+    summary = review_summaries_collection.find_one(
+        {"product_id": product_id}, {"_id": 0, "count": 1, "rating_sum": 1}
+    )
+    if not summary or not summary.get("count"):
         return 0.0, 0
-    
-    total_rating = sum(review["rating"] for review in reviews)
-    avg_rating = total_rating / len(reviews)
-    return round(avg_rating, 1), len(reviews)
+    return round(summary["rating_sum"] / summary["count"], 1), summary["count"]
+
+def update_seller_ratings(product_deltas: Dict[str, tuple]):
+    """Move seller ratings by the change in their products' review summaries"""
+    seller_rating_on_review(products_collection, review_summaries_collection, seller_profiles_collection, product_deltas)
 
 def apply_coupon(cart_total: float, coupon_code: str, user_id: Optional[str] = None, cart_items: List[Dict] = None) -> tuple[float, str]:
     """Enhanced coupon application with advanced validation"""
@@ -303,6 +564,53 @@ async def send_notification(user_id: str, notification_type: str, title: str, me
     except Exception as e:
         print(f"Error sending notification: {e}")
 
+def send_bulk_notifications(user_ids: List[str], notification_type: str, title: str, message: str,
+                            data: Dict = None, channels: List[str] = None) -> int:
+    """send_notification for many users at once: one insert_many per batch instead of a
+    write per user and channel. Blocking; run it in a thread from request handlers."""
+    if channels is None:
+        channels = ["in_app", "email"]  # Default channels
+    now = datetime.now(timezone.utc)
+    notifications_collection.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "type": notification_type,
+            "channel": channel,
+            "title": title,
+            "message": message,
+            "data": data or {},
+            "is_read": False,
+            "created_at": now
+        }
+        for user_id in user_ids for channel in channels
+    ], ordered=False)
+    
+    # Email and push placeholders, with one recipient lookup per batch
+    if "email" in channels:
+        for user in users_collection.find({"id": {"$in": user_ids}}, {"_id": 0, "email": 1}):
+            print(f"EMAIL: To {user['email']} - {title}: {message}")
+    if "push" in channels:
+        for subscription in push_subscriptions_collection.find({"user_id": {"$in": user_ids}}, {"_id": 0, "user_id": 1}):
+            print(f"PUSH: To {subscription['user_id']} - {title}: {message}")
+    return len(user_ids) * len(channels)
+
+def notify_wishlist_watchers(product_id: str, previous: Dict):
+    """Fan a price-drop or back-in-stock alert out to everyone who wishlisted the product,
+    when one is due and this update is the one that recorded it"""
+    alert = claim_wishlist_alert(products_collection, product_id, previous, WISHLIST_PRICE_DROP_PERCENT,
+                                 WISHLIST_RESTOCK_THRESHOLD, WISHLIST_ALERT_COOLDOWN_HOURS * 3600)
+    if not alert:
+        return
+    started = time.perf_counter()
+    users = fan_out_wishlist_alert(
+        wishlist_collection, product_id,
+        lambda user_ids: send_bulk_notifications(user_ids, alert["type"], alert["title"], alert["message"],
+                                                 alert["data"], WISHLIST_ALERT_CHANNELS),
+        batch_size=WISHLIST_ALERT_BATCH_SIZE
+    )
+    print(f"Wishlist {alert['type']} alert for {product_id}: {users} users in {time.perf_counter() - started:.1f}s")
+
 def calculate_commission(order_total: float, seller_id: str, category: str = None) -> tuple[float, float]:
     """Calculate commission for a seller"""
     try:
@@ -342,6 +650,218 @@ def calculate_commission(order_total: float, seller_id: str, category: str = Non
     except Exception as e:
         return 10.0, order_total * 0.1
 
+# In-memory search indexes, rebuilt at startup and kept in sync on product writes
+suggest_index = PrefixIndex()
+fuzzy_index = TrigramIndex()
+vector_index = VectorIndex(dimensions=int(os.environ.get("VECTOR_DIMENSIONS", "256")))
+indexed_products: Dict[str, dict] = {}  # product_id -> fields currently held by the indexes
+PRODUCT_INDEX_SYNC_SECONDS = int(os.environ.get("PRODUCT_INDEX_SYNC_SECONDS", "30"))
+# Wishlist alerts: a price cut of at least this many percent from the last alerted price, or inventory
+# reaching the threshold from below; at most one alert per product per cooldown
+WISHLIST_PRICE_DROP_PERCENT = float(os.environ.get("WISHLIST_PRICE_DROP_PERCENT", "5"))
+WISHLIST_RESTOCK_THRESHOLD = int(os.environ.get("WISHLIST_RESTOCK_THRESHOLD", "1"))
+WISHLIST_ALERT_BATCH_SIZE = int(os.environ.get("WISHLIST_ALERT_BATCH_SIZE", "1000"))
+WISHLIST_ALERT_COOLDOWN_HOURS = float(os.environ.get("WISHLIST_ALERT_COOLDOWN_HOURS", "24"))
+WISHLIST_ALERT_CHANNELS = [channel.strip() for channel in os.environ.get("WISHLIST_ALERT_CHANNELS", "in_app").split(",")
+                           if channel.strip()]
+FUZZY_SEARCH_MIN_RESULTS = int(os.environ.get("FUZZY_SEARCH_MIN_RESULTS", "5"))
+FUZZY_SEARCH_BUDGET_MS = float(os.environ.get("FUZZY_SEARCH_BUDGET_MS", "15"))
+PRODUCT_INDEX_PROJECTION = {"_id": 0, "id": 1, "name": 1, "brand": 1, "category": 1, "price": 1, "images": 1,
+                            "tags": 1, "description": 1, "reviews_count": 1, "is_active": 1, "updated_at": 1}
+
+def product_search_weight(product: dict) -> float:
+    """Popularity weight used to rank suggestions"""
+    return 1.0 + float(product.get("reviews_count") or 0)
+
+def product_suggest_payload(product: dict) -> dict:
+    images = product.get("images") or []
+    return {
+        "id": product["id"],
+        "name": product["name"],
+        "category": product.get("category"),
+        "price": product.get("price"),
+        "image_url": images[0] if images else None
+    }
+
+def unindex_product(product_id: str):
+    """Remove a product from the in-memory search indexes"""
+    bump_catalog_version()
+    fuzzy_index.remove(product_id)
+    vector_index.remove(product_id)
+    snapshot = indexed_products.pop(product_id, None)
+    if not snapshot:
+        return
+    weight = snapshot["weight"]
+    suggest_index.remove(snapshot["name"], "product", ref=product_id, weight=weight)
+    if snapshot.get("brand"):
+        suggest_index.remove(snapshot["brand"], "brand", weight=weight)
+    if snapshot.get("category"):
+        suggest_index.remove(snapshot["category"], "category", weight=weight)
+
+def index_product(product: dict):
+    """Insert or refresh a product in the in-memory search indexes"""
+    bump_catalog_version()
+    unindex_product(product["id"])
+    if not product.get("is_active", True) or not product.get("name"):
+        return
+    weight = product_search_weight(product)
+    suggest_index.add(product["name"], "product", ref=product["id"], weight=weight,
+                      payload=product_suggest_payload(product))
+    if product.get("brand"):
+        suggest_index.add(product["brand"], "brand", weight=weight)
+    if product.get("category"):
+        suggest_index.add(product["category"], "category", weight=weight)
+    fuzzy_index.add(product["id"], [product["name"], product.get("brand")])
+    vector_index.add(product)
+    indexed_products[product["id"]] = {
+        "name": product["name"],
+        "brand": product.get("brand"),
+        "category": product.get("category"),
+        "weight": weight
+    }
+
+def rebuild_search_indexes():
+    """Load every active product into the in-memory search indexes"""
+    global fuzzy_index, vector_index
+    terms = []
+    vector_products = []
+    indexed_products.clear()
+    rebuilt_fuzzy_index = TrigramIndex()
+    for product in products_collection.find({"is_active": True}, PRODUCT_INDEX_PROJECTION):
+        if not product.get("name"):
+            continue
+        weight = product_search_weight(product)
+        terms.append({"text": product["name"], "kind": "product", "ref": product["id"],
+                      "weight": weight, "payload": product_suggest_payload(product)})
+        if product.get("brand"):
+            terms.append({"text": product["brand"], "kind": "brand", "weight": weight})
+        if product.get("category"):
+            terms.append({"text": product["category"], "kind": "category", "weight": weight})
+        rebuilt_fuzzy_index.add(product["id"], [product["name"], product.get("brand")])
+        vector_products.append(product)
+        indexed_products[product["id"]] = {
+            "name": product["name"],
+            "brand": product.get("brand"),
+            "category": product.get("category"),
+            "weight": weight
+        }
+    suggest_index.bulk_load(terms)
+    fuzzy_index = rebuilt_fuzzy_index
+    rebuilt_vector_index = VectorIndex(dimensions=vector_index.dimensions)
+    rebuilt_vector_index.bulk_load(vector_products)
+    vector_index = rebuilt_vector_index
+
+async def sync_search_indexes():
+    """Pick up product writes made by other workers or scripts since the last pass"""
+    last_synced_at = datetime.now(timezone.utc)
+    while True:
+        await asyncio.sleep(PRODUCT_INDEX_SYNC_SECONDS)
+        try:
+            started_at = datetime.now(timezone.utc)
+            changed = await asyncio.to_thread(
+                lambda: list(products_collection.find({"updated_at": {"$gte": last_synced_at}}, PRODUCT_INDEX_PROJECTION))
+            )
+            for product in changed:
+                index_product(product)
+            last_synced_at = started_at
+        except Exception as e:
+            print(f"Search index sync error: {e}")
+
+async def refresh_popularity_scores():
+    """Periodically recompute time-decayed popularity scores"""
+    while True:
+        try:
+            stats = await asyncio.to_thread(
+                compute_popularity, orders_collection, wishlist_collection, product_activity_collection,
+                products_collection, POPULARITY_HALF_LIFE_DAYS, POPULARITY_WINDOW_DAYS
+            )
+            print(f"✅ Popularity scores refreshed: {stats}")
+        except Exception as e:
+            print(f"Popularity refresh error: {e}")
+        await asyncio.sleep(POPULARITY_REFRESH_SECONDS)
+
+background_tasks = set()  # strong references to long-running and fire-and-forget tasks
+
+def run_in_background(func, *args):
+    """Run a blocking function in a worker thread without making the request wait for it"""
+    async def run():
+        try:
+            await asyncio.to_thread(func, *args)
+        except Exception as e:
+            print(f"Background {func.__name__} error: {e}")
+    task = asyncio.create_task(run())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def create_index_safely(collection, keys, **kwargs):
+    """Create an index, logging (rather than raising) conflicts with existing indexes"""
+    try:
+        collection.create_index(keys, **kwargs)
+    except Exception as e:
+        print(f"⚠️ Could not create index {keys} on {collection.name}: {e}")
+
+def ensure_indexes():
+    """Create the MongoDB indexes the API relies on"""
+    create_index_safely(products_collection, "id")
+    create_index_safely(products_collection, "updated_at")
+    # Raw search events expire; the rollups keep the long-term history
+    create_index_safely(search_collection, "timestamp", expireAfterSeconds=SEARCH_EVENTS_RETENTION_DAYS * 86400)
+    create_index_safely(search_rollups_collection, [("granularity", 1), ("bucket", 1), ("query", 1)], unique=True)
+    create_index_safely(search_rollups_collection, "expires_at", expireAfterSeconds=0)
+    create_index_safely(orders_collection, [("user_id", 1), ("created_at", -1)])
+    create_index_safely(product_neighbors_collection, "product_id", unique=True)
+    create_index_safely(ai_jobs_collection, "id", unique=True)
+    create_index_safely(ai_jobs_collection, [("status", 1), ("lease_expires_at", 1)])
+    create_index_safely(bundle_pairs_collection, [("product_id", 1), ("other_id", 1)], unique=True)
+    create_index_safely(bundle_pairs_collection, [("product_id", 1), ("lift", -1)])
+    create_index_safely(products_collection, [("is_active", 1), ("popularity_score", -1)])
+    create_index_safely(orders_collection, "created_at")
+    create_index_safely(wishlist_collection, "items.added_at")
+    # Reverse index for wishlist alerts: product -> users who wishlisted it
+    create_index_safely(wishlist_collection, "items.product_id")
+    create_index_safely(notifications_collection, [("user_id", 1), ("created_at", -1)])
+    create_index_safely(product_activity_collection, [("product_id", 1), ("day", 1)], unique=True)
+    create_index_safely(product_activity_collection, "day")
+    create_index_safely(product_activity_collection, "expires_at", expireAfterSeconds=0)
+    # Review pages: one indexed query; reviewer profile changes fan out by user_id
+    create_index_safely(reviews_collection, [("product_id", 1), ("is_approved", 1), ("created_at", -1)])
+    create_index_safely(reviews_collection, "user_id")
+    create_index_safely(reviews_collection, [("is_approved", 1), ("created_at", -1)])
+    create_index_safely(review_summaries_collection, "product_id", unique=True)
+    # Seller ratings: product -> seller on review writes, seller -> products on recounts
+    create_index_safely(products_collection, [("seller_id", 1), ("is_active", 1)])
+    create_index_safely(seller_profiles_collection, "user_id")
+
+@app.on_event("startup")
+async def startup_tasks():
+    # Not best-effort like the other indexes: wishlist adds, and review creation and
+    # imports, are wrong without these unique indexes, so startup fails
+    ensure_wishlist_indexes(wishlist_collection)
+    # One review per user and product; also makes bulk review imports idempotent
+    ensure_review_indexes(reviews_collection, review_summaries_collection, products_collection,
+                          seller_profiles_collection)
+    try:
+        ensure_indexes()
+        rebuild_search_indexes()
+        print(f"✅ Search indexes built: {len(indexed_products)} products")
+    except Exception as e:
+        print(f"⚠️ Search index build failed: {e}")
+    background_tasks.add(asyncio.create_task(sync_search_indexes()))
+    background_tasks.add(asyncio.create_task(refresh_popularity_scores()))
+    await search_analytics.start()
+    await product_activity.start()
+    try:
+        await description_jobs.start()
+    except Exception as e:
+        print(f"⚠️ Description workers failed to start: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    await search_analytics.stop()
+    await product_activity.stop()
+    await description_jobs.stop()
+    await llm_gateway.aclose()
+
 # API Routes
 
 @app.get("/")
@@ -554,17 +1074,13 @@ async def get_seller_dashboard(current_user = Depends(get_seller_user)):
             order.pop("_id", None)
             recent_orders.append(order)
         
-        # Calculate average rating
-        seller_products_ids = [p["id"] for p in products]
-        reviews = list(reviews_collection.find({
-            "product_id": {"$in": seller_products_ids},
-            "is_approved": True
-        }))
-        
-        average_rating = 0.0
-        if reviews:
-            total_rating = sum(review["rating"] for review in reviews)
-            average_rating = total_rating / len(reviews)
+        # Rating totals are kept on the profile by review writes; profiles from before
+        # they existed are counted once here
+        if "rating_count" not in seller_profile:
+            backfill_seller_ratings(products_collection, review_summaries_collection, seller_profiles_collection,
+                                    seller_ids=[current_user["user_id"]])
+            seller_profile = seller_profiles_collection.find_one({"user_id": current_user["user_id"]})
+        average_rating, _ = seller_rating_response(seller_profile)
         
         # Get commission earned
         commissions = list(commissions_collection.find({
@@ -577,7 +1093,7 @@ async def get_seller_dashboard(current_user = Depends(get_seller_user)):
             total_products=total_products,
             total_sales=total_sales,
             total_orders=total_orders,
-            average_rating=round(average_rating, 1),
+            average_rating=average_rating,
             commission_earned=commission_earned,
             monthly_sales=monthly_sales,
             top_products=top_products,
@@ -698,6 +1214,8 @@ async def update_user_profile(user_update: UserUpdate, current_user = Depends(ge
             {"id": current_user["user_id"]},
             {"$set": update_data}
         )
+        if "name" in update_data or "avatar" in update_data:
+            run_in_background(sync_reviewer_profile, reviews_collection, users_collection, current_user["user_id"])
         
         updated_user = users_collection.find_one({"id": current_user["user_id"]})
         updated_user.pop("hashed_password", None)
@@ -712,14 +1230,10 @@ async def update_user_profile(user_update: UserUpdate, current_user = Depends(ge
 @app.post("/api/products", response_model=Product)
 async def create_product(product: ProductCreate, current_user = Depends(get_current_user)):
     try:
-        # Generate AI description
-        ai_description = await generate_product_description(
-            product.name, product.category, product.brand
-        )
-        
         product_data = product.dict()
         product_data["id"] = str(uuid.uuid4())
-        product_data["ai_generated_description"] = ai_description
+        product_data["ai_generated_description"] = None
+        product_data["ai_description_status"] = DESCRIPTION_PENDING
         product_data["created_at"] = datetime.now(timezone.utc)
         product_data["updated_at"] = datetime.now(timezone.utc)
         product_data["rating"] = 0.0
@@ -731,6 +1245,10 @@ async def create_product(product: ProductCreate, current_user = Depends(get_curr
             product_data["seller_id"] = current_user["user_id"]
         
         products_collection.insert_one(product_data)
+        index_product(product_data)
+        
+        # Generate AI description in the background (or reuse one for identical products)
+        product_data.update(description_jobs.enqueue(product_data["id"], product.name, product.category, product.brand))
         return Product(**product_data)
         
     except Exception as e:
@@ -767,8 +1285,9 @@ async def get_products(
             filter_query["price"] = price_filter
         
         # Get products
+        sort_field = "popularity_score" if sort_by == "popularity" else sort_by
         sort_direction = -1 if sort_order == "desc" else 1
-        products = list(products_collection.find(filter_query).sort(sort_by, sort_direction).limit(limit))
+        products = list(products_collection.find(filter_query).sort(sort_field, sort_direction).limit(limit))
         
         # Convert MongoDB _id to string and remove it
         for product in products:
@@ -781,15 +1300,17 @@ async def get_products(
         # Apply AI-powered search if search query provided
         if search:
             # Store search query for analytics
-            search_collection.insert_one({
+            search_analytics.record({
                 "query": search,
                 "results_count": len(products),
                 "user_id": current_user["user_id"] if current_user else None,
+                "source": "products",
                 "timestamp": datetime.now(timezone.utc)
             })
             
             # Apply smart search
-            products = await smart_search(search, products)
+            filters_key = json.dumps([category, brand, min_price, max_price, seller_id, sort_by, sort_order, limit])
+            products = await smart_search(search, products, filters_key)
         
         return products
         
@@ -804,6 +1325,7 @@ async def get_product(product_id: str):
             raise HTTPException(status_code=404, detail="Product not found")
         
         product.pop("_id", None)
+        product_activity.record(product_id, "views")
         
         # Update rating and review count
         avg_rating, review_count = calculate_average_rating(product_id)
@@ -830,20 +1352,14 @@ async def update_product(product_id: str, product_update: ProductUpdate, current
             current_user.get("role") != "admin"):
             raise HTTPException(status_code=403, detail="Not authorized to update this product")
         
-        # Generate AI description if name, category, or brand changed
+        # Regenerate AI description if name, category, or brand changed
         update_data = {k: v for k, v in product_update.dict().items() if v is not None}
         
-        ai_description = existing_product.get("ai_generated_description")
-        if (update_data.get("name") != existing_product.get("name") or
-            update_data.get("category") != existing_product.get("category") or
-            update_data.get("brand") != existing_product.get("brand")):
-            
-            name = update_data.get("name", existing_product.get("name"))
-            category = update_data.get("category", existing_product.get("category"))
-            brand = update_data.get("brand", existing_product.get("brand"))
-            ai_description = await generate_product_description(name, category, brand)
-        
-        update_data["ai_generated_description"] = ai_description
+        # Fields left out of the update are None and dropped above, so only real changes count
+        regenerate_description = any(
+            field in update_data and update_data[field] != existing_product.get(field)
+            for field in ("name", "category", "brand")
+        )
         update_data["updated_at"] = datetime.now(timezone.utc)
         
         # Update in database
@@ -852,9 +1368,23 @@ async def update_product(product_id: str, product_update: ProductUpdate, current
             {"$set": update_data}
         )
         
+        # The current description stays visible until the background job replaces it
+        if regenerate_description:
+            description_jobs.enqueue(
+                product_id,
+                update_data.get("name", existing_product.get("name")),
+                update_data.get("category", existing_product.get("category")),
+                update_data.get("brand", existing_product.get("brand"))
+            )
+        
         # Get updated product
         updated_product = products_collection.find_one({"id": product_id})
         updated_product.pop("_id", None)
+        index_product(updated_product)
+        
+        # Tell users who wishlisted the product about a price drop or restock
+        if "price" in update_data or "inventory" in update_data:
+            run_in_background(notify_wishlist_watchers, product_id, existing_product)
         
         # Update rating and review count
         avg_rating, review_count = calculate_average_rating(product_id)
@@ -881,11 +1411,16 @@ async def delete_product(product_id: str, current_user = Depends(get_current_use
             current_user.get("role") != "admin"):
             raise HTTPException(status_code=403, detail="Not authorized to delete this product")
         
-        # Soft delete product
-        products_collection.update_one(
-            {"id": product_id},
+        # Soft delete product; its reviews stop counting towards the seller's rating
+        result = products_collection.update_one(
+            {"id": product_id, "is_active": True},
             {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}}
         )
+        if result.modified_count:
+            count, rating_sum = product_rating_totals(review_summaries_collection, product_id)
+            inc_seller_ratings(products_collection, review_summaries_collection, seller_profiles_collection,
+                               {existing_product.get("seller_id"): (-count, -rating_sum)})
+        unindex_product(product_id)
         
         return {"message": "Product deleted successfully"}
         
@@ -898,13 +1433,18 @@ async def delete_product(product_id: str, current_user = Depends(get_current_use
 async def get_product_recommendations(product_id: str, current_user = Depends(get_current_user)):
     try:
         user_id = current_user["user_id"] if current_user else None
-        recommended_ids = await get_recommendations(user_id=user_id, product_id=product_id)
+        recommended_ids = await recommendation_cache.get(
+            (user_id, product_id), lambda: load_recommendations(product_id, user_id)
+        ) or []
         
+        products_by_id = {
+            product["id"]: product
+            for product in products_collection.find({"id": {"$in": recommended_ids}, "is_active": True}, {"_id": 0})
+        }
         recommended_products = []
-        for rec_id in recommended_ids[:6]:
-            product = products_collection.find_one({"id": rec_id, "is_active": True})
+        for rec_id in recommended_ids:
+            product = products_by_id.get(rec_id)
             if product:
-                product.pop("_id", None)
                 # Update rating and review count
                 avg_rating, review_count = calculate_average_rating(rec_id)
                 product["rating"] = avg_rating
@@ -916,6 +1456,79 @@ async def get_product_recommendations(product_id: str, current_user = Depends(ge
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/products/{product_id}/description/stream")
+async def stream_description(product_id: str, current_user = Depends(get_current_user_required)):
+    """Server-sent events for the seller's product form: the AI description as it is
+    written (``status``, ``token``..., ``done``), saved to the product when complete"""
+    product = products_collection.find_one({"id": product_id}, {"_id": 0, "seller_id": 1})
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if product.get("seller_id") != current_user["user_id"] and current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view this product's description")
+    
+    async def events():
+        async for event in description_jobs.stream(product_id):
+            name = event.pop("event")
+            yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass chunks through as they arrive
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/products/{product_id}/description-status")
+async def get_description_status(product_id: str):
+    """Progress of the product's AI description generation, for clients to poll"""
+    try:
+        product = products_collection.find_one(
+            {"id": product_id},
+            {"_id": 0, "ai_generated_description": 1, "ai_description_status": 1, "ai_description_job_id": 1}
+        )
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        job = None
+        if product.get("ai_description_job_id"):
+            job = ai_jobs_collection.find_one(
+                {"id": product["ai_description_job_id"]},
+                {"_id": 0, "id": 1, "status": 1, "attempts": 1, "error": 1, "created_at": 1, "updated_at": 1}
+            )
+        
+        return {
+            "product_id": product_id,
+            "status": product.get("ai_description_status"),
+            "ai_generated_description": product.get("ai_generated_description"),
+            "job": job
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/products/{product_id}/similar")
+async def get_similar_products(product_id: str, limit: int = Query(6, ge=1, le=50)):
+    """Products most similar in name, brand, category, tags and description (local vector index)"""
+    try:
+        matches = vector_index.similar(product_id, limit)
+        if not matches and not products_collection.find_one({"id": product_id, "is_active": True}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        scores = dict(matches)
+        products = list(products_collection.find({"id": {"$in": list(scores)}, "is_active": True}, {"_id": 0}))
+        products.sort(key=lambda p: -scores[p["id"]])
+        for product in products:
+            product["similarity"] = round(scores[product["id"]], 4)
+        
+        return {"similar": products}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Review Routes
 @app.post("/api/products/{product_id}/reviews", response_model=ReviewResponse)
 async def create_review(product_id: str, review_data: ReviewCreate, current_user = Depends(get_current_user_required)):
@@ -933,63 +1546,93 @@ async def create_review(product_id: str, review_data: ReviewCreate, current_user
         if existing_review:
             raise HTTPException(status_code=400, detail="You have already reviewed this product")
         
-        # Get user info
-        user = users_collection.find_one({"id": current_user["user_id"]})
+        # Reviewer name and avatar are stored on the review for the review pages
+        user = users_collection.find_one({"id": current_user["user_id"]}, REVIEWER_PROJECTION)
         
         # Create review
         review_dict = Review(
             product_id=product_id,
             user_id=current_user["user_id"],
             rating=review_data.rating,
-            comment=review_data.comment
+            comment=review_data.comment,
+            **reviewer_fields(user)
         ).dict()
         
-        reviews_collection.insert_one(review_dict)
+        try:
+            reviews_collection.insert_one(review_dict)
+        except DuplicateKeyError:
+            # A concurrent request from the same user got there first
+            raise HTTPException(status_code=400, detail="You have already reviewed this product")
+        update_seller_ratings({product_id: summary_on_create(reviews_collection, review_summaries_collection, review_dict)})
         
         # Prepare response
         review_dict.pop("_id", None)
-        review_response = ReviewResponse(
-            id=review_dict["id"],
-            product_id=review_dict["product_id"],
-            user_name=user["name"],
-            rating=review_dict["rating"],
-            comment=review_dict["comment"],
-            created_at=review_dict["created_at"],
-            is_approved=review_dict["is_approved"]
-        )
+        return ReviewResponse(**review_dict)
         
-        return review_response
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.put("/api/reviews/{review_id}", response_model=ReviewResponse)
+async def update_review(review_id: str, review_update: ReviewUpdate, current_user = Depends(get_current_user_required)):
+    """Edit your own review"""
+    try:
+        update_data = {k: v for k, v in review_update.dict().items() if v is not None}
+        update_data["updated_at"] = datetime.now(timezone.utc)
+        
+        # The pre-update document tells the summary which star bucket the review leaves
+        old_review = reviews_collection.find_one_and_update(
+            {"id": review_id, "user_id": current_user["user_id"]},
+            {"$set": update_data},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not old_review:
+            raise HTTPException(status_code=404, detail="Review not found")
+        
+        review = {**old_review, **update_data}
+        update_seller_ratings({review["product_id"]: summary_on_rating_change(
+            reviews_collection, review_summaries_collection, review, old_review["rating"]
+        )})
+        # Written before reviewer names were stored (until backfill_reviews.py has run)
+        if "user_name" not in review:
+            review.update(reviewer_fields(users_collection.find_one({"id": review["user_id"]}, REVIEWER_PROJECTION)))
+        return ReviewResponse(**review)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/products/{product_id}/reviews/summary")
+async def get_review_summary(product_id: str):
+    """Average rating, star distribution and latest review ids for a product"""
+    try:
+        summary = review_summaries_collection.find_one({"product_id": product_id}, {"_id": 0})
+        return review_summary_response(summary, product_id)
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/products/{product_id}/reviews", response_model=List[ReviewResponse])
 async def get_product_reviews(product_id: str, limit: int = Query(20), skip: int = Query(0)):
     try:
-        reviews = list(reviews_collection.find({
-            "product_id": product_id,
-            "is_approved": True
-        }).sort("created_at", -1).skip(skip).limit(limit))
+        reviews = list(reviews_collection.find(
+            {"product_id": product_id, "is_approved": True},
+            {"_id": 0, "id": 1, "product_id": 1, "user_id": 1, "user_name": 1, "user_avatar": 1,
+             "rating": 1, "comment": 1, "created_at": 1, "is_approved": 1}
+        ).sort("created_at", -1).skip(skip).limit(limit))
         
-        review_responses = []
-        for review in reviews:
-            review.pop("_id", None)
-            user = users_collection.find_one({"id": review["user_id"]})
-            
-            review_response = ReviewResponse(
-                id=review["id"],
-                product_id=review["product_id"],
-                user_name=user["name"] if user else "Anonymous",
-                rating=review["rating"],
-                comment=review["comment"],
-                created_at=review["created_at"],
-                is_approved=review["is_approved"]
-            )
-            review_responses.append(review_response)
+        # Reviews written before reviewer names were stored (until backfill_reviews.py has run)
+        missing_user_ids = list({review["user_id"] for review in reviews if "user_name" not in review})
+        if missing_user_ids:
+            users = {user["id"]: user for user in users_collection.find({"id": {"$in": missing_user_ids}}, REVIEWER_PROJECTION)}
+            for review in reviews:
+                if "user_name" not in review:
+                    review.update(reviewer_fields(users.get(review["user_id"])))
         
-        return review_responses
+        return [ReviewResponse(**review) for review in reviews]
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -998,26 +1641,12 @@ async def get_product_reviews(product_id: str, limit: int = Query(20), skip: int
 @app.get("/api/wishlist")
 async def get_user_wishlist(current_user = Depends(get_current_user_required)):
     try:
-        wishlist = wishlist_collection.find_one({"user_id": current_user["user_id"]})
+        wishlist = wishlist_collection.find_one({"user_id": current_user["user_id"]}, {"_id": 0})
         if not wishlist:
-            # Create empty wishlist
-            wishlist_data = Wishlist(user_id=current_user["user_id"]).dict()
-            wishlist_collection.insert_one(wishlist_data)
-            wishlist = wishlist_data
+            # Nothing is stored until the first add creates the wishlist
+            wishlist = {"id": None, "user_id": current_user["user_id"], "items": [], "updated_at": None}
         
-        wishlist.pop("_id", None)
-        
-        # Get product details for wishlist items
-        products = []
-        for item in wishlist.get("items", []):
-            product = products_collection.find_one({"id": item["product_id"], "is_active": True})
-            if product:
-                product.pop("_id", None)
-                # Update rating and review count
-                avg_rating, review_count = calculate_average_rating(product["id"])
-                product["rating"] = avg_rating
-                product["reviews_count"] = review_count
-                products.append(product)
+        products = hydrate_wishlist(products_collection, review_summaries_collection, wishlist.get("items", []))
         
         return {"wishlist": wishlist, "products": products}
         
@@ -1032,32 +1661,10 @@ async def add_to_wishlist(product_id: str, current_user = Depends(get_current_us
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        # Get or create wishlist
-        wishlist = wishlist_collection.find_one({"user_id": current_user["user_id"]})
-        if not wishlist:
-            wishlist_data = Wishlist(user_id=current_user["user_id"]).dict()
-            wishlist_collection.insert_one(wishlist_data)
-            wishlist = wishlist_data
-        
-        # Check if product already in wishlist
-        existing_items = wishlist.get("items", [])
-        if any(item["product_id"] == product_id for item in existing_items):
+        # One atomic update, creating the wishlist on the first add
+        if not add_wishlist_item(wishlist_collection, current_user["user_id"], product_id):
             raise HTTPException(status_code=400, detail="Product already in wishlist")
         
-        # Add to wishlist
-        new_item = WishlistItem(product_id=product_id).dict()
-        existing_items.append(new_item)
-        
-        wishlist_collection.update_one(
-            {"user_id": current_user["user_id"]},
-            {
-                "$set": {
-                    "items": existing_items,
-                    "updated_at": datetime.now(timezone.utc)
-                }
-            }
-        )
-        
         return {"message": "Product added to wishlist"}
         
     except HTTPException:
@@ -1068,27 +1675,9 @@ async def add_to_wishlist(product_id: str, current_user = Depends(get_current_us
 @app.delete("/api/wishlist/remove/{product_id}")
 async def remove_from_wishlist(product_id: str, current_user = Depends(get_current_user_required)):
     try:
-        wishlist = wishlist_collection.find_one({"user_id": current_user["user_id"]})
-        if not wishlist:
-            raise HTTPException(status_code=404, detail="Wishlist not found")
-        
-        # Remove from wishlist
-        existing_items = wishlist.get("items", [])
-        updated_items = [item for item in existing_items if item["product_id"] != product_id]
-        
-        if len(updated_items) == len(existing_items):
+        if not remove_wishlist_item(wishlist_collection, current_user["user_id"], product_id):
             raise HTTPException(status_code=404, detail="Product not in wishlist")
         
-        wishlist_collection.update_one(
-            {"user_id": current_user["user_id"]},
-            {
-                "$set": {
-                    "items": updated_items,
-                    "updated_at": datetime.now(timezone.utc)
-                }
-            }
-        )
-        
         return {"message": "Product removed from wishlist"}
         
     except HTTPException:
@@ -1134,6 +1723,52 @@ async def get_cart(cart_id: str, current_user = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/cart/{cart_id}/suggestions")
+async def get_cart_suggestions(cart_id: str, limit: int = Query(4, ge=1, le=20), current_user = Depends(get_current_user)):
+    """Products frequently bought together with the items in the cart"""
+    try:
+        cart = cart_collection.find_one({"id": cart_id}, {"_id": 0, "user_id": 1, "items.product_id": 1})
+        if not cart:
+            raise HTTPException(status_code=404, detail="Cart not found")
+        
+        # Check if user owns the cart
+        if (current_user and cart.get("user_id") != current_user["user_id"]):
+            raise HTTPException(status_code=403, detail="Not authorized to access this cart")
+        
+        cart_product_ids = [item["product_id"] for item in cart.get("items", [])]
+        if not cart_product_ids:
+            return {"suggestions": []}
+        
+        edges = bundle_pairs_collection.find({
+            "product_id": {"$in": cart_product_ids},
+            "pair_count": {"$gte": BUNDLE_MIN_PAIR_COUNT},
+            "support": {"$gte": BUNDLE_MIN_SUPPORT},
+            "lift": {"$gte": BUNDLE_MIN_LIFT}
+        }, {"_id": 0, "product_id": 1, "other_id": 1, "confidence": 1, "lift": 1})
+        # Rank a few spare candidates in case some are inactive or out of stock
+        bundles = rank_bundles(edges, exclude=cart_product_ids, limit=limit * 2)
+        
+        products_by_id = {
+            product["id"]: product
+            for product in products_collection.find(
+                {"id": {"$in": [bundle["product_id"] for bundle in bundles]}, "is_active": True, "inventory": {"$gt": 0}},
+                {"_id": 0}
+            )
+        }
+        suggestions = []
+        for bundle in bundles:
+            product = products_by_id.get(bundle["product_id"])
+            if product:
+                product["bundle"] = {"score": bundle["score"], "lift": bundle["lift"], "bought_with": bundle["bought_with"]}
+                suggestions.append(product)
+        
+        return {"suggestions": suggestions[:limit]}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/cart/{cart_id}/items")
 async def add_to_cart(cart_id: str, product_id: str, quantity: int = 1, current_user = Depends(get_current_user)):
     try:
@@ -1155,6 +1790,8 @@ async def add_to_cart(cart_id: str, product_id: str, quantity: int = 1, current_
         if (current_user and cart.get("user_id") != current_user["user_id"]):
             raise HTTPException(status_code=403, detail="Not authorized to access this cart")
         
+        product_activity.record(product_id, "cart_adds", quantity)
+        
         # Check if item already exists in cart
         items = cart.get("items", [])
         existing_item = None
@@ -1413,17 +2050,189 @@ async def get_brands():
 
 # Analytics
 @app.get("/api/analytics/search")
-async def get_search_analytics(current_user = Depends(get_admin_user)):
+async def get_search_analytics(
+    current_user = Depends(get_admin_user),
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    periods: int = Query(24, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100)
+):
+    """Search volume, top queries and zero-result queries from the incremental rollups"""
     try:
         recent_searches = list(search_collection.find().sort("timestamp", -1).limit(10))
         for search in recent_searches:
             search.pop("_id", None)
         
-        return {"recent_searches": recent_searches}
+        step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+        window_end = bucket_start(datetime.now(timezone.utc), granularity) + step
+        window_start = window_end - step * periods
+        window = {"granularity": granularity, "bucket": {"$gte": window_start, "$lt": window_end}}
+        
+        timeseries = []
+        for rollup in search_rollups_collection.find({**window, "query": None}).sort("bucket", 1):
+            timeseries.append({"bucket": rollup["bucket"], **summarize_rollup(rollup)})
+        
+        def query_report(sort_field: str, extra_match: Dict = None) -> List[Dict]:
+            pipeline = [
+                {"$match": {**window, "query": {"$ne": None}}},
+                {"$group": {
+                    "_id": "$query",
+                    "count": {"$sum": "$count"},
+                    "results_sum": {"$sum": "$results_sum"},
+                    "zero_results": {"$sum": "$zero_results"}
+                }},
+                {"$match": extra_match or {}},
+                {"$sort": {sort_field: -1}},
+                {"$limit": top}
+            ]
+            return [{"query": row["_id"], **summarize_rollup(row)} for row in search_rollups_collection.aggregate(pipeline)]
+        
+        top_queries = query_report("count")
+        zero_result_queries = query_report("zero_results", {"zero_results": {"$gt": 0}})
+        for report in (top_queries, zero_result_queries):
+            for row in report:
+                row.pop("distinct_users", None)  # only tracked on bucket totals
+        
+        return {
+            "granularity": granularity,
+            "window_start": window_start,
+            "window_end": window_end,
+            "timeseries": timeseries,
+            "top_queries": top_queries,
+            "zero_result_queries": zero_result_queries,
+            "recent_searches": recent_searches,
+            "writer": search_analytics.stats()
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/search/smart-search-stats")
+async def get_smart_search_stats(current_user = Depends(get_admin_user)):
+    """Prompt size and latency of LLM smart search, per prompt mode"""
+    try:
+        modes = {}
+        for mode, stats in smart_search_stats.items():
+            calls = stats["calls"] or 1
+            end_to_end_calls = stats["end_to_end_calls"] or 1
+            modes[mode] = {
+                **stats,
+                "avg_prompt_tokens": round(stats["prompt_tokens"] / calls, 1),
+                "avg_legacy_prompt_tokens": round(stats["legacy_prompt_tokens"] / calls, 1),
+                "avg_candidates": round(stats["candidates"] / calls, 1),
+                "avg_llm_ms": round(stats["llm_seconds"] * 1000 / calls, 1),
+                "avg_end_to_end_ms": round(stats["end_to_end_seconds"] * 1000 / end_to_end_calls, 1)
+            }
+        
+        return {
+            "prerank_enabled": SMART_SEARCH_PRERANK,
+            "top_k": SMART_SEARCH_TOP_K,
+            "token_budget": SMART_SEARCH_TOKEN_BUDGET,
+            "modes": modes,
+            "cache": smart_search_cache.stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/recommendations/rebuild")
+async def rebuild_recommendations(current_user = Depends(get_admin_user)):
+    """Rebuild the co-purchase neighbour and frequently-bought-together tables from all orders"""
+    try:
+        stats = await asyncio.to_thread(
+            build_copurchase_model, orders_collection, product_neighbors_collection, RECOMMENDATION_TOP_N
+        )
+        stats["bundles"] = await asyncio.to_thread(
+            build_bundle_model, orders_collection, bundle_stats_collection, bundle_pairs_collection
+        )
+        await log_admin_action(
+            current_user["user_id"],
+            "recommendations_rebuild",
+            f"Rebuilt co-purchase recommendations for {stats['products_with_neighbors']} products",
+            stats
+        )
+        recommendation_cache.clear()
+        return stats
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/llm/stats")
+async def get_llm_stats(current_user = Depends(get_admin_user)):
+    """Circuit breaker state and per-feature LLM call counters and latency"""
+    return llm_gateway.stats()
+
+@app.get("/api/admin/ai-descriptions/stats")
+async def get_ai_description_stats(current_user = Depends(get_admin_user)):
+    """Description cache hit rate and background job counters"""
+    try:
+        return {
+            "cache": await asyncio.to_thread(description_cache.stats),
+            "jobs": description_jobs.stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/recommendations/cache-stats")
+async def get_recommendation_cache_stats(current_user = Depends(get_admin_user)):
+    """Hit ratio and refresh latency of the recommendation cache"""
+    return recommendation_cache.stats()
+
+# Scrape-time views of the existing cache, breaker and job counters
+AI_FEATURES = ("search", "recommendations", "description")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+def ai_cache_samples():
+    caches = {"search": smart_search_cache, "recommendations": recommendation_cache, "description": description_cache}
+    for feature, cache in caches.items():
+        yield {"feature": feature, "result": "hit"}, cache.hits
+        yield {"feature": feature, "result": "miss"}, cache.misses
+    yield {"feature": "recommendations", "result": "stale_hit"}, recommendation_cache.stale_hits
+
+def llm_breaker_samples():
+    yield {}, {"closed": 0, "half_open": 1, "open": 2}[llm_gateway.breaker.state]
+
+def description_job_samples():
+    stats = description_jobs.stats()
+    for outcome in ("completed", "failed", "retried"):
+        yield {"outcome": outcome}, stats[outcome]
+
+metrics_registry.callback("ai_cache_lookups_total", "AI result cache lookups by feature and result",
+                          ["feature", "result"], ai_cache_samples, type="counter")
+metrics_registry.callback("llm_circuit_state", "LLM circuit breaker state (0 closed, 1 half-open, 2 open)",
+                          [], llm_breaker_samples)
+metrics_registry.callback("llm_circuit_trips_total", "Times the LLM circuit breaker opened",
+                          [], lambda: [({}, llm_gateway.breaker.trips)], type="counter")
+metrics_registry.callback("ai_description_jobs_total", "Background description jobs by outcome",
+                          ["outcome"], description_job_samples, type="counter")
+metrics_registry.callback("ai_description_jobs_queued", "Description jobs waiting for a worker",
+                          [], lambda: [({}, description_jobs.stats()["queued"])])
+
+@app.get("/api/metrics")
+async def get_metrics(request: Request, format: str = Query("prometheus", pattern="^(prometheus|json)$"),
+                      current_user = Depends(get_current_user)):
+    """LLM usage, latency, fallback and cache metrics of this process.
+    Prometheus text by default; scrapers authenticate with METRICS_TOKEN as a bearer token."""
+    authorization = request.headers.get("authorization", "")
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}")
+    if not token_ok and (current_user or {}).get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    if format == "json":
+        return {"features": ai_feature_summary(AI_FEATURES), "metrics": metrics_registry.snapshot()}
+    return PlainTextResponse(metrics_registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/admin/popularity/recompute")
+async def recompute_popularity(current_user = Depends(get_admin_user)):
+    """Recompute popularity scores now instead of waiting for the next scheduled pass"""
+    try:
+        await product_activity.flush()
+        return await asyncio.to_thread(
+            compute_popularity, orders_collection, wishlist_collection, product_activity_collection,
+            products_collection, POPULARITY_HALF_LIFE_DAYS, POPULARITY_WINDOW_DAYS
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Coupon Management Routes
 @app.post("/api/admin/coupons", response_model=Coupon)
 async def create_coupon(coupon_data: CouponCreate, current_user = Depends(get_admin_user)):
@@ -1692,6 +2501,46 @@ async def update_seller_commission(seller_id: str, commission_rate: float, curre
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.put("/api/admin/products/{product_id}/seller")
+async def reassign_product_seller(product_id: str, seller_id: str, current_user = Depends(get_admin_user)):
+    """Move a product to another seller, together with its reviews' share of the seller rating"""
+    try:
+        if not seller_profiles_collection.find_one({"user_id": seller_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Seller not found")
+        
+        # The pre-update document names the seller the product's ratings leave
+        product = products_collection.find_one_and_update(
+            {"id": product_id, "seller_id": {"$ne": seller_id}},
+            {"$set": {"seller_id": seller_id, "updated_at": datetime.now(timezone.utc)}},
+            projection={"_id": 0, "id": 1, "seller_id": 1, "is_active": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not product:
+            if not products_collection.find_one({"id": product_id}, {"_id": 1}):
+                raise HTTPException(status_code=404, detail="Product not found")
+            return {"message": "Product already belongs to this seller"}
+        
+        if product.get("is_active"):
+            count, rating_sum = product_rating_totals(review_summaries_collection, product_id)
+            inc_seller_ratings(products_collection, review_summaries_collection, seller_profiles_collection, {
+                product.get("seller_id"): (-count, -rating_sum),
+                seller_id: (count, rating_sum),
+            })
+        
+        await log_admin_action(
+            current_user["user_id"],
+            "product_seller_reassignment",
+            f"Moved product {product_id} from seller {product.get('seller_id')} to {seller_id}",
+            {"product_id": product_id, "from_seller_id": product.get("seller_id"), "to_seller_id": seller_id}
+        )
+        
+        return {"message": "Product reassigned successfully"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Enhanced checkout with coupon and commission handling
 @app.post("/api/checkout/session")
 async def create_checkout_session(request: CheckoutRequest, current_user = Depends(get_current_user)):
@@ -1869,6 +2718,12 @@ async def process_successful_payment(transaction_data: dict):
         
         orders_collection.insert_one(order_data)
         
+        # Fold the basket into the frequently-bought-together tables
+        try:
+            await asyncio.to_thread(record_basket, order_data["items"], bundle_stats_collection, bundle_pairs_collection)
+        except Exception as e:
+            print(f"Bundle update failed for order {order_data['id']}: {e}")
+        
         # Clear cart
         cart_id = transaction_data.get("cart_id")
         if cart_id:
@@ -1949,7 +2804,8 @@ async def search_users(
     role: Optional[str] = None,
     status: Optional[str] = None,
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    count: CountMode = CountMode.CACHED
 ):
     """Search and filter users with enhanced criteria"""
     try:
@@ -1968,20 +2824,16 @@ async def search_users(
         if status and status != "all":
             query["is_active"] = (status == "active")
         
-        # Get total count
-        total_users = users_collection.count_documents(query)
-        
         # Get users with pagination
-        users = list(users_collection.find(query).skip(skip).limit(limit).sort("created_at", -1))
-        for user in users:
-            user.pop("hashed_password", None)
-            user.pop("_id", None)
+        page = paginate(users_collection, query, [("created_at", -1)], skip, limit, count,
+                        projection={"_id": 0, "hashed_password": 0})
         
         return {
-            "users": users,
-            "total": total_users,
-            "page": skip // limit + 1,
-            "pages": (total_users + limit - 1) // limit
+            "users": page["items"],
+            "total": page["total"],
+            "page": page["page"],
+            "pages": page["pages"],
+            "has_more": page["has_more"]
         }
         
     except Exception as e:
@@ -2063,6 +2915,116 @@ async def update_user_role(user_id: str, role: UserRole, current_user = Depends(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Admin Review Moderation
+@app.put("/api/admin/reviews/{review_id}/approval")
+async def update_review_approval(review_id: str, is_approved: bool, current_user = Depends(get_admin_user)):
+    """Approve a review, or hide an approved one"""
+    try:
+        # Only an actual change of is_approved touches the product's review summary
+        review = reviews_collection.find_one_and_update(
+            {"id": review_id, "is_approved": {"$ne": is_approved}},
+            {"$set": {"is_approved": is_approved, "updated_at": datetime.now(timezone.utc)}},
+            projection={"_id": 0, "id": 1, "product_id": 1, "rating": 1, "is_approved": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if review:
+            update_seller_ratings({review["product_id"]: summary_on_approval(
+                reviews_collection, review_summaries_collection, review
+            )})
+        elif not reviews_collection.find_one({"id": review_id}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Review not found")
+        
+        await log_admin_action(
+            current_user["user_id"],
+            "review_approval_update",
+            f"{'Approved' if is_approved else 'Hid'} review {review_id}",
+            {"review_id": review_id, "is_approved": is_approved}
+        )
+        
+        return {"message": f"Review {'approved' if is_approved else 'hidden'} successfully"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admin/reviews")
+async def get_reviews_for_moderation(
+    status: str = Query("pending", pattern="^(pending|approved|all)$"),
+    product_id: Optional[str] = Query(None),
+    limit: int = Query(50, le=500),
+    skip: int = Query(0),
+    current_user = Depends(get_admin_user)
+):
+    """Reviews awaiting moderation (or all reviews), newest first"""
+    try:
+        query = {}
+        if status != "all":
+            query["is_approved"] = status == "approved"
+        if product_id:
+            query["product_id"] = product_id
+        
+        reviews = list(reviews_collection.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit))
+        return {"reviews": reviews, "count": len(reviews)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/reviews/moderate")
+async def moderate_reviews(moderation: ReviewModeration, current_user = Depends(get_admin_user)):
+    """Approve or hide many reviews at once; each product's summary gets one $inc"""
+    try:
+        # Flipped one by one, so the seller ratings move by exactly the reviews that changed
+        changed = await asyncio.to_thread(
+            set_reviews_approval, reviews_collection, moderation.review_ids, moderation.is_approved
+        )
+        product_ids = list({review["product_id"] for review in changed})
+        if product_ids:
+            incs = summary_incs(changed, [{**review, "is_approved": not review["is_approved"]} for review in changed])
+            await asyncio.to_thread(apply_summary_incs, reviews_collection, review_summaries_collection, incs)
+            update_seller_ratings(approved_deltas(changed, 1 if moderation.is_approved else -1))
+        
+        await log_admin_action(
+            current_user["user_id"],
+            "reviews_bulk_moderation",
+            f"{'Approved' if moderation.is_approved else 'Hid'} {len(changed)} reviews",
+            {"review_ids": moderation.review_ids, "is_approved": moderation.is_approved}
+        )
+        
+        return {"updated": len(changed), "products_updated": len(product_ids)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/admin/reviews/import")
+async def import_reviews(
+    file: UploadFile = File(...),
+    approve: bool = Query(True, description="moderation state for lines without is_approved"),
+    source: str = Query("import", description="prefix for reviewers without an account here"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    current_user = Depends(get_admin_user)
+):
+    """Bulk-import reviews from an NDJSON upload (see review_import.py for the line format).
+    For millions of reviews, import_reviews.py on a machine near the database is faster."""
+    try:
+        importer = ReviewImporter(
+            reviews_collection, products_collection, users_collection, review_summaries_collection,
+            seller_profiles_collection, batch_size=batch_size, approve=approve, source=source
+        )
+        report = await asyncio.to_thread(importer.run, file.file)
+        
+        await log_admin_action(
+            current_user["user_id"],
+            "reviews_import",
+            f"Imported {report['inserted']} reviews from {file.filename}",
+            {key: value for key, value in report.items() if key != "errors"}
+        )
+        
+        return report
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Admin Statistics and Analytics
 @app.get("/api/admin/statistics")
 async def get_admin_statistics(current_user = Depends(get_admin_user)):
@@ -2144,9 +3106,12 @@ async def get_admin_statistics(current_user = Depends(get_admin_user)):
             order.pop("_id", None)
         
         # Website traffic (simplified - you'd typically get this from analytics)
-        visits_today = search_collection.count_documents({
-            "timestamp": {"$gte": datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)}
+        today_rollup = search_rollups_collection.find_one({
+            "granularity": "day",
+            "bucket": bucket_start(datetime.now(timezone.utc), "day"),
+            "query": None
         })
+        visits_today = today_rollup["count"] if today_rollup else 0
         
         return {
             "user_stats": {
@@ -2200,7 +3165,8 @@ async def get_action_logs(
     current_user = Depends(get_admin_user),
     action_type: Optional[str] = None,
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    count: CountMode = CountMode.HAS_MORE
 ):
     """Get admin action logs"""
     try:
@@ -2208,8 +3174,8 @@ async def get_action_logs(
         if action_type and action_type != "all":
             query["action_type"] = action_type
         
-        total_logs = action_logs_collection.count_documents(query)
-        logs = list(action_logs_collection.find(query).skip(skip).limit(limit).sort("timestamp", -1))
+        page = paginate(action_logs_collection, query, [("timestamp", -1)], skip, limit, count)
+        logs = page["items"]
         
         # Get admin names
         for log in logs:
@@ -2219,9 +3185,10 @@ async def get_action_logs(
         
         return {
             "logs": logs,
-            "total": total_logs,
-            "page": skip // limit + 1,
-            "pages": (total_logs + limit - 1) // limit
+            "total": page["total"],
+            "page": page["page"],
+            "pages": page["pages"],
+            "has_more": page["has_more"]
         }
         
     except Exception as e:
@@ -2264,6 +3231,8 @@ async def update_user_profile(profile_data: UserUpdate, current_user = Depends(g
                 {"id": current_user["user_id"]},
                 {"$set": update_data}
             )
+            if "name" in update_data or "avatar" in update_data:
+                run_in_background(sync_reviewer_profile, reviews_collection, users_collection, current_user["user_id"])
         
         # Get updated user
         updated_user = users_collection.find_one({"id": current_user["user_id"]})
@@ -2344,6 +3313,7 @@ async def upload_avatar(file: UploadFile = File(...), current_user = Depends(get
                 }
             }
         )
+        run_in_background(sync_reviewer_profile, reviews_collection, users_collection, current_user["user_id"])
         
         return {"avatar_url": avatar_url}
         
@@ -2400,7 +3370,9 @@ async def search_products(
     min_rating: Optional[float] = None,
     sort: Optional[str] = "name",
     limit: int = 20,
-    skip: int = 0
+    skip: int = 0,
+    count: CountMode = CountMode.CACHED,
+    current_user = Depends(get_current_user)
 ):
     """Enhanced product search with advanced filtering and sorting"""
     try:
@@ -2449,34 +3421,70 @@ async def search_products(
             "price": ("price", 1),
             "price_desc": ("price", -1),
             "rating": ("rating", -1),
-            "newest": ("created_at", -1)
+            "newest": ("created_at", -1),
+            "popularity": ("popularity_score", -1)
         }
         sort_field, sort_direction = sort_options.get(sort, ("name", 1))
         
         # Execute query
-        total_count = products_collection.count_documents(query)
-        products = list(
-            products_collection.find(query)
-            .sort(sort_field, sort_direction)
-            .skip(skip)
-            .limit(limit)
-        )
+        page = paginate(products_collection, query, [(sort_field, sort_direction)], skip, limit, count)
+        products = page["items"]
+        total_count = page["total"]
+        
+        # Fall back to typo-tolerant matching when the exact search finds little
+        corrections = {}
+        if q and skip == 0 and len(products) < min(limit, FUZZY_SEARCH_MIN_RESULTS):
+            fuzzy = fuzzy_index.search(q, limit=limit, budget_ms=FUZZY_SEARCH_BUDGET_MS)
+            corrections = fuzzy["corrections"]
+            seen_ids = {product["id"] for product in products}
+            fuzzy_ids = [product_id for product_id in fuzzy["ids"] if product_id not in seen_ids]
+            if fuzzy_ids:
+                fuzzy_query = dict(query)
+                if not category:
+                    fuzzy_query.pop("$or", None)  # drop the regex text match, keep the filters
+                fuzzy_query["id"] = {"$in": fuzzy_ids}
+                rank = {product_id: position for position, product_id in enumerate(fuzzy_ids)}
+                fuzzy_products = sorted(products_collection.find(fuzzy_query), key=lambda p: rank[p["id"]])
+                products.extend(fuzzy_products[:limit - len(products)])
+                if total_count is not None:
+                    total_count = max(total_count, len(products))
         
         # Clean up MongoDB _id field
         for product in products:
             product.pop("_id", None)
         
+        if q:
+            search_analytics.record({
+                "query": q,
+                "results_count": total_count if total_count is not None else len(products),
+                "user_id": current_user["user_id"] if current_user else None,
+                "source": "search",
+                "timestamp": datetime.now(timezone.utc)
+            })
+        
         return {
             "products": products,
+            "corrections": corrections,
             "total": total_count,
-            "page": skip // limit + 1,
-            "pages": (total_count + limit - 1) // limit,
+            "page": page["page"],
+            "pages": (total_count + limit - 1) // limit if total_count is not None else None,
+            "has_more": page["has_more"],
             "limit": limit
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Typeahead suggestions served from the in-memory prefix index
+@app.get("/api/search/suggest")
+async def search_suggest(q: str = Query(..., min_length=1), limit: int = Query(8, ge=1, le=20)):
+    """Complete product names, brands and categories for a typed prefix"""
+    try:
+        return {"query": q, "suggestions": suggest_index.suggest(q, limit)}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Enhanced Authentication with Phone and Email Verification
 
 # Phone Verification Endpoints
@@ -0,0 +1,160 @@
+"""
+Local "more like this" engine: products are embedded as feature-hashed TF-IDF
+vectors and compared by cosine similarity, with no network dependency
+"""
+
+import math
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from search_index import tokenize
+
+# How much a word found in each field contributes to a product's vector
+VECTOR_FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 2.0, "tags": 1.5, "description": 1.0}
+
+
+def product_features(product: Dict[str, Any]) -> Counter:
+    """Weighted term counts for a product.
+
+    Brand and category are also added as whole-value features so products
+    sharing them stay close even when their names share no words.
+    """
+    features = Counter()
+    for field, weight in VECTOR_FIELD_WEIGHTS.items():
+        value = product.get(field)
+        if isinstance(value, list):
+            value = " ".join(str(item) for item in value)
+        for token in tokenize(value):
+            features[token] += weight
+    for field in ("brand", "category"):
+        value = " ".join(tokenize(product.get(field)))
+        if value:
+            features[f"{field}={value}"] += VECTOR_FIELD_WEIGHTS[field]
+    return features
+
+
+class VectorIndex:
+    """Products as rows of a normalized float32 matrix, queried with one matrix-vector product.
+
+    Terms are feature-hashed (signed, crc32) into ``dimensions`` buckets and
+    weighted by TF-IDF. IDF weights are computed by :meth:`bulk_load`; rows
+    added or updated afterwards reuse them until the next bulk load. Removed
+    rows are zeroed (so they never score above 0) and reused by later inserts.
+    """
+
+    def __init__(self, dimensions: int = 256, initial_capacity: int = 1024):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((initial_capacity, dimensions), dtype=np.float32)
+        self._idf = np.ones(dimensions, dtype=np.float32)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free_rows: List[int] = []
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._matrix.nbytes
+
+    def _hash_features(self, features: Counter) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for term, weight in features.items():
+            hashed = zlib.crc32(term.encode())
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            vector[hashed % self.dimensions] += sign * (1.0 + math.log(weight))
+        return vector
+
+    def _embed(self, product: Dict[str, Any]) -> np.ndarray:
+        vector = self._hash_features(product_features(product)) * self._idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def add(self, product: Dict[str, Any]):
+        """Insert or re-embed a product (keyed by its ``id``)"""
+        vector = self._embed(product)
+        with self._lock:
+            row = self._rows.get(product["id"])
+            if row is None:
+                if self._free_rows:
+                    row = self._free_rows.pop()
+                    self._ids[row] = product["id"]
+                else:
+                    row = len(self._ids)
+                    self._ensure_capacity(row + 1)
+                    self._ids.append(product["id"])
+                self._rows[product["id"]] = row
+            self._matrix[row] = vector
+
+    def remove(self, product_id: str):
+        with self._lock:
+            row = self._rows.pop(product_id, None)
+            if row is None:
+                return
+            self._matrix[row] = 0.0
+            self._ids[row] = None
+            self._free_rows.append(row)
+
+    def bulk_load(self, products: Iterable[Dict[str, Any]]):
+        """Replace the index contents, recomputing IDF weights over ``products``"""
+        products = list(products)
+        capacity = max(len(products), 1024)
+        matrix = np.zeros((capacity, self.dimensions), dtype=np.float32)
+        for row, product in enumerate(products):
+            matrix[row] = self._hash_features(product_features(product))
+        loaded = matrix[:len(products)]
+        document_frequency = np.count_nonzero(loaded, axis=0)
+        idf = (np.log((1.0 + len(products)) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+
+        loaded *= idf
+        norms = np.linalg.norm(loaded, axis=1, keepdims=True)
+        np.divide(loaded, norms, out=loaded, where=norms > 0)
+
+        with self._lock:
+            self._idf = idf
+            self._matrix = matrix
+            self._ids = [product["id"] for product in products]
+            self._rows = {product_id: row for row, product_id in enumerate(self._ids)}
+            self._free_rows = []
+
+    def _top_k(self, vector: np.ndarray, k: int, exclude_row: Optional[int] = None) -> List[Tuple[str, float]]:
+        rows = len(self._ids)
+        if rows == 0 or k <= 0:
+            return []
+        # Removed rows are all zeros, so they score 0 and are filtered out below
+        scores = self._matrix[:rows] @ vector
+        if exclude_row is not None:
+            scores[exclude_row] = -np.inf
+        k = min(k, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._ids[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def similar(self, product_id: str, k: int = 6) -> List[Tuple[str, float]]:
+        """Ids and cosine scores of the ``k`` products most similar to ``product_id``"""
+        with self._lock:
+            row = self._rows.get(product_id)
+            if row is None:
+                return []
+            return self._top_k(self._matrix[row].copy(), k, exclude_row=row)
+
+    def query(self, product: Dict[str, Any], k: int = 6) -> List[Tuple[str, float]]:
+        """Nearest products to an arbitrary (possibly unindexed) product-like dict"""
+        vector = self._embed(product)
+        with self._lock:
+            return self._top_k(vector, k, exclude_row=self._rows.get(product.get("id")))
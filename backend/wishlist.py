@@ -0,0 +1,241 @@
+"""
+Wishlist reads and writes. Each user has one wishlist document (unique
+``user_id``); items are added and removed with a single atomic update each, so
+two tabs adding at the same time cannot overwrite each other's items and a click
+sends one item instead of the whole array. Reading a wishlist is one product
+query and one review summary query however long it is.
+
+The multikey index on ``items.product_id`` is the reverse index (product ->
+users who wishlisted it) used to fan out price-drop and back-in-stock alerts.
+"""
+
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from models import NotificationType
+
+
+def merge_duplicate_wishlists(wishlist_collection) -> int:
+    """Fold extra wishlist documents of a user (left by the old get-then-create add)
+    into the oldest one, keeping each product once at its earliest added_at.
+    Returns the number of documents removed."""
+    removed = 0
+    duplicates = wishlist_collection.aggregate([
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    for group in duplicates:
+        wishlists = list(wishlist_collection.find({"user_id": group["_id"]}).sort("_id", 1))
+        keep, extra = wishlists[0], wishlists[1:]
+        items: Dict[str, Dict[str, Any]] = {}
+        for wishlist in wishlists:
+            for item in wishlist.get("items", []):
+                current = items.get(item["product_id"])
+                if current is None or (item.get("added_at") and current.get("added_at")
+                                       and item["added_at"] < current["added_at"]):
+                    items[item["product_id"]] = item
+        wishlist_collection.update_one(
+            {"_id": keep["_id"]},
+            {"$set": {"items": list(items.values()), "updated_at": datetime.now(timezone.utc)}}
+        )
+        removed += wishlist_collection.delete_many({"_id": {"$in": [wishlist["_id"] for wishlist in extra]}}).deleted_count
+    return removed
+
+
+def ensure_wishlist_indexes(wishlist_collection, attempts: int = 3):
+    """Create the unique user_id index that add_wishlist_item relies on, merging
+    duplicate wishlists first. Raises when the index cannot be created: without it
+    a repeated add would insert a second wishlist instead of being refused."""
+    for _ in range(attempts):
+        removed = merge_duplicate_wishlists(wishlist_collection)
+        if removed:
+            print(f"Merged {removed} duplicate wishlist documents")
+        try:
+            wishlist_collection.create_index("user_id", unique=True)
+            break
+        except DuplicateKeyError:
+            continue  # a wishlist was duplicated again while merging; merge once more
+        except OperationFailure as e:
+            # A plain index on user_id has the same name; replace it with the unique one
+            if "user_id_1" not in wishlist_collection.index_information():
+                raise
+            print(f"Replacing non-unique wishlist user_id index: {e}")
+            wishlist_collection.drop_index("user_id_1")
+    if not any(index.get("key") == [("user_id", 1)] and index.get("unique")
+               for index in wishlist_collection.index_information().values()):
+        raise RuntimeError("wishlist needs a unique user_id index; merge the duplicate wishlists and restart")
+
+
+def add_wishlist_item(wishlist_collection, user_id: str, product_id: str) -> bool:
+    """Add a product to the user's wishlist, creating the wishlist if needed.
+    Returns False when the product is already on it. Requires the unique user_id
+    index (see ``ensure_wishlist_indexes``)."""
+    now = datetime.now(timezone.utc)
+    query = {"user_id": user_id, "items.product_id": {"$ne": product_id}}
+    # $push guarded by $ne is $addToSet on product_id: items also carry added_at,
+    # so a plain $addToSet would see a second add as a different item
+    update = {
+        "$push": {"items": {"product_id": product_id, "added_at": now}},
+        "$set": {"updated_at": now},
+        "$setOnInsert": {"id": str(uuid.uuid4())},
+    }
+    try:
+        wishlist_collection.update_one(query, update, upsert=True)
+        return True
+    except DuplicateKeyError:
+        # The upsert tried a second document for the user: either the product is
+        # already on the wishlist, or a concurrent first add created the wishlist
+        # just now; the plain update tells which
+        del update["$setOnInsert"]
+        return wishlist_collection.update_one(query, update).modified_count > 0
+
+
+def remove_wishlist_item(wishlist_collection, user_id: str, product_id: str) -> bool:
+    """Remove a product from the user's wishlist; False when it was not on it"""
+    result = wishlist_collection.update_one(
+        {"user_id": user_id, "items.product_id": product_id},
+        {
+            "$pull": {"items": {"product_id": product_id}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        }
+    )
+    return result.modified_count > 0
+
+
+# Fields the wishlist page shows; the first image is enough for the card
+WISHLIST_PRODUCT_PROJECTION = {"_id": 0, "id": 1, "name": 1, "price": 1, "price_negotiable": 1, "category": 1,
+                               "brand": 1, "images": {"$slice": 1}, "inventory": 1}
+
+
+def hydrate_wishlist(products_collection, summaries_collection, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Products of the wishlist items in wishlist order, with rating and review count
+    from their review summaries. Deactivated or deleted products are left out."""
+    product_ids = list(dict.fromkeys(item["product_id"] for item in items))
+    if not product_ids:
+        return []
+    products = {product["id"]: product for product in products_collection.find(
+        {"id": {"$in": product_ids}, "is_active": True}, WISHLIST_PRODUCT_PROJECTION
+    )}
+    summaries = {summary["product_id"]: summary for summary in summaries_collection.find(
+        {"product_id": {"$in": list(products)}}, {"_id": 0, "product_id": 1, "count": 1, "rating_sum": 1}
+    )} if products else {}
+
+    hydrated = []
+    for product_id in product_ids:
+        product = products.get(product_id)
+        if not product:
+            continue
+        summary = summaries.get(product_id) or {}
+        count = summary.get("count", 0)
+        product["rating"] = round(summary.get("rating_sum", 0) / count, 1) if count else 0.0
+        product["reviews_count"] = count
+        hydrated.append(product)
+    return hydrated
+
+
+# Last alerted state, stored on the product: the price the next drop is measured
+# from, whether watchers know it is in stock, and when they were last alerted
+WISHLIST_ALERT_FIELDS = ("wishlist_alerted_price", "wishlist_alerted_in_stock", "wishlist_alerted_at")
+
+
+def wishlist_alert(product: Dict[str, Any], previous: Dict[str, Any], price_drop_percent: float,
+                   restock_threshold: int, cooldown_seconds: float,
+                   now: datetime) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """(alert or None, alert state to store) for a product's current price and stock,
+    compared with the last alerted state stored on it rather than with the previous
+    version, so a price going 100 -> 90 -> 100 -> 90 alerts once. ``previous`` (the
+    product before the update) stands in for a product never alerted about. At most
+    one alert per ``cooldown_seconds``; back in stock wins over a price drop."""
+    in_stock = (product.get("inventory") or 0) >= restock_threshold
+    was_in_stock = product.get("wishlist_alerted_in_stock")
+    if was_in_stock is None:
+        was_in_stock = (previous.get("inventory") or 0) >= restock_threshold
+    reference = product.get("wishlist_alerted_price")
+    if reference is None:
+        reference = previous.get("price")
+    price = product.get("price")
+    state = {"wishlist_alerted_price": reference, "wishlist_alerted_in_stock": in_stock,
+             "wishlist_alerted_at": product.get("wishlist_alerted_at")}
+
+    alerted_at = state["wishlist_alerted_at"]
+    if alerted_at is not None and alerted_at.tzinfo is None:
+        alerted_at = alerted_at.replace(tzinfo=timezone.utc)  # pymongo returns naive UTC datetimes
+    if alerted_at is not None and (now - alerted_at).total_seconds() < cooldown_seconds:
+        # Only selling out is recorded now; a restock or drop held back by the cooldown
+        # must still differ from the stored state once it is over
+        state["wishlist_alerted_in_stock"] = was_in_stock and in_stock
+        return None, state
+
+    name = product.get("name", "A product on your wishlist")
+    data = {"product_id": product["id"], "price": price, "inventory": product.get("inventory")}
+    if in_stock and not was_in_stock:
+        state.update(wishlist_alerted_price=price, wishlist_alerted_at=now)
+        return {
+            "type": NotificationType.BACK_IN_STOCK.value,
+            "title": "Back in stock",
+            "message": f"{name} from your wishlist is back in stock.",
+            "data": data,
+        }, state
+    if price is None or product.get("price_negotiable"):
+        return None, state
+    if reference and price <= reference * (1 - price_drop_percent / 100):
+        state.update(wishlist_alerted_price=price, wishlist_alerted_at=now)
+        return {
+            "type": NotificationType.PRICE_DROP.value,
+            "title": "Price drop",
+            "message": f"{name} from your wishlist dropped from {reference:.2f} to {price:.2f}.",
+            "data": {**data, "old_price": reference},
+        }, state
+    if reference is None or price > reference:
+        # Re-arm from a higher price once the cooldown is over
+        state["wishlist_alerted_price"] = price
+    return None, state
+
+
+def claim_wishlist_alert(products_collection, product_id: str, previous: Dict[str, Any],
+                         price_drop_percent: float, restock_threshold: int, cooldown_seconds: float,
+                         attempts: int = 3) -> Optional[Dict[str, Any]]:
+    """Alert due for the product's current state, recorded with a conditional update on
+    the stored alert state so that of concurrent product updates only one fans out"""
+    projection = {"_id": 0, "id": 1, "name": 1, "price": 1, "price_negotiable": 1, "inventory": 1,
+                  **{field: 1 for field in WISHLIST_ALERT_FIELDS}}
+    for _ in range(attempts):
+        product = products_collection.find_one({"id": product_id, "is_active": True}, projection)
+        if not product:
+            return None
+        alert, state = wishlist_alert(product, previous, price_drop_percent, restock_threshold,
+                                      cooldown_seconds, datetime.now(timezone.utc))
+        if all(product.get(field) == value for field, value in state.items()):
+            return None
+        # A missing field matches None, so the first claim on a product is conditional too
+        result = products_collection.update_one(
+            {"id": product_id, **{field: product.get(field) for field in WISHLIST_ALERT_FIELDS}},
+            {"$set": state}
+        )
+        if result.matched_count:
+            return alert
+        # Another update recorded its alert state first; judge again against it
+    return None
+
+
+def fan_out_wishlist_alert(wishlist_collection, product_id: str, notify: Callable[[List[str]], Any],
+                           batch_size: int = 1000) -> int:
+    """Call ``notify`` with batches of the ids of users who wishlisted the product,
+    read through the items.product_id index; returns the number of users"""
+    users = 0
+    batch: List[str] = []
+    for wishlist in wishlist_collection.find(
+        {"items.product_id": product_id}, {"_id": 0, "user_id": 1}
+    ).batch_size(batch_size):
+        batch.append(wishlist["user_id"])
+        if len(batch) >= batch_size:
+            notify(batch)
+            users += len(batch)
+            batch = []
+    if batch:
+        notify(batch)
+        users += len(batch)
+    return users
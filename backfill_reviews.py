@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Backfill denormalized review data:
+  authors    copy reviewer names and avatars onto reviews written before they
+             were stored (only reviews still missing them unless --refresh-all)
+  summaries  recount every product's review summary (star distribution,
+             average, latest reviews) from its reviews
+  sellers    recount every seller's rating from the summaries of their active
+             products (run after summaries)
+All are safe to re-run; by default all run.
+
+Usage: python backfill_reviews.py [authors] [summaries] [sellers] [--batch-size 500] [--refresh-all]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from pymongo import MongoClient
+from reviews import backfill_review_summaries, backfill_reviewer_fields, backfill_seller_ratings
+
+# Database connection
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+client = MongoClient(MONGO_URL)
+db = client["ecommerce"]
+
+STEPS = ["authors", "summaries", "sellers"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("steps", nargs="*", help=f"any of: {', '.join(STEPS)} (default: all)")
+    parser.add_argument("--batch-size", type=int, default=500, help="reviewers, products or sellers per bulk write")
+    parser.add_argument("--refresh-all", action="store_true",
+                        help="re-copy names and avatars onto every review, not only those missing them")
+    args = parser.parse_args()
+
+    unknown = set(args.steps) - set(STEPS)
+    if unknown:
+        parser.error(f"unknown step(s): {', '.join(sorted(unknown))}")
+    steps = args.steps or STEPS
+
+    if "authors" in steps:
+        started_at = time.perf_counter()
+        stats = backfill_reviewer_fields(db["reviews"], db["users"], batch_size=args.batch_size,
+                                         refresh_all=args.refresh_all)
+        print(f"✅ Reviewer names set on {stats['reviews_updated']} reviews by {stats['reviewers']} reviewers "
+              f"in {time.perf_counter() - started_at:.1f}s")
+
+    if "summaries" in steps:
+        started_at = time.perf_counter()
+        stats = backfill_review_summaries(db["reviews"], db["review_summaries"], batch_size=args.batch_size)
+        print(f"✅ Review summaries rebuilt for {stats['products']} products ({stats['reviews']} reviews) "
+              f"in {time.perf_counter() - started_at:.1f}s")
+
+    if "sellers" in steps:
+        started_at = time.perf_counter()
+        stats = backfill_seller_ratings(db["products"], db["review_summaries"], db["seller_profiles"],
+                                        batch_size=args.batch_size)
+        print(f"✅ Ratings recounted for {stats['sellers']} sellers ({stats['products']} products) "
+              f"in {time.perf_counter() - started_at:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Rebuild the co-purchase recommendation model (product_neighbors) and the
+frequently-bought-together tables (bundle_pairs, bundle_stats) from all orders.
+Meant to run periodically, e.g. nightly from cron.
+
+Usage: python build_recommendations.py [--top-n 20] [--min-count 1]
+"""
+import argparse
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from pymongo import MongoClient
+from recommendations import build_bundle_model, build_copurchase_model
+
+# Database connection
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+client = MongoClient(MONGO_URL)
+db = client["ecommerce"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-n", type=int, default=int(os.environ.get("RECOMMENDATION_TOP_N", "20")),
+                        help="neighbours stored per product")
+    parser.add_argument("--min-count", type=int, default=1,
+                        help="ignore pairs bought together fewer times than this")
+    args = parser.parse_args()
+
+    stats = build_copurchase_model(db["orders"], db["product_neighbors"], top_n=args.top_n, min_count=args.min_count)
+    print(f"✅ Built neighbours for {stats['products_with_neighbors']} of {stats['products']} products "
+          f"({stats['pairs']} co-purchased pairs) in {stats['seconds']}s")
+
+    bundles = build_bundle_model(db["orders"], db["bundle_stats"], db["bundle_pairs"])
+    print(f"✅ Counted {bundles['pairs']} bundle pairs over {bundles['baskets']} orders in {bundles['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Generate AI descriptions for catalog products in bulk (e.g. after running a
+catalog import script), several products per prompt with bounded concurrency.
+Progress is checkpointed, so re-running with the same --checkpoint resumes.
+
+Usage:
+  python enrich_descriptions.py                                   # Emergent LLM key, gpt-4o
+  python enrich_descriptions.py --provider openai --base-url http://localhost:8900/v1   # fake_llm_server.py
+  python enrich_descriptions.py --batch-size 8 --concurrency 16 --rate 20 --limit 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from pymongo import MongoClient
+from enrichment import BulkEnricher
+
+# Database connection
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+
+def emergent_completion(model: str):
+    from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+    async def complete(prompt: str, system: str) -> str:
+        chat = LlmChat(
+            api_key=os.environ.get("EMERGENT_LLM_KEY"),
+            session_id=f"bulk_desc_{uuid.uuid4()}",
+            system_message=system
+        ).with_model("openai", model)
+        return await chat.send_message(UserMessage(text=prompt))
+
+    return complete
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="ecommerce")
+    parser.add_argument("--provider", choices=["emergent", "openai"], default="emergent",
+                        help="emergent: EMERGENT_LLM_KEY via emergentintegrations; openai: any OpenAI-compatible --base-url")
+    parser.add_argument("--base-url", default=None, help="OpenAI-compatible API root (default OPENAI_BASE_URL or api.openai.com)")
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--batch-size", type=int, default=5, help="products per prompt")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM calls in flight")
+    parser.add_argument("--rate", type=float, default=10.0, help="LLM calls started per second (0 = unlimited)")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--write-batch-size", type=int, default=100, help="products per bulk_write")
+    parser.add_argument("--checkpoint", default="enrich_descriptions.checkpoint.jsonl")
+    parser.add_argument("--limit", type=int, default=0, help="only the first N products needing a description")
+    parser.add_argument("--all", action="store_true", help="regenerate existing AI descriptions too")
+    parser.add_argument("--populate-cache", action="store_true",
+                        help="also store results in ai_description_cache for reuse by identical products")
+    args = parser.parse_args()
+
+    db = MongoClient(MONGO_URL)[args.database]
+    client = None
+    if args.provider == "openai":
+        from llm_client import OpenAICompatibleClient
+        client = OpenAICompatibleClient(args.base_url, model=args.model, max_connections=args.concurrency)
+        complete = client.complete
+    else:
+        complete = emergent_completion(args.model)
+
+    enricher = BulkEnricher(
+        db["products"],
+        complete,
+        checkpoint_path=args.checkpoint,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        max_attempts=args.max_attempts,
+        write_batch_size=args.write_batch_size,
+        cache_collection=db["ai_description_cache"] if args.populate_cache else None,
+        cache_model=f"openai/{args.model}"
+    )
+    query = {"is_active": True} if args.all else None
+    try:
+        report = await enricher.run(query, limit=args.limit)
+    finally:
+        if client:
+            await client.aclose()
+
+    print(json.dumps(report, indent=2))
+    if report["failed"]:
+        print(f"⚠️ {report['failed']} products failed; delete their lines from {args.checkpoint} to retry them")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible chat completion API, for load-testing
+the AI paths (e.g. enrich_descriptions.py) without cost or provider limits.
+
+Latency is base + per-product cost + jitter, so the effect of batching several
+products per prompt shows up in measurements. Errors, rate limiting and
+malformed answers can be injected. Requests with ``"stream": true`` are answered
+as server-sent events: the base latency until the first word, then one word
+every --token-ms.
+
+Usage: python fake_llm_server.py [--port 8900] [--latency-ms 800] [--per-item-ms 150]
+                                 [--jitter-ms 200] [--error-rate 0.02] [--malformed-rate 0.01]
+                                 [--max-concurrency 64] [--token-ms 20]
+Then point clients at http://localhost:8900/v1 (GET /stats shows server-side counters).
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="Fake LLM")
+settings = argparse.Namespace(latency_ms=800, per_item_ms=150, jitter_ms=200, error_rate=0.0,
+                              malformed_rate=0.0, max_concurrency=0, token_ms=20)
+stats = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0, "malformed": 0, "in_flight": 0, "max_in_flight": 0}
+
+
+def prompt_products(prompt: str):
+    """Products listed as a JSON array after "Products:" (the batch prompt format), if any"""
+    match = re.search(r"Products:\s*(\[.*\])", prompt, re.DOTALL)
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def fake_description(product: dict) -> str:
+    name = product.get("name") or "This product"
+    brand = product.get("brand") or "a trusted brand"
+    category = product.get("category") or "everyday"
+    return (f"{name} by {brand} brings dependable quality to your {category.lower()} needs. "
+            f"Thoughtfully designed and built to last, it is a smart choice for anyone who values performance.")
+
+
+def completion(content: str, model: str) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": len(content) // 4, "total_tokens": len(content) // 4},
+    }
+
+
+async def stream_completion(content: str, model: str):
+    """``chat.completion.chunk`` events, one word each, then [DONE]"""
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        await asyncio.sleep((settings.latency_ms + random.uniform(0, settings.jitter_ms)) / 1000)
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        for position, word in enumerate(re.findall(r"\S+\s*", content)):
+            if position:
+                await asyncio.sleep(settings.token_ms / 1000)
+            chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                     "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    if settings.max_concurrency and stats["in_flight"] >= settings.max_concurrency:
+        stats["rate_limited"] += 1
+        return JSONResponse({"error": {"message": "Rate limit exceeded", "type": "rate_limit"}}, status_code=429)
+
+    prompt = "\n".join(message.get("content", "") for message in body.get("messages", []) if message.get("role") == "user")
+    products = prompt_products(prompt)
+    if body.get("stream"):
+        stats["streams"] += 1
+        if random.random() < settings.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500)
+        return StreamingResponse(stream_completion(fake_description({"name": prompt[:60]}), body.get("model", "fake")),
+                                 media_type="text/event-stream")
+    items = len(products) if products else 1
+
+    stats["in_flight"] += 1
+    stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+    try:
+        delay = settings.latency_ms + settings.per_item_ms * items + random.uniform(0, settings.jitter_ms)
+        await asyncio.sleep(delay / 1000)
+    finally:
+        stats["in_flight"] -= 1
+
+    if random.random() < settings.error_rate:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500)
+    if random.random() < settings.malformed_rate:
+        stats["malformed"] += 1
+        return completion("Sorry, I can't help with that right now.", body.get("model", "fake"))
+
+    if products is not None:
+        content = json.dumps({product.get("id"): fake_description(product) for product in products})
+    else:
+        content = fake_description({"name": prompt[:60]})
+    return completion(content, body.get("model", "fake"))
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=800, help="base latency of every call")
+    parser.add_argument("--per-item-ms", type=float, default=150, help="extra latency per product in a batch prompt")
+    parser.add_argument("--jitter-ms", type=float, default=200, help="uniform random extra latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of calls answered with non-JSON text")
+    parser.add_argument("--token-ms", type=float, default=20, help="delay between streamed words")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="answer HTTP 429 above this many calls in flight (0 = unlimited)")
+    args = parser.parse_args()
+    for name in vars(settings):
+        setattr(settings, name, getattr(args, name))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1516,6 +1516,7 @@ const SearchPage = () => {
                 <SelectItem value="price">Price: Low to High</SelectItem>
                 <SelectItem value="name">Name: A to Z</SelectItem>
                 <SelectItem value="rating">Highest Rated</SelectItem>
+                <SelectItem value="popularity">Most Popular</SelectItem>
               </SelectContent>
             </Select>
           </div>
@@ -1656,8 +1657,8 @@ const SearchPage = () => {
 
 // Cart page component wrapper
 const CartPageWrapper = () => {
-  const { cart, updateCartQuantity, removeFromCart } = useAppContext();
-  return <CartPage cart={cart} updateCartQuantity={updateCartQuantity} removeFromCart={removeFromCart} />;
+  const { cart, addToCart, updateCartQuantity, removeFromCart } = useAppContext();
+  return <CartPage cart={cart} addToCart={addToCart} updateCartQuantity={updateCartQuantity} removeFromCart={removeFromCart} />;
 };
 
 // Admin panel wrapper
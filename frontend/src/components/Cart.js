@@ -24,9 +24,10 @@ api.interceptors.request.use((config) => {
   return config;
 });
 
-const CartPage = ({ cart, updateCartQuantity, removeFromCart }) => {
+const CartPage = ({ cart, addToCart, updateCartQuantity, removeFromCart }) => {
   const [loading, setLoading] = useState(false);
   const [products, setProducts] = useState({});
+  const [suggestions, setSuggestions] = useState([]);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -56,6 +57,27 @@ const CartPage = ({ cart, updateCartQuantity, removeFromCart }) => {
     fetchProductDetails();
   }, [cart]);
 
+  // Frequently bought together, refetched only when the set of cart products changes
+  const cartProductIds = (cart?.items || []).map(item => item.product_id).sort().join(',');
+  useEffect(() => {
+    const fetchSuggestions = async () => {
+      if (!cart?.id || !cartProductIds) {
+        setSuggestions([]);
+        return;
+      }
+      
+      try {
+        const response = await api.get(`/api/cart/${cart.id}/suggestions`);
+        setSuggestions(response.data.suggestions || []);
+      } catch (error) {
+        console.error('Error fetching cart suggestions:', error);
+        setSuggestions([]);
+      }
+    };
+
+    fetchSuggestions();
+  }, [cart?.id, cartProductIds]);
+
   const handleCheckout = async () => {
     if (!cart?.id) return;
     
@@ -210,6 +232,60 @@ const CartPage = ({ cart, updateCartQuantity, removeFromCart }) => {
                 })}
               </CardContent>
             </Card>
+
+            {/* Frequently Bought Together */}
+            {suggestions.length > 0 && (
+              <Card className="mt-8">
+                <CardHeader>
+                  <CardTitle>Frequently Bought Together</CardTitle>
+                </CardHeader>
+                <CardContent>
+                  <div className="grid grid-cols-2 md:grid-cols-4 gap-4">
+                    {suggestions.map((product) => (
+                      <div key={product.id} className="border rounded-lg p-3 flex flex-col">
+                        <div
+                          className="w-full h-24 bg-gray-100 rounded overflow-hidden cursor-pointer mb-2"
+                          onClick={() => navigate(`/product/${product.id}`)}
+                        >
+                          {product.images?.[0] ? (
+                            <img
+                              src={product.images[0]}
+                              alt={product.name}
+                              className="w-full h-full object-cover"
+                            />
+                          ) : (
+                            <div className="w-full h-full flex items-center justify-center">
+                              <ShoppingCart className="h-6 w-6 text-gray-400" />
+                            </div>
+                          )}
+                        </div>
+                        <h4
+                          className="text-sm font-semibold line-clamp-2 cursor-pointer hover:text-blue-600"
+                          onClick={() => navigate(`/product/${product.id}`)}
+                        >
+                          {product.name}
+                        </h4>
+                        <p className="text-sm font-medium text-blue-600 mb-2">
+                          ${product.price.toFixed(2)}
+                        </p>
+                        {addToCart && (
+                          <Button
+                            variant="outline"
+                            size="sm"
+                            className="mt-auto"
+                            onClick={() => addToCart(product.id)}
+                            disabled={loading}
+                          >
+                            <Plus className="h-4 w-4 mr-1" />
+                            Add
+                          </Button>
+                        )}
+                      </div>
+                    ))}
+                  </div>
+                </CardContent>
+              </Card>
+            )}
           </div>
 
           {/* Order Summary */}
@@ -364,6 +364,7 @@ const CatalogPage = ({ addToCart, wishlist = [], onToggleWishlist }) => {
                     <option value="price_desc">Price High-Low</option>
                     <option value="rating">Best Rating</option>
                     <option value="newest">Newest</option>
+                    <option value="popularity">Most Popular</option>
                   </select>
                 </div>
 
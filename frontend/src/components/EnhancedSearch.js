@@ -66,9 +66,9 @@ const EnhancedSearch = ({ className = "" }) => {
   const fetchSuggestions = async () => {
     try {
       setLoading(true);
-      const response = await api.get(`/api/products/search?q=${encodeURIComponent(searchQuery)}&limit=6`);
-      const products = response.data?.products || response.data || [];
-      setSuggestions(Array.isArray(products) ? products : []);
+      const response = await api.get(`/api/search/suggest?q=${encodeURIComponent(searchQuery)}&limit=8`);
+      const results = response.data?.suggestions || [];
+      setSuggestions(Array.isArray(results) ? results : []);
     } catch (error) {
       console.error('Error fetching suggestions:', error);
       setSuggestions([]);
@@ -154,8 +154,27 @@ const EnhancedSearch = ({ className = "" }) => {
               </div>
             )}
 
+            {/* Brand and Category Suggestions */}
+            {suggestions.some((suggestion) => suggestion.type !== 'product') && (
+              <div className="border-b border-gray-200 py-2">
+                {suggestions.filter((suggestion) => suggestion.type !== 'product').map((suggestion) => (
+                  <div
+                    key={`${suggestion.type}-${suggestion.text}`}
+                    className="px-3 py-2 hover:bg-gray-50 cursor-pointer flex items-center transition-colors"
+                    onClick={() => handleSearch(suggestion.text)}
+                  >
+                    <Search className="h-3 w-3 text-gray-400 mr-3" />
+                    <span className="text-sm text-gray-700">{suggestion.text}</span>
+                    <Badge variant="outline" className="text-xs ml-2">
+                      {suggestion.type}
+                    </Badge>
+                  </div>
+                ))}
+              </div>
+            )}
+
             {/* Product Suggestions */}
-            {suggestions.length > 0 && (
+            {suggestions.some((suggestion) => suggestion.type === 'product') && (
               <div className="border-b border-gray-200">
                 <div className="p-3 bg-gray-50 border-b border-gray-100">
                   <h4 className="text-sm font-medium text-gray-700 flex items-center">
@@ -164,7 +183,7 @@ const EnhancedSearch = ({ className = "" }) => {
                   </h4>
                 </div>
                 <div className="max-h-48 overflow-y-auto">
-                  {suggestions.map((product) => (
+                  {suggestions.filter((suggestion) => suggestion.type === 'product').map((product) => (
                     <div
                       key={product.id}
                       className="flex items-center p-3 hover:bg-gray-50 cursor-pointer transition-colors"
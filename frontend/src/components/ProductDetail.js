@@ -7,7 +7,7 @@ import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Badge } from './ui/badge';
 import { Skeleton } from './ui/skeleton';
 import { Separator } from './ui/separator';
-import { ReviewForm, ReviewList } from './Reviews';
+import { ReviewForm, ReviewList, ReviewSummary } from './Reviews';
 
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL;
 const api = axios.create({
@@ -31,6 +31,7 @@ const ProductDetailPage = ({ addToCart, wishlist, onToggleWishlist }) => {
   const navigate = useNavigate();
   const [product, setProduct] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [reviewSummary, setReviewSummary] = useState(null);
   const [recommendations, setRecommendations] = useState([]);
   const [loading, setLoading] = useState(true);
   const [quantity, setQuantity] = useState(1);
@@ -43,14 +44,16 @@ const ProductDetailPage = ({ addToCart, wishlist, onToggleWishlist }) => {
     const fetchProduct = async () => {
       try {
         setLoading(true);
-        const [productRes, reviewsRes, recommendationsRes] = await Promise.all([
+        const [productRes, reviewsRes, summaryRes, recommendationsRes] = await Promise.all([
           api.get(`/api/products/${id}`),
           api.get(`/api/products/${id}/reviews`),
+          api.get(`/api/products/${id}/reviews/summary`),
           api.get(`/api/products/${id}/recommendations`)
         ]);
         
         setProduct(productRes.data);
         setReviews(reviewsRes.data);
+        setReviewSummary(summaryRes.data);
         setRecommendations(recommendationsRes.data.recommendations);
       } catch (error) {
         console.error('Error fetching product:', error);
@@ -66,8 +69,12 @@ const ProductDetailPage = ({ addToCart, wishlist, onToggleWishlist }) => {
 
   const handleReviewSubmitted = async () => {
     try {
-      const response = await api.get(`/api/products/${id}/reviews`);
+      const [response, summaryResponse] = await Promise.all([
+        api.get(`/api/products/${id}/reviews`),
+        api.get(`/api/products/${id}/reviews/summary`)
+      ]);
       setReviews(response.data);
+      setReviewSummary(summaryResponse.data);
       
       // Refetch product to update rating
       const productResponse = await api.get(`/api/products/${id}`);
@@ -313,6 +320,7 @@ const ProductDetailPage = ({ addToCart, wishlist, onToggleWishlist }) => {
             <div>
               <h2 className="text-2xl font-bold mb-6">Customer Reviews</h2>
               <div className="space-y-6">
+                <ReviewSummary summary={reviewSummary} />
                 <ReviewForm productId={product.id} onReviewSubmitted={handleReviewSubmitted} />
                 <ReviewList reviews={reviews} />
               </div>
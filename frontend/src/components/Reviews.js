@@ -6,7 +6,8 @@ import { Card, CardContent, CardHeader, CardTitle } from './ui/card';
 import { Label } from './ui/label';
 import { Textarea } from './ui/textarea';
 import { Alert, AlertDescription } from './ui/alert';
-import { Avatar, AvatarFallback } from './ui/avatar';
+import { Avatar, AvatarFallback, AvatarImage } from './ui/avatar';
+import { Progress } from './ui/progress';
 
 const API_BASE_URL = process.env.REACT_APP_BACKEND_URL;
 const api = axios.create({
@@ -126,6 +127,47 @@ export const ReviewForm = ({ productId, onReviewSubmitted }) => {
   );
 };
 
+export const ReviewSummary = ({ summary }) => {
+  if (!summary || summary.review_count === 0) {
+    return null;
+  }
+
+  return (
+    <Card>
+      <CardContent className="p-4">
+        <div className="flex items-center space-x-6">
+          <div className="text-center">
+            <p className="text-4xl font-bold">{summary.average_rating.toFixed(1)}</p>
+            <div className="flex items-center justify-center mt-1">
+              {[...Array(5)].map((_, i) => (
+                <Star
+                  key={i}
+                  className={`h-4 w-4 ${
+                    i < Math.round(summary.average_rating)
+                      ? 'text-yellow-400 fill-current'
+                      : 'text-gray-300'
+                  }`}
+                />
+              ))}
+            </div>
+            <p className="text-xs text-gray-500 mt-1">{summary.review_count} reviews</p>
+          </div>
+          <div className="flex-1 space-y-1">
+            {['5', '4', '3', '2', '1'].map((star) => (
+              <div key={star} className="flex items-center space-x-2 text-sm">
+                <span className="w-3 text-gray-600">{star}</span>
+                <Star className="h-3 w-3 text-yellow-400 fill-current" />
+                <Progress value={summary.distribution_percent[star]} className="h-2 flex-1" />
+                <span className="w-8 text-right text-xs text-gray-500">{summary.distribution[star]}</span>
+              </div>
+            ))}
+          </div>
+        </div>
+      </CardContent>
+    </Card>
+  );
+};
+
 export const ReviewList = ({ reviews }) => {
   if (!reviews || reviews.length === 0) {
     return (
@@ -144,6 +186,7 @@ export const ReviewList = ({ reviews }) => {
             <div className="flex items-start justify-between mb-3">
               <div className="flex items-center space-x-3">
                 <Avatar className="h-8 w-8">
+                  {review.user_avatar && <AvatarImage src={review.user_avatar} alt={review.user_name} />}
                   <AvatarFallback>{review.user_name?.charAt(0)?.toUpperCase()}</AvatarFallback>
                 </Avatar>
                 <div>
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Bulk-import reviews from an NDJSON file (one review per line; see
+backend/review_import.py for the fields), e.g. when migrating from another
+platform. Review summaries of the affected products are updated after each
+batch. Their sellers' ratings move with them. Re-running with the same file
+skips reviews already imported; if an import died partway, run
+backfill_reviews.py summaries sellers afterwards, since the reviews of its
+last batch may be in but not yet counted.
+
+Usage:
+  python import_reviews.py reviews.ndjson [--pending] [--source oldshop] [--batch-size 1000]
+  zcat reviews.ndjson.gz | python import_reviews.py -
+  python import_reviews.py --synthetic 1000000      # throughput test against existing products
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from pymongo import MongoClient
+from review_import import ReviewImporter
+
+# Database connection
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+
+COMMENTS = [
+    "Great quality, exactly as described.",
+    "Works well but shipping took a while.",
+    "Not what I expected, returned it.",
+    "Excellent value for the price!",
+    "Decent product, would buy again.",
+]
+
+
+def synthetic_lines(db, count: int, seed: int = 7):
+    """NDJSON lines spread over up to 10,000 existing products, one new reviewer per line"""
+    product_ids = [product["id"] for product in db["products"].find({"is_active": True}, {"_id": 0, "id": 1}).limit(10000)]
+    if not product_ids:
+        raise SystemExit("No active products to review; import a catalog first")
+    rng = random.Random(seed)
+    run_id = rng.getrandbits(32)
+    for i in range(count):
+        yield json.dumps({
+            "product_id": product_ids[i % len(product_ids)],
+            "source_user_id": f"synthetic-{run_id}-{i}",
+            "user_name": f"Shopper {i}",
+            "rating": rng.choices([1, 2, 3, 4, 5], weights=[5, 5, 10, 30, 50])[0],
+            "comment": rng.choice(COMMENTS),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="NDJSON file, or - for stdin")
+    parser.add_argument("--database", default="ecommerce")
+    parser.add_argument("--pending", action="store_true",
+                        help="send lines without is_approved to the moderation queue instead of publishing them")
+    parser.add_argument("--source", default="import", help="prefix for reviewers without an account here")
+    parser.add_argument("--batch-size", type=int, default=1000, help="lines validated and inserted together")
+    parser.add_argument("--synthetic", type=int, default=0, help="import N generated reviews instead of a file")
+    args = parser.parse_args()
+    if not args.path and not args.synthetic:
+        parser.error("a file (or --synthetic N) is required")
+
+    db = MongoClient(MONGO_URL)[args.database]
+
+    next_progress = 100000
+
+    def progress(report):
+        nonlocal next_progress
+        if report["read"] >= next_progress:
+            next_progress += 100000
+            print(f"  {report['read']:>10} read  {report['inserted']:>10} inserted  "
+                  f"{report['reviews_per_second']:>9.0f}/s", flush=True)
+
+    importer = ReviewImporter(
+        db["reviews"], db["products"], db["users"], db["review_summaries"], db["seller_profiles"],
+        batch_size=args.batch_size,
+        approve=not args.pending,
+        source="synthetic" if args.synthetic else args.source,
+        progress=progress
+    )
+
+    if args.synthetic:
+        report = importer.run(synthetic_lines(db, args.synthetic))
+    elif args.path == "-":
+        report = importer.run(sys.stdin)
+    else:
+        with open(args.path, encoding="utf-8") as lines:
+            report = importer.run(lines)
+
+    print(json.dumps(report, indent=2))
+    print(f"✅ {report['inserted']} reviews imported in {report['seconds']}s "
+          f"({report['reviews_per_second']}/s, {report['write_seconds']}s in insert_many); "
+          f"{report['products_updated']} product summaries updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the search and recommendation paths, on synthetic data.
+In-process benchmarks need no services; the ones marked "(MongoDB)" use the
+local MONGO_URL and a throwaway ecommerce_benchmarks database.
+
+Usage: python performance_benchmarks.py [suggest] [fuzzy] [counts] [similar] [gateway] [stream] [wishlist] [wishlist_read] [wishlist_alerts] [--size 1000000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from search_index import PrefixIndex, TrigramIndex
+
+BRANDS = ["Samsung", "Apple", "Xiaomi", "Sony", "LG", "Huawei", "Lenovo", "Asus", "Philips", "Bosch"]
+CATEGORIES = ["Smartphones", "Laptops", "Tablets", "Headphones", "Televisions", "Cameras", "Appliances"]
+
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+
+
+def synthetic_products(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    vocabulary = [random_word(rng) for _ in range(20000)]
+    for i in range(size):
+        brand = rng.choice(BRANDS)
+        yield {
+            "id": str(i),
+            "name": f"{brand} {' '.join(rng.choices(vocabulary, k=rng.randint(1, 3)))} {rng.randint(1, 999)}",
+            "brand": brand,
+            "category": rng.choice(CATEGORIES),
+            "tags": rng.choices(vocabulary[:200], k=2),
+            "description": " ".join(rng.choices(vocabulary, k=12)),
+            "reviews_count": rng.randint(0, 500),
+        }
+
+
+def report(label: str, samples_ms):
+    samples_ms = sorted(samples_ms)
+    p99 = samples_ms[int(len(samples_ms) * 0.99) - 1]
+    print(f"  {label:<28} median {statistics.median(samples_ms):.4f} ms   p99 {p99:.4f} ms")
+
+
+def bench_suggest(size: int):
+    print(f"🔎 Prefix suggestions over {size:,} products")
+    products = list(synthetic_products(size))
+    terms = []
+    for product in products:
+        weight = 1.0 + product["reviews_count"]
+        terms.append({"text": product["name"], "kind": "product", "ref": product["id"], "weight": weight})
+        terms.append({"text": product["brand"], "kind": "brand", "weight": weight})
+        terms.append({"text": product["category"], "kind": "category", "weight": weight})
+
+    index = PrefixIndex()
+    started = time.perf_counter()
+    index.bulk_load(terms)
+    print(f"  bulk load                    {time.perf_counter() - started:.2f} s ({len(index):,} entries)")
+
+    rng = random.Random(7)
+    for length in (1, 2, 3, 4, 6):
+        prefixes = [rng.choice(products)["name"].split(" ")[-2][:length] for _ in range(500)]
+        for prefix in prefixes:
+            index.suggest(prefix)  # warm the hot-prefix cache like steady-state traffic
+        samples = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            index.suggest(prefix, 8)
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f"suggest, {length}-char prefix", samples)
+
+    samples = []
+    for i in range(500):
+        started = time.perf_counter()
+        index.add(f"Benchmark product {i}", "product", ref=f"new-{i}", weight=1.0)
+        samples.append((time.perf_counter() - started) * 1000)
+    report("incremental add", samples)
+
+    # A product update re-indexes its brand: remove at the old weight, add at the new one
+    samples = []
+    for product in rng.sample(products, 500):
+        weight = 1.0 + product["reviews_count"]
+        started = time.perf_counter()
+        index.remove(product["brand"], "brand", weight=weight)
+        index.add(product["brand"], "brand", weight=weight + 1)
+        index.suggest(product["brand"][:1])
+        samples.append((time.perf_counter() - started) * 1000)
+    report("re-weight + 1-char suggest", samples)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """Apply one random typo: deletion, transposition or substitution"""
+    position = rng.randrange(len(word) - 1)
+    typo = rng.choice(("delete", "swap", "replace"))
+    if typo == "delete":
+        return word[:position] + word[position + 1:]
+    if typo == "swap":
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:]
+
+
+def bench_fuzzy(size: int):
+    print(f"🔤 Trigram fuzzy matching over {size:,} products")
+    products = list(synthetic_products(size))
+    index = TrigramIndex()
+    started = time.perf_counter()
+    for product in products:
+        index.add(product["id"], [product["name"], product["brand"]])
+    print(f"  build                        {time.perf_counter() - started:.2f} s "
+          f"({index.vocabulary_size:,} distinct words)")
+
+    rng = random.Random(11)
+    for budget_ms in (5.0, 15.0):
+        samples, found, timed_out = [], 0, 0
+        for _ in range(500):
+            product = rng.choice(products)
+            words = [word for word in product["name"].lower().split() if len(word) >= 4]
+            query = " ".join(misspell(word, rng) for word in words[:2])
+            started = time.perf_counter()
+            result = index.search(query, limit=20, budget_ms=budget_ms)
+            samples.append((time.perf_counter() - started) * 1000)
+            found += product["id"] in result["ids"]
+            timed_out += result["timed_out"]
+        report(f"search, {budget_ms:g} ms budget", samples)
+        print(f"  {'':<28} target in top 20: {found / 5:.1f}%   over budget: {timed_out / 5:.1f}%")
+
+
+def benchmark_database():
+    """Throwaway database on the local MongoDB, or None if it is unreachable"""
+    try:
+        from pymongo import MongoClient
+        client = MongoClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=2000)
+        client.admin.command("ping")
+        return client["ecommerce_benchmarks"]
+    except Exception as e:
+        print(f"  ⚠️ MongoDB not available, skipping: {e}")
+        return None
+
+
+def seed_products(db, size: int):
+    collection = db["products"]
+    if collection.estimated_document_count() != size:
+        collection.drop()
+        batch = []
+        for product in synthetic_products(size):
+            product["is_active"] = True
+            product["price"] = float(product["reviews_count"])
+            batch.append(product)
+            if len(batch) == 10000:
+                collection.insert_many(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch)
+        collection.create_index("id")
+        collection.create_index("name")
+    return collection
+
+
+def bench_counts(size: int):
+    """(MongoDB) search_products page latency under each count strategy"""
+    from pagination import CountMode, count_cache, paginate
+
+    print(f"🔢 Paginated search totals over {size:,} products (MongoDB)")
+    db = benchmark_database()
+    if db is None:
+        return
+    collection = seed_products(db, size)
+    query = {"is_active": True, "$or": [{"name": {"$regex": "sam", "$options": "i"}},
+                                         {"brand": {"$regex": "sam", "$options": "i"}}]}
+    for mode in CountMode:
+        count_cache.clear()
+        samples = []
+        for page in range(20):
+            started = time.perf_counter()
+            paginate(collection, query, [("name", 1)], page * 20, 20, mode)
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f"page fetch, {mode.value}", samples)
+
+
+def bench_similar(size: int):
+    from vector_index import VectorIndex
+
+    print(f"🧭 Vector similarity over {size:,} products")
+    products = list(synthetic_products(size))
+    index = VectorIndex(dimensions=int(os.environ.get("VECTOR_DIMENSIONS", "256")))
+    started = time.perf_counter()
+    index.bulk_load(products)
+    print(f"  bulk load                    {time.perf_counter() - started:.2f} s "
+          f"({index.memory_bytes / 2 ** 20:.0f} MiB matrix, {index.dimensions} dimensions)")
+
+    rng = random.Random(5)
+    samples, same_brand = [], 0
+    for _ in range(200):
+        product = rng.choice(products)
+        started = time.perf_counter()
+        neighbours = index.similar(product["id"], 6)
+        samples.append((time.perf_counter() - started) * 1000)
+        same_brand += sum(products[int(neighbour_id)]["brand"] == product["brand"] for neighbour_id, _ in neighbours)
+    report("top-6 query", samples)
+    print(f"  {'':<28} neighbours sharing the brand: {same_brand / (200 * 6):.0%}")
+
+    samples = []
+    for i in range(200):
+        started = time.perf_counter()
+        index.add({**rng.choice(products), "id": f"new-{i}"})
+        samples.append((time.perf_counter() - started) * 1000)
+    report("incremental add", samples)
+
+
+class FakeLLMBackend:
+    """In-process stand-in for fake_llm_server.py with adjustable latency and error rate"""
+
+    model_key = "fake"
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.latency = 0.05
+        self.error_rate = 0.0
+        self.token_delay = 0.01
+
+    async def complete(self, prompt: str, system=None) -> str:
+        await asyncio.sleep(self.latency * (0.5 + self.rng.random()))
+        if self.rng.random() < self.error_rate:
+            raise RuntimeError("injected error")
+        return "[]"
+
+    async def stream(self, prompt: str, system=None):
+        """``latency`` until the first token, then one word every ``token_delay``"""
+        await asyncio.sleep(self.latency * (0.5 + self.rng.random()))
+        for position in range(120):  # ~a 120-word product description
+            if position:
+                await asyncio.sleep(self.token_delay)
+            yield "word "
+
+    async def aclose(self):
+        pass
+
+
+def bench_gateway(size: int):
+    """Caller-observed LLM latency through the gateway while the provider degrades"""
+    from llm_gateway import CircuitBreaker, FeaturePolicy, LLMGateway
+
+    print("🛡️ LLM gateway (200 ms deadline, breaker after 5 failures, 0.5 s reset) against a fake LLM")
+    calls, concurrency = 400, 8
+
+    async def run():
+        backend = FakeLLMBackend(random.Random(11))
+        gateway = LLMGateway(backend, {"search": FeaturePolicy(timeout=0.2, max_concurrency=16)},
+                             CircuitBreaker(failure_threshold=5, reset_timeout=0.5))
+
+        async def phase(label: str, latency: float, error_rate: float):
+            backend.latency, backend.error_rate = latency, error_rate
+            samples, fallbacks = [], 0
+
+            async def one():
+                nonlocal fallbacks
+                started = time.perf_counter()
+                try:
+                    await gateway.complete("search", "query")
+                except Exception:  # LLMError from the gateway, or the injected provider error
+                    fallbacks += 1
+                samples.append((time.perf_counter() - started) * 1000)
+
+            for start in range(0, calls, concurrency):
+                await asyncio.gather(*(one() for _ in range(min(concurrency, calls - start))))
+            report(label, samples)
+            print(f"  {'':<28} fell back: {fallbacks}/{calls}   breaker: {gateway.breaker.state}")
+
+        await phase("healthy (50 ms)", 0.05, 0.0)
+        await phase("hung provider (10 s)", 10.0, 0.0)
+        await asyncio.sleep(0.6)
+        await phase("recovered", 0.05, 0.0)
+        await phase("flaky (30% errors)", 0.05, 0.3)
+        print(f"  {'':<28} breaker trips: {gateway.breaker.trips}")
+
+    asyncio.run(run())
+
+
+def bench_stream(size: int):
+    """Time to first byte of a description: whole completion vs streamed through the gateway"""
+    from llm_gateway import FeaturePolicy, LLMGateway
+
+    print("📝 Description generation, 20 sellers at once (300 ms to first token, 15 ms per word)")
+    sellers = 20
+
+    async def run():
+        backend = FakeLLMBackend(random.Random(5))
+        backend.latency, backend.token_delay = 0.3, 0.015
+        gateway = LLMGateway(backend, {"description": FeaturePolicy(timeout=30, max_concurrency=sellers)})
+
+        async def whole():
+            started = time.perf_counter()
+            text = "".join([chunk async for chunk in backend.stream("prompt")])  # what complete() waits for
+            return (time.perf_counter() - started) * 1000, len(text)
+
+        async def streamed():
+            started, first = time.perf_counter(), None
+            async for _ in gateway.stream("description", "prompt"):
+                if first is None:
+                    first = (time.perf_counter() - started) * 1000
+            return first, (time.perf_counter() - started) * 1000
+
+        results = await asyncio.gather(*(whole() for _ in range(sellers)))
+        report("full response (first byte)", [elapsed for elapsed, _ in results])
+        results = await asyncio.gather(*(streamed() for _ in range(sellers)))
+        report("streamed (first byte)", [first for first, _ in results])
+        report("streamed (complete)", [total for _, total in results])
+
+    asyncio.run(run())
+
+
+def legacy_add_wishlist_item(collection, user_id: str, product_id: str) -> bool:
+    """The read-modify-$set wishlist add that add_wishlist_item replaced, for comparison"""
+    from datetime import datetime, timezone
+
+    wishlist = collection.find_one({"user_id": user_id})
+    if not wishlist:
+        wishlist = {"user_id": user_id, "items": []}
+        collection.insert_one(wishlist)
+    items = wishlist.get("items", [])
+    if any(item["product_id"] == product_id for item in items):
+        return False
+    items.append({"product_id": product_id, "added_at": datetime.now(timezone.utc)})
+    collection.update_one({"user_id": user_id}, {"$set": {"items": items, "updated_at": datetime.now(timezone.utc)}})
+    return True
+
+
+def bench_wishlist(size: int):
+    """(MongoDB) Lost adds under concurrent tabs and bytes sent per add, read-modify-$set vs atomic $push"""
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timezone
+
+    import bson
+    from wishlist import add_wishlist_item
+
+    print("💝 Wishlist adds: 8 tabs x 50 concurrent adds, then adds to a 500-item wishlist (MongoDB)")
+    db = benchmark_database()
+    if db is None:
+        return
+    collection = db["wishlist"]
+    tabs, adds_per_tab, wishlist_size = 8, 50, 500
+
+    for label, add in (("read-modify-$set", legacy_add_wishlist_item), ("atomic $push", add_wishlist_item)):
+        # The legacy add can create duplicate wishlists without the unique index, so it runs without one
+        collection.drop()
+        if add is add_wishlist_item:
+            collection.create_index("user_id", unique=True)
+
+        def tab(number: int):
+            for i in range(adds_per_tab):
+                add(collection, "concurrent-user", f"tab{number}-product{i}")
+
+        with ThreadPoolExecutor(tabs) as pool:
+            list(pool.map(tab, range(tabs)))
+        kept = sum(len(wishlist.get("items", [])) for wishlist in collection.find({"user_id": "concurrent-user"}))
+        print(f"  {label:<28} kept {kept}/{tabs * adds_per_tab} adds   "
+              f"wishlist documents: {collection.count_documents({'user_id': 'concurrent-user'})}")
+
+        now = datetime.now(timezone.utc)
+        collection.replace_one({"user_id": "big-user"}, {"user_id": "big-user", "items": [
+            {"product_id": f"seed{i}", "added_at": now} for i in range(wishlist_size)
+        ]}, upsert=True)
+        samples = []
+        for i in range(200):
+            started = time.perf_counter()
+            add(collection, "big-user", f"extra{i}")
+            samples.append((time.perf_counter() - started) * 1000)
+        report(f"add to {wishlist_size}+ items, {label}", samples)
+
+    # What each add sends to the server on a 500-item wishlist
+    items = [{"product_id": f"seed{i}", "added_at": now} for i in range(wishlist_size + 1)]
+    legacy_bytes = len(bson.encode({"$set": {"items": items, "updated_at": now}}))
+    atomic_bytes = len(bson.encode({"$push": {"items": items[-1]}, "$set": {"updated_at": now},
+                                    "$setOnInsert": {"id": "00000000-0000-0000-0000-000000000000"}}))
+    print(f"  {'update payload per add':<28} read-modify-$set {legacy_bytes:,} B (plus reading the document back)   "
+          f"atomic $push {atomic_bytes:,} B")
+    collection.drop()
+
+
+def bench_wishlist_read(size: int):
+    """(MongoDB) GET /api/wishlist hydration: a lookup per item vs one $in for products and one for ratings"""
+    from wishlist import hydrate_wishlist
+
+    print("📋 Wishlist hydration for 10, 100 and 1,000 items (MongoDB)")
+    db = benchmark_database()
+    if db is None:
+        return
+    products = seed_products(db, max(size, 1000))
+    summaries = db["review_summaries"]
+    summaries.drop()
+    summaries.insert_many([{"product_id": str(i), "count": 10, "rating_sum": 10 + i % 41} for i in range(1000)])
+    summaries.create_index("product_id", unique=True)
+
+    def per_item(items):
+        """What get_user_wishlist did before: find_one and a summary read per item"""
+        hydrated = []
+        for item in items:
+            product = products.find_one({"id": item["product_id"], "is_active": True})
+            if product:
+                product.pop("_id", None)
+                summary = summaries.find_one({"product_id": product["id"]}, {"_id": 0, "count": 1, "rating_sum": 1})
+                count = summary["count"] if summary else 0
+                product["rating"] = round(summary["rating_sum"] / count, 1) if count else 0.0
+                product["reviews_count"] = count
+                hydrated.append(product)
+        return hydrated
+
+    rng = random.Random(9)
+    for length in (10, 100, 1000):
+        items = [{"product_id": str(i)} for i in rng.sample(range(1000), length)]
+        for label, hydrate in (("per item", per_item),
+                               ("one $in", lambda items: hydrate_wishlist(products, summaries, items))):
+            samples = []
+            for _ in range(max(5, 2000 // length)):
+                started = time.perf_counter()
+                hydrated = hydrate(items)
+                samples.append((time.perf_counter() - started) * 1000)
+            assert [product["id"] for product in hydrated] == [item["product_id"] for item in items]
+            report(f"{length:>5} items, {label}", samples)
+
+
+def bench_wishlist_alerts(size: int):
+    """(MongoDB) Finding and notifying everyone who wishlisted a product, 100k watchers"""
+    import uuid
+    from datetime import datetime, timezone
+
+    from wishlist import fan_out_wishlist_alert
+
+    watchers = 100000
+    print(f"🔔 Price-drop fan-out to {watchers:,} wishlists out of {watchers * 2:,} (MongoDB)")
+    db = benchmark_database()
+    if db is None:
+        return
+    wishlists, notifications = db["wishlist"], db["notifications"]
+    wishlists.drop()
+    notifications.drop()
+    rng = random.Random(3)
+    now = datetime.now(timezone.utc)
+    for start in range(0, watchers * 2, 10000):
+        wishlists.insert_many([
+            {"user_id": f"user{i}", "items": [{"product_id": str(rng.randint(1, 5000)), "added_at": now}
+                                              for _ in range(20)]
+             + ([{"product_id": "watched", "added_at": now}] if i % 2 else [])}
+            for i in range(start, start + 10000)
+        ])
+
+    started = time.perf_counter()
+    found = len(list(wishlists.find({"items.product_id": "watched"}, {"_id": 0, "user_id": 1}).hint([("$natural", 1)])))
+    print(f"  {'watchers, full scan':<28} {time.perf_counter() - started:.2f} s ({found:,} users)")
+    wishlists.create_index("items.product_id")
+    started = time.perf_counter()
+    found = len(list(wishlists.find({"items.product_id": "watched"}, {"_id": 0, "user_id": 1})))
+    print(f"  {'watchers, items.product_id':<28} {time.perf_counter() - started:.2f} s ({found:,} users)")
+
+    def notify(user_ids):
+        notifications.insert_many([{"id": str(uuid.uuid4()), "user_id": user_id, "type": "price_drop",
+                                    "channel": "in_app", "title": "Price drop", "message": "...",
+                                    "data": {"product_id": "watched"}, "is_read": False, "created_at": now}
+                                   for user_id in user_ids], ordered=False)
+
+    started = time.perf_counter()
+    users = fan_out_wishlist_alert(wishlists, "watched", notify, batch_size=1000)
+    print(f"  {'fan-out, 1,000 per batch':<28} {time.perf_counter() - started:.2f} s "
+          f"({users:,} notifications)")
+    wishlists.drop()
+    notifications.drop()
+
+
+BENCHMARKS = {
+    "suggest": bench_suggest,
+    "fuzzy": bench_fuzzy,
+    "counts": bench_counts,
+    "similar": bench_similar,
+    "gateway": bench_gateway,
+    "stream": bench_stream,
+    "wishlist": bench_wishlist,
+    "wishlist_read": bench_wishlist_read,
+    "wishlist_alerts": bench_wishlist_alerts,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", help=f"any of: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--size", type=int, default=100000, help="number of synthetic products")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name](args.size)
@@ -0,0 +1,155 @@
+"""
+Wishlist writes under concurrency. The collection below keeps the guarantees
+add_wishlist_item relies on from MongoDB: each single-document update is
+atomic, and an upsert that matched nothing inserts separately, so a concurrent
+insert for the same user can still fail it on the unique user_id index.
+"""
+
+import copy
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip("pymongo")
+pytest.importorskip("pydantic")
+bson = pytest.importorskip("bson")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from pymongo.errors import DuplicateKeyError  # noqa: E402
+
+from wishlist import add_wishlist_item, remove_wishlist_item  # noqa: E402
+
+
+class UpdateResult:
+    def __init__(self, matched_count: int, modified_count: int):
+        self.matched_count = matched_count
+        self.modified_count = modified_count
+
+
+class WishlistCollection:
+    """Just enough of a pymongo collection for the wishlist writes, with a unique user_id"""
+
+    def __init__(self):
+        self.docs = []
+        self.updates = []  # every update document sent, as add/remove would send it to the server
+        self._lock = threading.Lock()
+
+    def _matches(self, doc, query):
+        product_ids = [item["product_id"] for item in doc.get("items", [])]
+        for key, value in query.items():
+            if key == "user_id" and doc.get("user_id") != value:
+                return False
+            if key == "items.product_id":
+                if isinstance(value, dict):
+                    if value["$ne"] in product_ids:
+                        return False
+                elif value not in product_ids:
+                    return False
+        return True
+
+    def _apply(self, doc, update):
+        for key, value in update.get("$set", {}).items():
+            doc[key] = value
+        for key, value in update.get("$push", {}).items():
+            doc.setdefault(key, []).append(copy.deepcopy(value))
+        for key, value in update.get("$pull", {}).items():
+            doc[key] = [item for item in doc.get(key, []) if item["product_id"] != value["product_id"]]
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append(copy.deepcopy(update))
+        with self._lock:
+            for doc in self.docs:
+                if self._matches(doc, query):
+                    self._apply(doc, update)
+                    return UpdateResult(1, 1)
+        if not upsert:
+            return UpdateResult(0, 0)
+        time.sleep(0)  # let a concurrent upsert for the same user get in first
+        with self._lock:
+            if any(doc["user_id"] == query["user_id"] for doc in self.docs):
+                raise DuplicateKeyError("E11000 duplicate key error index: user_id_1")
+            doc = {"user_id": query["user_id"], "items": [], **update.get("$setOnInsert", {})}
+            self._apply(doc, update)
+            self.docs.append(doc)
+        return UpdateResult(0, 0)
+
+    def wishlists(self, user_id):
+        return [doc for doc in self.docs if doc["user_id"] == user_id]
+
+
+def run_concurrently(threads: int, target):
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(number):
+        barrier.wait()
+        results[number] = target(number)
+
+    workers = [threading.Thread(target=run, args=(number,)) for number in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def test_concurrent_adds_are_all_kept():
+    collection = WishlistCollection()
+    tabs, adds_per_tab = 8, 50
+
+    def tab(number):
+        return [add_wishlist_item(collection, "user-1", f"tab{number}-product{i}") for i in range(adds_per_tab)]
+
+    results = run_concurrently(tabs, tab)
+
+    assert all(added for tab_results in results for added in tab_results)
+    wishlists = collection.wishlists("user-1")
+    assert len(wishlists) == 1
+    product_ids = [item["product_id"] for item in wishlists[0]["items"]]
+    assert sorted(product_ids) == sorted(f"tab{t}-product{i}" for t in range(tabs) for i in range(adds_per_tab))
+
+
+def test_concurrent_adds_of_the_same_product_keep_one():
+    collection = WishlistCollection()
+
+    results = run_concurrently(8, lambda _: add_wishlist_item(collection, "user-1", "product-1"))
+
+    assert results.count(True) == 1
+    wishlists = collection.wishlists("user-1")
+    assert len(wishlists) == 1
+    assert [item["product_id"] for item in wishlists[0]["items"]] == ["product-1"]
+
+
+def test_remove():
+    collection = WishlistCollection()
+    assert remove_wishlist_item(collection, "user-1", "product-1") is False  # no wishlist yet
+
+    add_wishlist_item(collection, "user-1", "product-1")
+    add_wishlist_item(collection, "user-1", "product-2")
+
+    assert remove_wishlist_item(collection, "user-1", "product-3") is False
+    assert remove_wishlist_item(collection, "user-1", "product-1") is True
+    assert remove_wishlist_item(collection, "user-1", "product-1") is False
+    assert [item["product_id"] for item in collection.wishlists("user-1")[0]["items"]] == ["product-2"]
+
+
+def test_add_to_500_item_wishlist_sends_one_item():
+    collection = WishlistCollection()
+    now = datetime.now(timezone.utc)
+    items = [{"product_id": f"product-{i}", "added_at": now} for i in range(500)]
+    collection.docs.append({"user_id": "user-1", "id": "wishlist-1", "items": copy.deepcopy(items)})
+
+    assert add_wishlist_item(collection, "user-1", "product-500") is True
+
+    update = collection.updates[-1]
+    assert update["$push"]["items"]["product_id"] == "product-500"
+    # The read-modify-$set add sent the whole array back on every click
+    legacy = {"$set": {"items": items + [update["$push"]["items"]], "updated_at": now}}
+    atomic_bytes, legacy_bytes = len(bson.encode(update)), len(bson.encode(legacy))
+    assert atomic_bytes * 50 < legacy_bytes, (atomic_bytes, legacy_bytes)
+    assert len(collection.wishlists("user-1")[0]["items"]) == 501